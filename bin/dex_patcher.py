@@ -16,7 +16,7 @@ TECHNIQUE: NexBinaryPatch  — binary in-place DEX patch, zero baksmali/smali.
     ART dexopt rejects it. Stock DEX ✓, recompiled DEX ✗ — confirmed by user.
 
 Commands:
-  verify              check zipalign + java
+  verify              check java
   framework-sig       ApkSignatureVerifier → getMinimumSignatureSchemeVersionForTargetSdk = 1
   settings-ai         InternalDeviceUtils  → isAiSupported = true
   voice-recorder-ai   SoundRecorder        → isAiRecordEnable = true
@@ -26,9 +26,12 @@ Commands:
   systemui-volte      MiuiSystemUI.apk     → IS_INTERNATIONAL_BUILD + QuickShare + WA-notif
   miui-framework      miui-framework.jar   → validateTheme = void  +  IS_GLOBAL_BUILD = 1
   settings-region     Settings.apk         → IS_GLOBAL_BUILD = 1 (locale classes)
+  miui-booster        MiuiBooster.jar      → initDeviceLevel = parseDeviceLevelList("v:1,c:3,g:3")
 """
 
-import sys, os, re, struct, hashlib, zlib, shutil, zipfile, subprocess, tempfile, traceback
+import sys, os, re, json, struct, hashlib, zlib, shutil, zipfile, subprocess, tempfile, traceback
+from array import array
+from bisect import bisect_right
 from pathlib import Path
 from typing import Optional
 
@@ -52,34 +55,31 @@ _GBOARD_IME = "com.google.android.inputmethod.latin"
 
 
 # ════════════════════════════════════════════════════════════════════
-#  ZIPALIGN
+#  ALIGNMENT  (what zipalign -p 4 produces, done in-process)
 # ════════════════════════════════════════════════════════════════════
 
-def _find_zipalign():
-    found = shutil.which("zipalign")
-    if found: return found
-    for p in sorted((_BIN / "android-sdk").glob("build-tools/*/zipalign"), reverse=True):
-        if p.exists(): return str(p)
-    return None
+_ZIP_LOCAL_HEADER = 30
 
-def _zipalign(archive: Path) -> bool:
-    za = _find_zipalign()
-    if not za: warn("  zipalign not found — alignment skipped"); return False
-    tmp = archive.with_name(f"_za_{archive.name}")
-    try:
-        r = subprocess.run([za, "-p", "-f", "4", str(archive), str(tmp)],
-                           capture_output=True, text=True, timeout=120)
-        if r.returncode != 0 or not tmp.exists() or tmp.stat().st_size < 1000:
-            err(f"  zipalign failed: {r.stderr[:200]}")
-            tmp.unlink(missing_ok=True); return False
-        shutil.move(str(tmp), str(archive))
-        ok("  ✓ zipalign applied (resources.arsc 4-byte aligned)"); return True
-    except Exception as exc:
-        err(f"  zipalign crash: {exc}"); tmp.unlink(missing_ok=True); return False
+def _align_for(name: str) -> int:
+    # uncompressed native libs are mmapped straight from the APK → page aligned
+    return 4096 if name.endswith(".so") else 4
+
+def _misaligned(archive) -> list:
+    """STORED entries whose data does not start on its _align_for boundary."""
+    bad = []
+    with zipfile.ZipFile(archive) as z, open(archive, "rb") as f:
+        for item in z.infolist():
+            if item.compress_type != zipfile.ZIP_STORED or item.is_dir():
+                continue
+            f.seek(item.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            data_off = item.header_offset + _ZIP_LOCAL_HEADER + name_len + extra_len
+            if data_off % _align_for(item.filename):
+                bad.append(item.filename)
+    return bad
 
 def cmd_verify():
-    za = _find_zipalign()
-    ok(f"zipalign at {za}") if za else warn("zipalign not found — APK alignment will be skipped")
+    ok("APK alignment done in-process (no zipalign needed)")
     r = subprocess.run(["java", "-version"], capture_output=True, text=True)
     ok("java OK") if r.returncode == 0 else err("java not found")
     sys.exit(0)
@@ -91,12 +91,17 @@ def cmd_verify():
 
 def _parse_header(data: bytes) -> Optional[dict]:
     if data[:4] not in (b'dex\n', b'dey\n'): return None
-    si, so, ti, to, pi, po, fi, fo, mi, mo, ci, co = struct.unpack_from('<IIIIIIIIIIII', data, 0x38)
+    file_size, header_size = struct.unpack_from('<II', data, 0x20)
+    map_off = struct.unpack_from('<I', data, 0x34)[0]
+    si, so, ti, to, pi, po, fi, fo, mi, mo, ci, co, ds, do = struct.unpack_from('<IIIIIIIIIIIIII', data, 0x38)
     return dict(string_ids_size=si, string_ids_off=so,
                 type_ids_size=ti,   type_ids_off=to,
+                proto_ids_size=pi,  proto_ids_off=po,
                 field_ids_size=fi,  field_ids_off=fo,
                 method_ids_size=mi, method_ids_off=mo,
-                class_defs_size=ci, class_defs_off=co)
+                class_defs_size=ci, class_defs_off=co,
+                data_size=ds,       data_off=do,
+                file_size=file_size, header_size=header_size, map_off=map_off)
 
 def _uleb128(data: bytes, off: int):
     result = shift = 0
@@ -107,6 +112,21 @@ def _uleb128(data: bytes, off: int):
         shift += 7
     return result, off
 
+def _sleb128(data: bytes, off: int):
+    result = shift = 0
+    while True:
+        b = data[off]; off += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not (b & 0x80): break
+    if result & (1 << (shift - 1)): result -= 1 << shift
+    return result, off
+
+def _put_uleb128(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80); value >>= 7
+    out.append(value)
+
 def _skip_uleb128(data: bytes, off: int) -> int:
     """Advance past one ULEB128 value without decoding it. Never throws."""
     while off < len(data) and (data[off] & 0x80):
@@ -124,6 +144,155 @@ def _get_type_str(data: bytes, hdr: dict, tidx: int) -> str:
     return _get_str(data, hdr, sidx)
 
 
+# ════════════════════════════════════════════════════════════════════
+#  METHOD TABLE  (bulk class_data_item decoder)
+#
+#  Every scanner needs the same thing: "which code_items exist, and which
+#  class/method owns each one". Decoding class_data with one _uleb128 call
+#  per value and re-resolving names per scanner made every patch pass pay
+#  for a full walk of the DEX.
+#
+#  _decode_method_table walks class_defs → class_data_item ONCE and stores
+#  the result as compact parallel array('I') columns. Each column row is one
+#  encoded_method. Type strings and method names are resolved lazily and
+#  memoised, so filters (only_class / only_method) reject rows on integers
+#  before any string is decoded.
+#
+#  NOTE: method_idx_diff restarts at the first virtual method — the old
+#  per-scanner walkers kept accumulating across direct → virtual and so
+#  mis-named every virtual method.
+# ════════════════════════════════════════════════════════════════════
+
+class _MethodTable:
+    """
+    One row per encoded_method, class by class (class_def order):
+      cls         class_def index
+      midx        absolute method_id index
+      access      access_flags
+      code_off    code_item offset (0 = abstract / native)
+      insns_off   code_off + 16    (0 when no code)
+      insns_size  instruction count in 16-bit code units
+      code_pos    file offset of the code_off ULEB128 inside class_data
+    Rows of class_def i are starts[i] .. starts[i+1]-1.
+    """
+    __slots__ = ('data', 'hdr', 'cls', 'midx', 'access', 'code_off', 'insns_off',
+                 'insns_size', 'code_pos', 'starts', '_types', '_names', '_by_type')
+
+    def __init__(self, data: bytes, hdr: dict):
+        self.data, self.hdr = data, hdr
+        self.cls, self.midx, self.access = array('I'), array('I'), array('I')
+        self.code_off, self.insns_off    = array('I'), array('I')
+        self.insns_size, self.code_pos   = array('I'), array('I')
+        self.starts   = array('I')
+        self._types   = {}
+        self._names   = {}
+        self._by_type = None
+
+    def __len__(self): return len(self.midx)
+
+    def type_str(self, ci: int) -> Optional[str]:
+        """Type descriptor of class_def ci (memoised). None if unreadable."""
+        if ci not in self._types:
+            try:
+                cls_idx = struct.unpack_from('<I', self.data, self.hdr['class_defs_off'] + ci * 32)[0]
+                self._types[ci] = _get_type_str(self.data, self.hdr, cls_idx)
+            except Exception:
+                self._types[ci] = None
+        return self._types[ci]
+
+    def name_sidx(self, row: int) -> int:
+        return struct.unpack_from('<I', self.data, self.hdr['method_ids_off'] + self.midx[row] * 8 + 4)[0]
+
+    def name(self, row: int) -> Optional[str]:
+        """Method name of a row (memoised per method_idx). None if unreadable."""
+        m = self.midx[row]
+        if m not in self._names:
+            try:
+                self._names[m] = _get_str(self.data, self.hdr, self.name_sidx(row))
+            except Exception:
+                self._names[m] = None
+        return self._names[m]
+
+    def find_class(self, type_desc: str) -> Optional[int]:
+        """class_def index for an exact descriptor (Lfoo/Bar;), or None."""
+        if self._by_type is None:
+            self._by_type = {}
+            for ci in range(self.hdr['class_defs_size']):
+                t = self.type_str(ci)
+                if t is not None: self._by_type.setdefault(t, ci)
+        return self._by_type.get(type_desc)
+
+    def rows(self, ci: int) -> range:
+        return range(self.starts[ci], self.starts[ci + 1])
+
+
+def _decode_method_table(data: bytes, hdr: dict) -> _MethodTable:
+    t     = _MethodTable(data, hdr)
+    size  = len(data)
+    uleb  = _uleb128
+    cdefs = hdr['class_defs_off']
+    cls_c, midx_c, acc_c = t.cls, t.midx, t.access
+    code_c, insns_c, isz_c, cpos_c = t.code_off, t.insns_off, t.insns_size, t.code_pos
+
+    for ci in range(hdr['class_defs_size']):
+        t.starts.append(len(midx_c))
+        class_data_off = struct.unpack_from('<I', data, cdefs + ci * 32 + 24)[0]
+        if class_data_off == 0 or class_data_off >= size: continue
+        rows = []
+        try:
+            pos = class_data_off
+            sf,  pos = uleb(data, pos); inf, pos = uleb(data, pos)
+            dm,  pos = uleb(data, pos); vm,  pos = uleb(data, pos)
+            for _ in range(sf + inf):               # field_idx_diff, access_flags
+                _, pos = uleb(data, pos); _, pos = uleb(data, pos)
+            for count in (dm, vm):
+                midx = 0                            # diff restarts per list
+                for _ in range(count):
+                    b = data[pos]
+                    if b < 0x80: midx += b; pos += 1
+                    else: d, pos = uleb(data, pos); midx += d
+                    b = data[pos]
+                    if b < 0x80: acc = b; pos += 1
+                    else: acc, pos = uleb(data, pos)
+                    cpos = pos
+                    code_off, pos = uleb(data, pos)
+                    if code_off:
+                        if code_off + 16 > size: raise IndexError(code_off)
+                        rows.append((midx, acc, code_off, code_off + 16,
+                                     struct.unpack_from('<I', data, code_off + 12)[0], cpos))
+                    else:
+                        rows.append((midx, acc, 0, 0, 0, cpos))
+        except (IndexError, struct.error):
+            continue                                # malformed class_data: drop this class only
+        for midx, acc, code_off, insns_off, insns_size, cpos in rows:
+            cls_c.append(ci); midx_c.append(midx); acc_c.append(acc)
+            code_c.append(code_off); insns_c.append(insns_off)
+            isz_c.append(insns_size); cpos_c.append(cpos)
+    t.starts.append(len(midx_c))
+    return t
+
+
+# Decoded tables keyed by DEX signature (SHA-1 at +12). Patches that leave the
+# class_data layout intact hand their table to _fix_checksums, which re-files
+# it under the new signature — the next scanner reuses it instead of decoding.
+_TABLE_CACHE: dict = {}
+_TABLE_CACHE_MAX = 4
+
+def _remember_table(data, table: _MethodTable):
+    key = bytes(data[12:32])
+    _TABLE_CACHE.pop(key, None)
+    _TABLE_CACHE[key] = table
+    while len(_TABLE_CACHE) > _TABLE_CACHE_MAX:
+        del _TABLE_CACHE[next(iter(_TABLE_CACHE))]
+
+def _method_table(data: bytes, hdr: dict) -> _MethodTable:
+    table = _TABLE_CACHE.get(bytes(data[12:32]))
+    if table is None or len(table.data) != len(data):
+        table = _decode_method_table(data, hdr)
+        _remember_table(data, table)
+    return table
+
+
 # ════════════════════════════════════════════════════════════════════
 #  CODE-ITEM ITERATOR  (THE FIX for sget-boolean false-positives)
 #
@@ -134,59 +303,45 @@ def _get_type_str(data: bytes, hdr: dict, tidx: int) -> str:
 #  and missing real sget-boolean instructions in code sections.
 #
 #  Correct approach: iterate only over verified code_item instruction
-#  arrays by walking class_defs → class_data_item → encoded_method.
-#  Each insns array IS a valid aligned instruction stream.
+#  arrays listed in the shared method table (class_defs → class_data_item
+#  → encoded_method). Each insns array IS a valid aligned instruction stream.
 # ════════════════════════════════════════════════════════════════════
 
-def _iter_code_items(data: bytes, hdr: dict):
+def _iter_code_items(data: bytes, hdr: dict,
+                     only_class: str = None, only_method: str = None):
     """
     Yield (insns_off, insns_len_bytes, type_str, method_name) for every
     non-abstract method in the DEX.
+    only_class:  substring filter on the class descriptor.
+    only_method: exact method name (compared by string index, no decoding).
     """
-    for i in range(hdr['class_defs_size']):
-        base           = hdr['class_defs_off'] + i * 32
-        cls_idx        = struct.unpack_from('<I', data, base + 0)[0]
-        class_data_off = struct.unpack_from('<I', data, base + 24)[0]
-        if class_data_off == 0: continue
-        try:
-            sidx     = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-            type_str = _get_str(data, hdr, sidx)
-        except Exception: continue
-
-        pos = class_data_off
-        try:
-            sf,  pos = _uleb128(data, pos); inf, pos = _uleb128(data, pos)
-            dm,  pos = _uleb128(data, pos); vm,  pos = _uleb128(data, pos)
-        except Exception: continue
-
-        # skip fields: _uleb128 + break is intentional.
-        # _skip_uleb128 mis-advances pos for classes like OtherPersonalSettings
-        # whose class_data has variable-width ULEB128 field entries.
-        # The original _uleb128+break was verified to work for all Settings classes.
-        # Kotlin inner/coroutine classes in SystemUI are handled by _raw_sget_scan.
-        for _ in range(sf + inf):
-            try:
-                _, pos = _uleb128(data, pos)   # field_idx_diff
-                _, pos = _uleb128(data, pos)   # access_flags
-            except Exception:
-                break
-
-        midx = 0
-        for _ in range(dm + vm):
-            try:
-                d, pos   = _uleb128(data, pos); midx += d
-                _,  pos  = _uleb128(data, pos)          # access_flags
-                code_off, pos = _uleb128(data, pos)
-            except Exception: break
-            if code_off == 0: continue
-            try:
-                mid_base  = hdr['method_ids_off'] + midx * 8
-                name_sidx = struct.unpack_from('<I', data, mid_base + 4)[0]
-                mname     = _get_str(data, hdr, name_sidx)
-                insns_size = struct.unpack_from('<I', data, code_off + 12)[0]
-                yield code_off + 16, insns_size * 2, type_str, mname
-            except Exception:
-                continue
+    table = _method_table(data, hdr)
+    want  = None
+    if only_method:
+        want = _find_string_idx(data, hdr, only_method)
+        if want is None: return
+
+    code_off, insns_off, insns_size = table.code_off, table.insns_off, table.insns_size
+    for ci in range(hdr['class_defs_size']):
+        rows = table.rows(ci)
+        if not rows: continue
+        type_str = table.type_str(ci)
+        if type_str is None: continue
+        if only_class and only_class not in type_str: continue
+        for r in rows:
+            if not code_off[r]: continue
+            if want is not None and table.name_sidx(r) != want: continue
+            mname = table.name(r)
+            if mname is None: continue
+            yield insns_off[r], insns_size[r] * 2, type_str, mname
+
+def _iter_class_types(data: bytes, hdr: dict):
+    """Yield type descriptors of every class that has class_data."""
+    table = _method_table(data, hdr)
+    for ci in range(hdr['class_defs_size']):
+        if not table.rows(ci): continue
+        type_str = table.type_str(ci)
+        if type_str is not None: yield type_str
 
 
 # ════════════════════════════════════════════════════════════════════
@@ -223,6 +378,25 @@ def _find_method_ids_by_name(data: bytes, hdr: dict, method_name: str) -> set:
     return result
 
 
+def _method_desc(data: bytes, hdr: dict, mi: int) -> str:
+    """Method descriptor '(params)ret' of method_id mi."""
+    proto = struct.unpack_from('<H', data, hdr['method_ids_off'] + mi * 8 + 2)[0]
+    _, ret, params = struct.unpack_from('<III', data, hdr['proto_ids_off'] + proto * 12)
+    args = ''
+    if params:
+        n = struct.unpack_from('<I', data, params)[0]
+        args = ''.join(_get_type_str(data, hdr, t)
+                       for t in struct.unpack_from(f'<{n}H', data, params + 4))
+    return f'({args}){_get_type_str(data, hdr, ret)}'
+
+def _find_method_idx(data: bytes, hdr: dict, class_type: str, name: str, desc: str) -> Optional[int]:
+    """method_id index of class_type->name desc, or None."""
+    for mi in _find_method_ids_by_name(data, hdr, name):
+        cls = struct.unpack_from('<H', data, hdr['method_ids_off'] + mi * 8)[0]
+        if _get_type_str(data, hdr, cls) == class_type and _method_desc(data, hdr, mi) == desc:
+            return mi
+    return None
+
 # ════════════════════════════════════════════════════════════════════
 #  RAW BYTE SCANNER  (second-pass fallback)
 #
@@ -232,18 +406,62 @@ def _find_method_ids_by_name(data: bytes, hdr: dict, method_name: str) -> set:
 #  read is mis-stepped, pos ends up wrong and method code_offs are garbage,
 #  silently skipping the whole class.
 #
-#  This scanner bypasses class_data entirely: it scans raw DEX bytes in
-#  2-byte steps (code-unit aligned) starting after all static tables,
-#  looking for [SGET_OPCODE] [reg] [field_lo] [field_hi].
+#  This scanner bypasses class_data entirely: map_list gives the exact
+#  extent of the code_item section, which is walked item by item
+#  (header → insns_size → tries/handlers → next 4-aligned item). Each
+#  insns array is decoded instruction by instruction, looking for
+#  [SGET_OPCODE] [reg] [field_lo] [field_hi]. String data, type lists,
+#  annotations and debug info are never touched.
+#  Trimmed items (insns_size shrunk by binary_patch_method trim=True) leave
+#  dead bytes behind; when the walk lands on something that is not a
+#  plausible code_item it resyncs on the next code_off the method table knows.
 #  Already-patched slots are 0x12/0x13 — not in SGET_OPCODES — so it
 #  never double-patches and is safe to call after the normal sweep.
 # ════════════════════════════════════════════════════════════════════
 
+def _code_item_end(data: bytes, off: int) -> int:
+    """Offset just past the code_item at off (insns, padding, tries, handlers)."""
+    tries, _, insns_size = struct.unpack_from('<HII', data, off + 6)
+    pos = off + 16 + insns_size * 2
+    if not tries: return pos
+    pos += (insns_size & 1) * 2 + tries * 8
+    n, pos = _uleb128(data, pos)
+    for _ in range(n):
+        size, pos = _sleb128(data, pos)
+        for _ in range(abs(size) * 2): pos = _skip_uleb128(data, pos)
+        if size <= 0: pos = _skip_uleb128(data, pos)
+    return pos
+
+def _walk_code_section(data: bytes, hdr: dict):
+    """Yield (code_off, insns_off, insns_size) for every code_item in the
+    map_list code section, in file order."""
+    sec = _section_bounds(data, hdr).get(TYPE_CODE_ITEM)
+    if not sec: return
+    start, end, count = sec
+    known = sorted(co for co in set(_method_table(data, hdr).code_off) if start <= co < end)
+    last  = known[-1] if known else start
+    pos, seen = start, 0
+    while pos + 16 <= end and (seen < count or pos <= last):
+        pos = _align4(pos)
+        k   = bisect_right(known, pos)                      # next known item after pos
+        nxt = known[k] if k < len(known) else end
+        regs, ins, _, tries, dbg, n = struct.unpack_from('<HHHHII', data, pos)
+        try:
+            item_end = _code_item_end(data, pos)
+        except (IndexError, struct.error):
+            item_end = end + 1
+        if ins > regs or tries > n or dbg >= len(data) or item_end > nxt:
+            if k == len(known): return                      # off the rails → resync
+            pos = nxt; continue
+        yield pos, pos + 16, n
+        seen += 1
+        pos = item_end
+
 def _raw_sget_scan(dex: bytearray, field_class: str, field_name: str,
                    use_const4: bool = False) -> int:
     """
-    Raw second-pass: scan DEX bytes 2 bytes at a time from the data section
-    start for sget-* instructions referencing field_class->field_name.
+    Raw second-pass: walk every code_item of the map_list code section for
+    sget-* instructions referencing field_class->field_name.
     Returns count of additional replacements (those missed by _iter_code_items).
     """
     data = bytes(dex)
@@ -255,22 +473,14 @@ def _raw_sget_scan(dex: bytearray, field_class: str, field_name: str,
 
     SGET_OPCODES = frozenset([0x60, 0x63, 0x64, 0x65, 0x66])
 
-    # Scan start: right after class_defs table (last static table before data)
-    scan_start = hdr['class_defs_off'] + hdr['class_defs_size'] * 32
-    # Round up to 4-byte boundary (code_items are 4-byte aligned)
-    if scan_start & 3:
-        scan_start = (scan_start | 3) + 1
-
     raw   = bytearray(dex)
     count = 0
-    limit = len(raw) - 3
-    i     = scan_start
-
-    while i < limit:
-        op = raw[i]
-        if op in SGET_OPCODES:
-            field_lo = struct.unpack_from('<H', raw, i + 2)[0]
-            if field_lo in fids:
+
+    for _, insns_off, insns_size in _walk_code_section(data, hdr):
+        i, insns_end = insns_off, insns_off + insns_size * 2
+        while i < insns_end:
+            op = raw[i]
+            if op in SGET_OPCODES and struct.unpack_from('<H', raw, i + 2)[0] in fids:
                 reg = raw[i + 1]
                 if use_const4 and reg <= 15:
                     raw[i]     = 0x12
@@ -284,14 +494,12 @@ def _raw_sget_scan(dex: bytearray, field_class: str, field_name: str,
                     raw[i + 2] = 0x01
                     raw[i + 3] = 0x00
                 count += 1
-                i += 4
-                continue
-        i += 2   # step by one code unit (2 bytes), instruction-aligned
+            i += _insn_units(raw, i) * 2
 
     if count:
         mode = "const/4" if use_const4 else "const/16"
         ok(f"  ✓ [raw-scan] {field_name}: {count} missed sget → {mode} 1")
-        _fix_checksums(raw)
+        _fix_checksums(raw, _TABLE_CACHE.get(bytes(data[12:32])))
         dex[:] = raw
     return count
 
@@ -300,11 +508,13 @@ def _raw_sget_scan(dex: bytearray, field_class: str, field_name: str,
 #  CHECKSUM REPAIR
 # ════════════════════════════════════════════════════════════════════
 
-def _fix_checksums(dex: bytearray):
+def _fix_checksums(dex: bytearray, table: Optional[_MethodTable] = None):
+    """table: method table still valid for the patched layout → re-filed under the new signature."""
     sha1  = hashlib.sha1(bytes(dex[32:])).digest()
     dex[12:32] = sha1
     adler = zlib.adler32(bytes(dex[12:])) & 0xFFFFFFFF
     struct.pack_into('<I', dex, 8, adler)
+    if table is not None: _remember_table(dex, table)
 
 def _clear_method_annotations(dex: bytearray, class_desc: str, method_name: str) -> bool:
     """
@@ -327,49 +537,20 @@ def _clear_method_annotations(dex: bytearray, class_desc: str, method_name: str)
     if not hdr: return False
 
     target_type = f'L{class_desc};'
+    table = _method_table(data, hdr)
 
     # 1. Find class_def row for target class
-    class_def_base = None
-    for i in range(hdr['class_defs_size']):
-        base    = hdr['class_defs_off'] + i * 32
-        cls_idx = struct.unpack_from('<I', data, base)[0]
-        try:
-            sidx = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-            if _get_str(data, hdr, sidx) == target_type:
-                class_def_base = base
-                break
-        except Exception:
-            continue
-
-    if class_def_base is None: return False
+    ci = table.find_class(target_type)
+    if ci is None: return False
 
+    class_def_base   = hdr['class_defs_off'] + ci * 32
     annotations_off  = struct.unpack_from('<I', data, class_def_base + 20)[0]
     class_data_off   = struct.unpack_from('<I', data, class_def_base + 24)[0]
     if annotations_off == 0 or class_data_off == 0: return False
 
-    # 2. Walk class_data_item to find the absolute method_idx for method_name
-    target_midx = None
-    pos = class_data_off
-    sf, pos  = _uleb128(data, pos)
-    inf, pos = _uleb128(data, pos)
-    dm, pos  = _uleb128(data, pos)
-    vm, pos  = _uleb128(data, pos)
-    for _ in range(sf + inf):
-        _, pos = _uleb128(data, pos); _, pos = _uleb128(data, pos)
-    midx = 0
-    for _ in range(dm + vm):
-        d,   pos = _uleb128(data, pos); midx += d
-        _,   pos = _uleb128(data, pos)   # access_flags
-        _,   pos = _uleb128(data, pos)   # code_off
-        try:
-            mid_base  = hdr['method_ids_off'] + midx * 8
-            name_sidx = struct.unpack_from('<I', data, mid_base + 4)[0]
-            if _get_str(data, hdr, name_sidx) == method_name:
-                target_midx = midx
-                break
-        except Exception:
-            continue
-
+    # 2. Absolute method_idx for method_name from the method table
+    target_midx = next((table.midx[r] for r in table.rows(ci)
+                        if table.name(r) == method_name), None)
     if target_midx is None: return False
 
     # 3. Parse annotations_directory_item to locate this method's entry
@@ -388,27 +569,281 @@ def _clear_method_annotations(dex: bytearray, class_desc: str, method_name: str)
         m_idx = struct.unpack_from('<I', data, entry)[0]
         if m_idx == target_midx:
             struct.pack_into('<I', dex, entry + 4, 0)   # zero the annotations_off
-            _fix_checksums(dex)
+            _fix_checksums(dex, table)
             ok(f"  Cleared Signature annotation for {method_name}")
             return True
 
     return False
 
 
+# ════════════════════════════════════════════════════════════════════
+#  MAP LIST  +  SECTION RELAYOUT
+#
+#  In-place patching only works while every item keeps its size. Growing
+#  anything (a new string, a longer method body) moves every later item,
+#  and every absolute offset pointing past the change goes stale.
+#
+#  _relayout rebuilds the file section by section in map_list order:
+#    • sections passed in `rebuilt` get their new content,
+#    • every other section is copied verbatim and shifted as one block,
+#    • class_data is always re-encoded — code_off is a ULEB128 and its
+#      width can change when the code section moves,
+#    • every offset field is then re-pointed: header, map_list, string_ids,
+#      proto_ids, class_defs, call_site_ids, code_item.debug_info_off and
+#      annotation set / set-ref-list / directory entries.
+#  Items keep their order; only zero padding is added between sections
+#  (the verifier accepts zero padding before any section).
+# ════════════════════════════════════════════════════════════════════
+
+TYPE_HEADER_ITEM                = 0x0000
+TYPE_STRING_ID_ITEM             = 0x0001
+TYPE_TYPE_ID_ITEM               = 0x0002
+TYPE_PROTO_ID_ITEM              = 0x0003
+TYPE_FIELD_ID_ITEM              = 0x0004
+TYPE_METHOD_ID_ITEM             = 0x0005
+TYPE_CLASS_DEF_ITEM             = 0x0006
+TYPE_CALL_SITE_ID_ITEM          = 0x0007
+TYPE_METHOD_HANDLE_ITEM         = 0x0008
+TYPE_MAP_LIST                   = 0x1000
+TYPE_TYPE_LIST                  = 0x1001
+TYPE_ANNOTATION_SET_REF_LIST    = 0x1002
+TYPE_ANNOTATION_SET_ITEM        = 0x1003
+TYPE_CLASS_DATA_ITEM            = 0x2000
+TYPE_CODE_ITEM                  = 0x2001
+TYPE_STRING_DATA_ITEM           = 0x2002
+TYPE_DEBUG_INFO_ITEM            = 0x2003
+TYPE_ANNOTATION_ITEM            = 0x2004
+TYPE_ENCODED_ARRAY_ITEM         = 0x2005
+TYPE_ANNOTATIONS_DIRECTORY_ITEM = 0x2006
+TYPE_HIDDENAPI_CLASS_DATA_ITEM  = 0xF000
+
+# Byte-aligned item types; every other section starts 4-byte aligned.
+_BYTE_ALIGNED = frozenset([TYPE_CLASS_DATA_ITEM, TYPE_STRING_DATA_ITEM, TYPE_DEBUG_INFO_ITEM,
+                           TYPE_ANNOTATION_ITEM, TYPE_ENCODED_ARRAY_ITEM])
+
+# header_item slots (size, off) of the id sections
+_HDR_ID_SLOTS = {TYPE_STRING_ID_ITEM: 0x38, TYPE_TYPE_ID_ITEM:   0x40,
+                 TYPE_PROTO_ID_ITEM:  0x48, TYPE_FIELD_ID_ITEM:  0x50,
+                 TYPE_METHOD_ID_ITEM: 0x58, TYPE_CLASS_DEF_ITEM: 0x60}
+
+def _align4(n: int) -> int:
+    return (n + 3) & ~3
+
+def _parse_map_list(data: bytes, hdr: dict) -> list:
+    """map_list entries as [(type, count, offset), ...] sorted by offset."""
+    off = hdr['map_off']
+    n   = struct.unpack_from('<I', data, off)[0]
+    return sorted((struct.unpack_from('<HxxII', data, off + 4 + i * 12) for i in range(n)),
+                  key=lambda e: e[2])
+
+def _section_bounds(data: bytes, hdr: dict) -> dict:
+    """{map type: (start, end, count)} — end is where the next section starts."""
+    sections = _parse_map_list(data, hdr)
+    ends     = [e[2] for e in sections[1:]] + [len(data)]
+    return {typ: (off, end, cnt) for (typ, cnt, off), end in zip(sections, ends)}
+
+# Instruction width in code units, per opcode (Dalvik formats).
+_OP_UNITS = bytearray([1]) * 256
+for _lo, _hi, _n in ((0x02, 0x02, 2), (0x03, 0x03, 3), (0x05, 0x05, 2), (0x06, 0x06, 3),
+                     (0x08, 0x08, 2), (0x09, 0x09, 3), (0x13, 0x13, 2), (0x14, 0x14, 3),
+                     (0x15, 0x16, 2), (0x17, 0x17, 3), (0x18, 0x18, 5), (0x19, 0x1A, 2),
+                     (0x1B, 0x1B, 3), (0x1C, 0x1C, 2), (0x1F, 0x20, 2), (0x22, 0x23, 2),
+                     (0x24, 0x26, 3), (0x29, 0x29, 2), (0x2A, 0x2C, 3), (0x2D, 0x3D, 2),
+                     (0x44, 0x6D, 2), (0x6E, 0x72, 3), (0x74, 0x78, 3), (0x90, 0xAF, 2),
+                     (0xD0, 0xE2, 2), (0xFA, 0xFB, 4), (0xFC, 0xFD, 3), (0xFE, 0xFF, 2)):
+    for _op in range(_lo, _hi + 1): _OP_UNITS[_op] = _n
+
+def _insn_units(code: bytes, p: int) -> int:
+    """Width in code units of the instruction (or data payload) at byte offset p."""
+    op = code[p]
+    if op == 0x00:
+        ident = code[p + 1]
+        if ident == 0x01:                                   # packed-switch-payload
+            return struct.unpack_from('<H', code, p + 2)[0] * 2 + 4
+        if ident == 0x02:                                   # sparse-switch-payload
+            return struct.unpack_from('<H', code, p + 2)[0] * 4 + 2
+        if ident == 0x03:                                   # fill-array-data-payload
+            width, size = struct.unpack_from('<HI', code, p + 2)
+            return (size * width + 1) // 2 + 4
+    return _OP_UNITS[op]
+
+def _reencode_class_data(data: bytes, count: int, off: int, xlat) -> tuple:
+    """Re-encode `count` class_data_items at off with code_off → xlat(code_off)."""
+    out, moved, pos = bytearray(), {}, off
+    for _ in range(count):
+        moved[pos] = len(out)
+        sf,  pos = _uleb128(data, pos); inf, pos = _uleb128(data, pos)
+        dm,  pos = _uleb128(data, pos); vm,  pos = _uleb128(data, pos)
+        for v in (sf, inf, dm, vm): _put_uleb128(out, v)
+        start = pos
+        for _ in range((sf + inf) * 2): pos = _skip_uleb128(data, pos)
+        out += data[start:pos]
+        for _ in range(dm + vm):
+            start = pos
+            pos = _skip_uleb128(data, _skip_uleb128(data, pos))   # method_idx_diff, access_flags
+            out += data[start:pos]
+            code_off, pos = _uleb128(data, pos)
+            _put_uleb128(out, xlat(code_off))
+    return bytes(out), moved
+
+def _relayout(data: bytes, hdr: dict, rebuilt: dict, counts: dict = None) -> bytearray:
+    """
+    Re-lay out a DEX with some sections replaced. Returns the new DEX with
+    checksums fixed.
+      rebuilt: {map_type: (content, moved)} — `moved` maps old item offsets to
+               offsets relative to the new section start. Offsets not listed
+               keep their position relative to the section start. New items
+               use synthetic "old" offsets past EOF so referrers can name them.
+      counts:  {map_type: new item count} for sections that gained items.
+    """
+    counts   = counts or {}
+    sections = _parse_map_list(data, hdr)
+    old_starts = [e[2] for e in sections]
+    old_ends   = old_starts[1:] + [len(data)]
+
+    content, moved = [], {}
+    for i, ((typ, _, off), end) in enumerate(zip(sections, old_ends)):
+        if typ in rebuilt:
+            content.append(rebuilt[typ][0])
+            for o, rel in rebuilt[typ][1].items(): moved[o] = (i, rel)
+        elif typ == TYPE_MAP_LIST:
+            content.append(bytes(4 + 12 * len(sections)))
+        else:
+            content.append(data[off:end])
+
+    def layout():
+        starts, pos = [], 0
+        for (typ, _, _), c in zip(sections, content):
+            if typ not in _BYTE_ALIGNED: pos = _align4(pos)
+            starts.append(pos); pos += len(c)
+        return starts, _align4(pos)
+
+    new_starts, size = layout()
+    def xlat(off: int) -> int:
+        if off == 0: return 0
+        hit = moved.get(off)
+        if hit is not None: return new_starts[hit[0]] + hit[1]
+        i = bisect_right(old_starts, off) - 1
+        return off - old_starts[i] + new_starts[i]
+
+    # class_data encodes code offsets → iterate until its size settles
+    cd = next((i for i, e in enumerate(sections) if e[0] == TYPE_CLASS_DATA_ITEM), None)
+    for _ in range(8):
+        if cd is None: break
+        enc, cd_moved = _reencode_class_data(data, sections[cd][1], sections[cd][2], xlat)
+        for o, rel in cd_moved.items(): moved[o] = (cd, rel)
+        stable = len(enc) == len(content[cd])
+        content[cd] = enc
+        new_starts, size = layout()
+        if stable: break
+
+    out = bytearray(size)
+    for start, c in zip(new_starts, content):
+        out[start:start + len(c)] = c
+
+    def fix(at: int):
+        v = struct.unpack_from('<I', out, at)[0]
+        if v: struct.pack_into('<I', out, at, xlat(v))
+
+    for (typ, cnt, _), start in zip(sections, new_starts):
+        cnt = counts.get(typ, cnt)
+        if typ in _HDR_ID_SLOTS:
+            struct.pack_into('<II', out, _HDR_ID_SLOTS[typ], cnt, start)
+        if typ in (TYPE_STRING_ID_ITEM, TYPE_CALL_SITE_ID_ITEM):
+            for i in range(cnt): fix(start + i * 4)
+        elif typ == TYPE_PROTO_ID_ITEM:
+            for i in range(cnt): fix(start + i * 12 + 8)                  # parameters_off
+        elif typ == TYPE_CLASS_DEF_ITEM:
+            for i in range(cnt):
+                for f in (12, 20, 24, 28): fix(start + i * 32 + f)        # interfaces/annotations/class_data/static_values
+        elif typ in (TYPE_ANNOTATION_SET_REF_LIST, TYPE_ANNOTATION_SET_ITEM):
+            pos = start
+            for _ in range(cnt):
+                pos = _align4(pos)
+                n   = struct.unpack_from('<I', out, pos)[0]
+                for j in range(n): fix(pos + 4 + j * 4)
+                pos += 4 + n * 4
+        elif typ == TYPE_ANNOTATIONS_DIRECTORY_ITEM:
+            pos = start
+            for _ in range(cnt):
+                pos = _align4(pos)
+                fix(pos)                                                  # class_annotations_off
+                n = sum(struct.unpack_from('<III', out, pos + 4))
+                for j in range(n): fix(pos + 16 + j * 8 + 4)
+                pos += 16 + n * 8
+        elif typ == TYPE_MAP_LIST:
+            struct.pack_into('<I', out, start, len(sections))
+            for j, ((t, c, _), st) in enumerate(zip(sections, new_starts)):
+                struct.pack_into('<HHII', out, start + 4 + j * 12, t, 0, counts.get(t, c), st)
+            struct.pack_into('<I', out, 0x34, start)
+
+    # code_item.debug_info_off — every code_item the method table knows
+    table = _method_table(data, hdr)
+    for code_off in set(table.code_off):
+        if code_off: fix(xlat(code_off) + 8)
+
+    data_off = xlat(hdr['data_off'])
+    struct.pack_into('<I', out, 0x20, len(out))
+    struct.pack_into('<II', out, 0x68, len(out) - data_off, data_off)
+    _fix_checksums(out)
+    return out
+
+
 # ════════════════════════════════════════════════════════════════════
 #  BINARY PATCH: single method → stub
+#
+#  Stub fits the original insns → patched in place (NOP pad or trim).
+#  Stub is longer → the method gets a fresh code_item (_relocate_code_item):
+#  the old item is replaced inside the code section, every later item
+#  shifts, and _relayout re-encodes class_data (code_off ULEB width can
+#  change) and re-points map_list, file size and checksums.
 # ════════════════════════════════════════════════════════════════════
 
+def _stub_outs(insns: bytes) -> int:
+    """outs_size a stub needs: widest argument list of any invoke in it."""
+    outs, p = 0, 0
+    while p < len(insns):
+        op = insns[p]
+        if 0x6E <= op <= 0x72 or op in (0xFA, 0xFC):        # invoke-kind {vC..}  (35c/45cc)
+            outs = max(outs, insns[p + 1] >> 4)
+        elif 0x74 <= op <= 0x78 or op in (0xFB, 0xFD):      # invoke-kind/range  (3rc/4rcc)
+            outs = max(outs, insns[p + 1])
+        p += _insn_units(insns, p) * 2
+    return outs
+
+def _relocate_code_item(dex: bytearray, table, row: int, item: bytes) -> bool:
+    """Give method `row` the code_item `item` (header + insns, no tries)."""
+    data = bytes(dex)
+    hdr  = table.hdr
+    old  = table.code_off[row]
+    sec  = _section_bounds(data, hdr).get(TYPE_CODE_ITEM)
+    if sec is None:
+        err("  No code_item section in map_list"); return False
+    start, end, _ = sec
+    later = sorted(co for co in set(table.code_off) if old < co < end)
+    nxt   = later[0] if later else end
+    item  = item + bytes(_align4(len(item)) - len(item))
+    delta = len(item) - (nxt - old)
+    try:
+        content = data[start:old] + item + data[nxt:end]
+        moved   = {co: co - start + delta for co in later}
+        out     = _relayout(data, hdr, {TYPE_CODE_ITEM: (content, moved)})
+    except (IndexError, ValueError, struct.error) as exc:
+        err(f"  code_item relocation failed: {exc!r} — DEX untouched"); return False
+    dex[:] = out
+    return True
+
 def binary_patch_method(dex: bytearray, class_desc: str, method_name: str,
                         stub_regs: int, stub_insns: bytes,
                         trim: bool = False) -> bool:
     """
-    In-place patch: find method by exact class + name, replace code_item with stub.
+    Find method by exact class + name, replace its body with stub.
 
     trim=False (default): NOP-pads remainder → keeps insns_size, layout unchanged.
     trim=True: shrinks insns_size in the header to stub length.
       → Clean baksmali output (no nop flood, no spurious annotations).
       → Use for validateTheme and any method where baksmali output matters.
+    Stub longer than the original → code_item relocated (trim irrelevant).
     """
     data = bytes(dex)
     hdr  = _parse_header(data)
@@ -417,61 +852,29 @@ def binary_patch_method(dex: bytearray, class_desc: str, method_name: str,
     target_type = f'L{class_desc};'
     info(f"  Searching {target_type} → {method_name}")
 
-    # Find class_data_off
-    class_data_off = None
-    for i in range(hdr['class_defs_size']):
-        base    = hdr['class_defs_off'] + i * 32
-        cls_idx = struct.unpack_from('<I', data, base)[0]
-        try:
-            sidx = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-            if _get_str(data, hdr, sidx) == target_type:
-                class_data_off = struct.unpack_from('<I', data, base + 24)[0]
-                break
-        except Exception:
-            continue
-
-    if class_data_off is None:
+    # Find class_def → method rows in the shared method table
+    table = _method_table(data, hdr)
+    ci    = table.find_class(target_type)
+    if ci is None:
         warn(f"  Class {target_type} not in this DEX"); return False
-    if class_data_off == 0:
+    if struct.unpack_from('<I', data, hdr['class_defs_off'] + ci * 32 + 24)[0] == 0:
         warn(f"  Class {target_type} has no class_data"); return False
 
-    # Walk methods to find code_item
-    pos = class_data_off
-    sf, pos = _uleb128(data, pos);  inf, pos = _uleb128(data, pos)
-    dm, pos = _uleb128(data, pos);  vm,  pos = _uleb128(data, pos)
-    for _ in range(sf + inf):
-        _, pos = _uleb128(data, pos); _, pos = _uleb128(data, pos)
-
-    code_off = None
-    midx = 0
-    for _ in range(dm + vm):
-        d, pos = _uleb128(data, pos); midx += d
-        _, pos = _uleb128(data, pos)
-        c_off, pos = _uleb128(data, pos)
-        if c_off == 0: continue
-        try:
-            mid_base  = hdr['method_ids_off'] + midx * 8
-            name_sidx = struct.unpack_from('<I', data, mid_base + 4)[0]
-            if _get_str(data, hdr, name_sidx) == method_name:
-                code_off = c_off; break
-        except Exception:
-            continue
-
-    if code_off is None:
+    row = next((r for r in table.rows(ci)
+                if table.code_off[r] and table.name(r) == method_name), None)
+    if row is None:
         warn(f"  Method {method_name} not found"); return False
+    code_off = table.code_off[row]
 
     orig_regs  = struct.unpack_from('<H', data, code_off + 0)[0]
     orig_ins   = struct.unpack_from('<H', data, code_off + 2)[0]
     insns_size = struct.unpack_from('<I', data, code_off + 12)[0]
     insns_off  = code_off + 16
     stub_units = len(stub_insns) // 2
+    outs       = _stub_outs(stub_insns)
 
     ok(f"  code_item @ 0x{code_off:X}: insns={insns_size} cu ({insns_size*2}B)")
 
-    if stub_units > insns_size:
-        err(f"  Stub {stub_units} cu > original {insns_size} cu — cannot patch in-place")
-        return False
-
     # registers_size = stub_regs + orig_ins
     #   Dalvik frame layout: locals occupy BOTTOM (v0..v(stub_regs-1)),
     #   parameter registers occupy TOP (v(stub_regs)..v(stub_regs+orig_ins-1)).
@@ -481,15 +884,24 @@ def binary_patch_method(dex: bytearray, class_desc: str, method_name: str,
     #   Correct: stub_regs + orig_ins = 1+1 = 2 → v0=local, v1=p0. Clean separation.
     new_regs = stub_regs + orig_ins
 
+    if stub_units > insns_size:
+        # ── Relocate: fresh code_item, no tries, no debug info ──────────
+        item = struct.pack('<HHHHII', new_regs, orig_ins, outs, 0, 0, stub_units) + stub_insns
+        if not _relocate_code_item(dex, table, row, item): return False
+        ok(f"  ✓ {method_name} → stub ({stub_units} cu > {insns_size} cu, relocated, "
+           f"regs {orig_regs}→{new_regs}, {len(data)//1024}K → {len(dex)//1024}K)")
+        return True
+
     # ── Patch code_item header ────────────────────────────────────────
     struct.pack_into('<H', dex, code_off + 0, new_regs)   # registers_size
-    struct.pack_into('<H', dex, code_off + 4, 0)           # outs_size = 0
+    struct.pack_into('<H', dex, code_off + 4, outs)        # outs_size (0 unless stub invokes)
     struct.pack_into('<H', dex, code_off + 6, 0)           # tries_size = 0
     struct.pack_into('<I', dex, code_off + 8, 0)           # debug_info_off = 0
     if trim:
         # Shrink insns_size → stub length. No NOP padding written.
         # Safe: ART locates code_items by offset (class_data_item), not by sequential scan.
         struct.pack_into('<I', dex, code_off + 12, stub_units)
+        table.insns_size[row] = stub_units
 
     # ── Write stub + optional NOP padding ────────────────────────────
     for i, b in enumerate(stub_insns):
@@ -498,7 +910,7 @@ def binary_patch_method(dex: bytearray, class_desc: str, method_name: str,
         for i in range(len(stub_insns), insns_size * 2):
             dex[insns_off + i] = 0x00   # NOP pad
 
-    _fix_checksums(dex)
+    _fix_checksums(dex, table)
     nops = 0 if trim else (insns_size - stub_units)
     mode = "trimmed" if trim else f"{nops} nop pad"
     ok(f"  ✓ {method_name} → stub ({stub_units} cu, {mode}, regs {orig_regs}→{new_regs})")
@@ -547,9 +959,7 @@ def binary_patch_sget_to_true(dex: bytearray,
     raw   = bytearray(dex)
     count = 0
 
-    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr):
-        if only_class  and only_class  not in type_str: continue
-        if only_method and mname != only_method:        continue
+    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr, only_class, only_method):
         i = 0
         while i < insns_len - 3:
             op = raw[insns_off + i]
@@ -577,7 +987,7 @@ def binary_patch_sget_to_true(dex: bytearray,
 
     mode = "const/4" if use_const4 else "const/16"
     if count:
-        _fix_checksums(raw); dex[:] = raw
+        _fix_checksums(raw, _method_table(data, hdr)); dex[:] = raw
         ok(f"  ✓ {field_name}: {count} sget → {mode} 1")
     else:
         warn(f"  {field_name}: no matching sget found"
@@ -618,9 +1028,7 @@ def binary_swap_field_ref(dex: bytearray,
     count = 0
     target_type = f'L{class_desc};'
 
-    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr):
-        if target_type not in type_str: continue
-        if mname != method_name:       continue
+    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr, target_type, method_name):
         i = 0
         while i < insns_len - 3:
             if raw[insns_off + i] in SGET_OPCODES:
@@ -633,7 +1041,7 @@ def binary_swap_field_ref(dex: bytearray,
                 i += 2
 
     if count:
-        _fix_checksums(raw); dex[:] = raw
+        _fix_checksums(raw, _method_table(data, hdr)); dex[:] = raw
         ok(f"  ✓ {method_name}: {count} × {old_field_name} → {new_field_name}")
         return True
     else:
@@ -641,6 +1049,211 @@ def binary_swap_field_ref(dex: bytearray,
         return False
 
 
+# ════════════════════════════════════════════════════════════════════
+#  STRING POOL EXTENSION
+#  Used for: Gboard redirect when the target package name is not already
+#  in the DEX pool (miui-framework), so the swap never needs apktool.
+#
+#  string_ids must stay sorted, so a new string lands inside the pool and
+#  every string index at or after it moves up. Every reference is remapped:
+#    fixed width — type_ids, proto_ids.shorty, field/method_ids.name,
+#                  class_defs.source_file, const-string(/jumbo) operands
+#    variable    — annotation_item, encoded_array_item (VALUE_STRING and
+#                  element names), debug_info_item (names, signatures, files)
+#  Variable-width sections are re-encoded and the file re-laid out by
+#  _relayout. A const-string whose index would leave the 16-bit range
+#  cannot be widened in place → the extension is refused, DEX untouched.
+# ════════════════════════════════════════════════════════════════════
+
+def _mutf8(s: str):
+    """(MUTF-8 bytes, UTF-16 length) as stored in a string_data_item."""
+    raw   = s.encode('utf-16-be', errors='surrogatepass')
+    units = struct.unpack(f'>{len(raw) // 2}H', raw)
+    out   = bytearray()
+    for c in units:
+        if 0 < c < 0x80:
+            out.append(c)
+        elif c < 0x800:                      # includes U+0000 → C0 80
+            out += bytes([0xC0 | (c >> 6), 0x80 | (c & 0x3F)])
+        else:                                # surrogates encoded one by one
+            out += bytes([0xE0 | (c >> 12), 0x80 | ((c >> 6) & 0x3F), 0x80 | (c & 0x3F)])
+    return bytes(out), len(units)
+
+def _str_key(s: str) -> bytes:
+    """DEX string order (UTF-16 code units) as a bytewise-comparable key.
+    MUTF-8 preserves unit order except for U+0000 (C0 80) → fold it to 00."""
+    return _mutf8(s)[0].replace(b'\xc0\x80', b'\x00')
+
+def _str_key_at(data: bytes, hdr: dict, idx: int) -> bytes:
+    off = struct.unpack_from('<I', data, hdr['string_ids_off'] + idx * 4)[0]
+    co  = _skip_uleb128(data, off)
+    return data[co:data.index(0, co)].replace(b'\xc0\x80', b'\x00')
+
+def _string_insert_pos(data: bytes, hdr: dict, s: str) -> int:
+    """Index at which s keeps string_ids sorted."""
+    key, lo, hi = _str_key(s), 0, hdr['string_ids_size']
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _str_key_at(data, hdr, mid) < key: lo = mid + 1
+        else:                                 hi = mid
+    return lo
+
+def _copy_uleb128(src: bytes, pos: int, out: bytearray) -> int:
+    end = _skip_uleb128(src, pos)
+    out += src[pos:end]
+    return end
+
+def _copy_encoded_value(src: bytes, pos: int, out: bytearray, remap) -> int:
+    b = src[pos]; pos += 1
+    vtype, varg = b & 0x1F, b >> 5
+    if vtype == 0x17:                                   # VALUE_STRING
+        n   = varg + 1
+        idx = remap(int.from_bytes(src[pos:pos + n], 'little'))
+        nb  = max(1, (idx.bit_length() + 7) // 8)
+        out.append(((nb - 1) << 5) | 0x17); out += idx.to_bytes(nb, 'little')
+        return pos + n
+    out.append(b)
+    if vtype == 0x1C: return _copy_encoded_array(src, pos, out, remap)        # VALUE_ARRAY
+    if vtype == 0x1D: return _copy_encoded_annotation(src, pos, out, remap)   # VALUE_ANNOTATION
+    if vtype in (0x1E, 0x1F): return pos                                      # VALUE_NULL / BOOLEAN
+    out += src[pos:pos + varg + 1]
+    return pos + varg + 1
+
+def _copy_encoded_array(src: bytes, pos: int, out: bytearray, remap) -> int:
+    n, pos = _uleb128(src, pos); _put_uleb128(out, n)
+    for _ in range(n): pos = _copy_encoded_value(src, pos, out, remap)
+    return pos
+
+def _copy_encoded_annotation(src: bytes, pos: int, out: bytearray, remap) -> int:
+    pos = _copy_uleb128(src, pos, out)                  # type_idx
+    n, pos = _uleb128(src, pos); _put_uleb128(out, n)
+    for _ in range(n):
+        name, pos = _uleb128(src, pos); _put_uleb128(out, remap(name))
+        pos = _copy_encoded_value(src, pos, out, remap)
+    return pos
+
+def _copy_debug_info(src: bytes, pos: int, out: bytearray, remap) -> int:
+    def p1(pos):                                        # uleb128p1 string index
+        v, pos = _uleb128(src, pos)
+        _put_uleb128(out, remap(v - 1) + 1 if v else 0)
+        return pos
+    pos = _copy_uleb128(src, pos, out)                  # line_start
+    n, pos = _uleb128(src, pos); _put_uleb128(out, n)
+    for _ in range(n): pos = p1(pos)                    # parameter_names
+    while True:
+        op = src[pos]; pos += 1; out.append(op)
+        if op == 0x00: return pos                       # DBG_END_SEQUENCE
+        if op in (0x01, 0x02, 0x05, 0x06):              # ADVANCE_PC/LINE, END/RESTART_LOCAL
+            pos = _copy_uleb128(src, pos, out)
+        elif op == 0x03:                                # START_LOCAL reg, name, type
+            pos = _copy_uleb128(src, pos, out); pos = p1(pos)
+            pos = _copy_uleb128(src, pos, out)
+        elif op == 0x04:                                # START_LOCAL_EXTENDED reg, name, type, sig
+            pos = _copy_uleb128(src, pos, out); pos = p1(pos)
+            pos = _copy_uleb128(src, pos, out); pos = p1(pos)
+        elif op == 0x09:                                # SET_FILE name
+            pos = p1(pos)
+
+def _extend_string_pool(dex: bytearray, strings) -> Optional[dict]:
+    """
+    Make sure every string in `strings` is in the pool, adding the missing
+    ones in place. Returns {string: index} (indices valid for the new DEX),
+    or None when the DEX cannot take them — dex is then left untouched.
+    """
+    data = bytes(dex)
+    hdr  = _parse_header(data)
+    if not hdr: return None
+    add = sorted({s for s in strings if _find_string_idx(data, hdr, s) is None}, key=_str_key)
+    if not add:
+        return {s: _find_string_idx(data, hdr, s) for s in strings}
+
+    positions = [_string_insert_pos(data, hdr, s) for s in add]
+    def remap(i: int) -> int: return i + bisect_right(positions, i)
+
+    buf  = bytearray(data)
+    def remap_u32(at: int):
+        struct.pack_into('<I', buf, at, remap(struct.unpack_from('<I', buf, at)[0]))
+
+    try:
+        # ── fixed-width references: patched in place ─────────────────
+        for i in range(hdr['type_ids_size']):  remap_u32(hdr['type_ids_off']   + i * 4)
+        for i in range(hdr['proto_ids_size']): remap_u32(hdr['proto_ids_off']  + i * 12)
+        for i in range(hdr['field_ids_size']): remap_u32(hdr['field_ids_off']  + i * 8 + 4)
+        for i in range(hdr['method_ids_size']): remap_u32(hdr['method_ids_off'] + i * 8 + 4)
+        for i in range(hdr['class_defs_size']):
+            at = hdr['class_defs_off'] + i * 32 + 16
+            if struct.unpack_from('<I', buf, at)[0] != 0xFFFFFFFF: remap_u32(at)
+
+        table = _method_table(data, hdr)
+        for code_off in set(table.code_off):
+            if not code_off: continue
+            p   = code_off + 16
+            end = p + struct.unpack_from('<I', data, code_off + 12)[0] * 2
+            while p < end:
+                op = data[p]
+                if op == 0x1A:                              # const-string (21c)
+                    sidx = remap(struct.unpack_from('<H', data, p + 2)[0])
+                    if sidx > 0xFFFF:
+                        err(f"  const-string @ 0x{p:X} would need string index 0x{sidx:X} — pool not extended")
+                        return None
+                    struct.pack_into('<H', buf, p + 2, sidx)
+                elif op == 0x1B:                            # const-string/jumbo (31c)
+                    remap_u32(p + 2)
+                p += _insn_units(data, p) * 2
+
+        # ── variable-width references: sections re-encoded ───────────
+        sections = _parse_map_list(data, hdr)
+        rebuilt  = {}
+        for typ, cnt, off in sections:
+            if typ not in (TYPE_ANNOTATION_ITEM, TYPE_ENCODED_ARRAY_ITEM, TYPE_DEBUG_INFO_ITEM):
+                continue
+            out, moved, pos = bytearray(), {}, off
+            for _ in range(cnt):
+                moved[pos] = len(out)
+                if typ == TYPE_ANNOTATION_ITEM:
+                    out.append(data[pos])                   # visibility
+                    pos = _copy_encoded_annotation(data, pos + 1, out, remap)
+                elif typ == TYPE_ENCODED_ARRAY_ITEM:
+                    pos = _copy_encoded_array(data, pos, out, remap)
+                else:
+                    pos = _copy_debug_info(data, pos, out, remap)
+            rebuilt[typ] = (bytes(out), moved)
+
+        # ── string_ids (re-sorted) + string_data (appended) ──────────
+        n_old = hdr['string_ids_size']
+        ids   = bytearray((n_old + len(add)) * 4)
+        sd_last = 0
+        for i in range(n_old):
+            sd_off = struct.unpack_from('<I', data, hdr['string_ids_off'] + i * 4)[0]
+            struct.pack_into('<I', ids, remap(i) * 4, sd_off)
+            sd_last = max(sd_last, sd_off)
+        sd_start = next(off for typ, _, off in sections if typ == TYPE_STRING_DATA_ITEM)
+        sd_end   = data.index(0, _skip_uleb128(data, sd_last)) + 1   # end of the last item
+        tail, sd_moved = bytearray(), {}
+        for j, (s, p) in enumerate(zip(add, positions)):
+            synthetic = len(data) + j                       # "old" offset for a new item
+            struct.pack_into('<I', ids, (p + j) * 4, synthetic)
+            sd_moved[synthetic] = sd_end - sd_start + len(tail)
+            enc, utf16_len = _mutf8(s)
+            _put_uleb128(tail, utf16_len); tail += enc + b'\0'
+        rebuilt[TYPE_STRING_ID_ITEM]   = (bytes(ids), {})
+        rebuilt[TYPE_STRING_DATA_ITEM] = (data[sd_start:sd_end] + bytes(tail), sd_moved)
+
+        grown = {TYPE_STRING_ID_ITEM:   n_old + len(add),
+                 TYPE_STRING_DATA_ITEM: next(c for t, c, _ in sections if t == TYPE_STRING_DATA_ITEM) + len(add)}
+        out = _relayout(bytes(buf), hdr, rebuilt, grown)
+    except (IndexError, ValueError, struct.error, StopIteration) as exc:
+        err(f"  String pool extension failed: {exc!r} — DEX untouched")
+        return None
+
+    ok(f"  ✓ String pool +{len(add)} ({n_old} → {n_old + len(add)}), "
+       f"{len(data)//1024}K → {len(out)//1024}K")
+    dex[:] = out
+    new_idx = {s: p + j for j, (s, p) in enumerate(zip(add, positions))}
+    return {s: new_idx[s] if s in new_idx else remap(_find_string_idx(data, hdr, s))
+            for s in strings}
+
+
 # ════════════════════════════════════════════════════════════════════
 #  BINARY PATCH: swap string literal reference
 #  Used for: MIUIFrequentPhrase Gboard redirect (no apktool, no timeout)
@@ -649,21 +1262,37 @@ def binary_swap_field_ref(dex: bytearray,
 
 def _find_string_idx(data: bytes, hdr: dict, target: str) -> Optional[int]:
     """Binary search the sorted DEX string pool. Returns index or None."""
+    key = _str_key(target)
     lo, hi = 0, hdr['string_ids_size'] - 1
     while lo <= hi:
         mid = (lo + hi) // 2
-        s   = _get_str(data, hdr, mid)
-        if s == target: return mid
-        if s < target:  lo = mid + 1
-        else:           hi = mid - 1
+        s   = _str_key_at(data, hdr, mid)
+        if s == key: return mid
+        if s < key:  lo = mid + 1
+        else:        hi = mid - 1
     return None
 
+def _const_string_refs(data: bytes, hdr: dict, sidx: int, only_class: str = None) -> list:
+    """Byte offsets of const-string / const-string/jumbo instructions loading string sidx."""
+    refs = []
+    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr, only_class):
+        p, end = insns_off, insns_off + insns_len
+        while p < end:
+            op = data[p]
+            if op == 0x1A and struct.unpack_from('<H', data, p + 2)[0] == sidx:    # 21c
+                refs.append(p)
+            elif op == 0x1B and struct.unpack_from('<I', data, p + 2)[0] == sidx:  # 31c
+                refs.append(p)
+            p += _insn_units(data, p) * 2
+    return refs
+
 def binary_swap_string(dex: bytearray, old_str: str, new_str: str,
                        only_class: str = None) -> int:
     """
     Replace const-string / const-string-jumbo instructions that reference
     old_str with ones that reference new_str.
-    new_str must already exist in the DEX string pool (not injected).
+    If new_str is not in the DEX string pool it is added first
+    (_extend_string_pool) — only when there is at least one ref to swap.
     Only scans verified code_item instruction arrays.
     Returns count of replacements.
     """
@@ -674,40 +1303,39 @@ def binary_swap_string(dex: bytearray, old_str: str, new_str: str,
     old_idx = _find_string_idx(data, hdr, old_str)
     if old_idx is None:
         warn(f"  String '{old_str}' not in DEX pool — skip"); return 0
+    refs = _const_string_refs(data, hdr, old_idx, only_class)
+    if not refs:
+        warn(f"  No const-string refs to '{old_str}' found"
+             + (f" in {only_class}" if only_class else ""))
+        return 0
+
     new_idx = _find_string_idx(data, hdr, new_str)
     if new_idx is None:
-        warn(f"  String '{new_str}' not in DEX pool — cannot swap"); return 0
+        info(f"  String '{new_str}' not in DEX pool — extending pool")
+        if _extend_string_pool(dex, [new_str]) is None:
+            warn(f"  String '{new_str}' could not be added — cannot swap"); return 0
+        data    = bytes(dex)
+        hdr     = _parse_header(data)
+        old_idx = _find_string_idx(data, hdr, old_str)
+        new_idx = _find_string_idx(data, hdr, new_str)
+        refs    = _const_string_refs(data, hdr, old_idx, only_class)
 
     info(f"  String swap: idx[{old_idx}] '{old_str}' → idx[{new_idx}] '{new_str}'")
     raw   = bytearray(dex)
     count = 0
 
-    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr):
-        if only_class and only_class not in type_str: continue
-        i = 0
-        while i < insns_len - 3:
-            op = raw[insns_off + i]
-            if op == 0x1A and i + 3 < insns_len:    # const-string (21c, 4 bytes)
-                sidx = struct.unpack_from('<H', raw, insns_off + i + 2)[0]
-                if sidx == old_idx:
-                    struct.pack_into('<H', raw, insns_off + i + 2, new_idx & 0xFFFF)
-                    count += 1
-                i += 4
-            elif op == 0x1B and i + 5 < insns_len:  # const-string/jumbo (31c, 6 bytes)
-                sidx = struct.unpack_from('<I', raw, insns_off + i + 2)[0]
-                if sidx == old_idx:
-                    struct.pack_into('<I', raw, insns_off + i + 2, new_idx)
-                    count += 1
-                i += 6
-            else:
-                i += 2
+    for p in refs:
+        if raw[p] == 0x1A:                      # const-string (21c, 16-bit index)
+            if new_idx > 0xFFFF:
+                warn(f"  const-string @ 0x{p:X}: idx 0x{new_idx:X} needs jumbo — skipped"); continue
+            struct.pack_into('<H', raw, p + 2, new_idx)
+        else:                                   # const-string/jumbo (31c)
+            struct.pack_into('<I', raw, p + 2, new_idx)
+        count += 1
 
     if count:
-        _fix_checksums(raw); dex[:] = raw
+        _fix_checksums(raw, _method_table(data, hdr)); dex[:] = raw
         ok(f"  ✓ '{old_str}' → '{new_str}': {count} ref(s) swapped")
-    else:
-        warn(f"  No const-string refs to '{old_str}' found"
-             + (f" in {only_class}" if only_class else ""))
     return count
 
 
@@ -721,23 +1349,177 @@ def list_dexes(archive: Path) -> list:
     return sorted(names, key=lambda x: 0 if x == "classes.dex"
                                        else int(re.search(r'\d+', x).group()))
 
-def _inject_dex(archive: Path, dex_name: str, dex_bytes: bytes) -> bool:
-    work = Path(tempfile.mkdtemp(prefix="dp_"))
+def _inject_dex(archive: Path, dexes: dict) -> bool:
+    """
+    MT-Manager style DEX injection: rewrites the APK/JAR once with every
+    patched DEX (name → bytes) swapped in. The DEXes and resources.arsc are
+    STORED, and every STORED entry is padded to its _align_for boundary, so
+    Android R+ accepts the APK without zip/zipalign. The archive is only
+    replaced once the rewrite is verified aligned.
+    """
+    tmp = archive.with_name(f"_dp_{archive.name}")
     try:
-        (work / dex_name).write_bytes(dex_bytes)
-        r = subprocess.run(["zip", "-0", "-u", str(archive), dex_name],
-                           cwd=str(work), capture_output=True, text=True)
-        if r.returncode not in (0, 12):
-            err(f"  zip failed rc={r.returncode}: {r.stderr[:200]}"); return False
+        with zipfile.ZipFile(archive) as zin, zipfile.ZipFile(tmp, "w") as zout:
+            for item in zin.infolist():
+                data = dexes.get(item.filename)
+                if data is None:
+                    data = zin.read(item.filename)
+                stored = item.filename in dexes or item.filename == "resources.arsc" \
+                    or item.compress_type == zipfile.ZIP_STORED
+                new = zipfile.ZipInfo(item.filename, item.date_time)
+                new.compress_type = zipfile.ZIP_STORED if stored else item.compress_type
+                new.external_attr, new.comment = item.external_attr, item.comment
+                if stored and not item.is_dir():
+                    start = zout.fp.tell() + _ZIP_LOCAL_HEADER + len(item.filename.encode("utf-8"))
+                    new.extra = b"\0" * (-start % _align_for(item.filename))
+                else:
+                    new.extra = item.extra
+                zout.writestr(new, data)
+        bad = _misaligned(tmp)
+        if bad:
+            err(f"  rewrite left {len(bad)} entr(ies) unaligned: {', '.join(bad[:5])}")
+            tmp.unlink(missing_ok=True); return False
+        os.replace(tmp, archive)
         return True
     except Exception as exc:
-        err(f"  inject crash: {exc}"); return False
-    finally:
-        shutil.rmtree(work, ignore_errors=True)
+        err(f"  inject crash: {exc}"); tmp.unlink(missing_ok=True); return False
+
+def _stale_artifacts(archive: Path) -> list:
+    """
+    Prebuilt ART output that no longer matches a rewritten archive:
+      <dir>/oat/<arch>/<stem>.{odex,vdex,art}   — app / system_server / jar
+      <dir>/<arch>/boot*.{art,oat,vdex}, <dir>/boot*.vdex
+                                                 — whole boot image, when the
+                                                   archive is a boot classpath jar
+    """
+    d, stem = archive.parent, archive.stem
+    found = [p for p in d.glob(f'oat/*/{stem}.*') if p.suffix in ('.odex', '.vdex', '.art')]
+    if any(d.glob(f'*/boot-{stem}.*')) or any(d.glob(f'boot-{stem}.vdex')):
+        # boot image checksums cover every boot classpath jar → all of it is stale
+        found += [p for p in d.glob('*/boot*.*') if p.suffix in ('.art', '.oat', '.vdex')]
+        found += list(d.glob('boot*.vdex'))
+    return sorted(set(p for p in found if p.is_file()))
+
+def _invalidate_oat(archive: Path) -> int:
+    """
+    Remove stale odex/vdex/boot image files next to a patched archive so ART
+    regenerates them instead of rejecting them at boot. DEX_KEEP_OAT=1 only
+    reports them. Returns bytes reclaimed.
+    """
+    stale = _stale_artifacts(archive)
+    if not stale: return 0
+    keep = os.environ.get("DEX_KEEP_OAT") == "1"
+    size = 0
+    for p in stale:
+        size += p.stat().st_size
+        rel = p.relative_to(archive.parent)
+        if keep:
+            warn(f"  stale: {rel}")
+        else:
+            p.unlink(); info(f"  removed: {rel}")
+    if keep:
+        warn(f"⚠ {len(stale)} stale ART file(s) kept ({size//1024}K) — DEX_KEEP_OAT=1")
+        return 0
+    ok(f"✓ Invalidated {len(stale)} stale ART file(s), reclaimed {size//1024}K")
+    return size
+
+
+# ════════════════════════════════════════════════════════════════════
+#  CLASS LOCATOR  (which DEX owns a class, without inflating every DEX)
+#
+#  Only the header, the id tables and the class descriptor strings are
+#  needed to know which classes a DEX defines. _dex_class_types streams
+#  the zip entry, inflating just far enough to cover them, and stops.
+#  The resulting {dex: [class descriptors]} index is cached on disk keyed
+#  by the archive's DEX entry CRCs (central directory — no inflation), so
+#  profiles run later against the same archive reuse it. A patched DEX
+#  keeps its classes, so the index is re-filed under the new key.
+# ════════════════════════════════════════════════════════════════════
+
+_INDEX_DIR = Path(os.environ.get("DEX_INDEX_DIR", Path(tempfile.gettempdir()) / "dex_class_index"))
+_INDEX_MEM: dict = {}
+
+def _dex_class_types(stream) -> list:
+    """Class descriptors defined by the DEX on `stream` (read-only, early stop)."""
+    buf = bytearray()
+    def need(n: int):
+        while len(buf) < n:
+            chunk = stream.read(max(n - len(buf), 1 << 16))
+            if not chunk: raise EOFError("DEX truncated")
+            buf.extend(chunk)
+
+    need(0x70)
+    hdr = _parse_header(buf)
+    if not hdr: raise ValueError("not a DEX")
+    need(max(hdr['class_defs_off'] + hdr['class_defs_size'] * 32,
+             hdr['type_ids_off']   + hdr['type_ids_size']   * 4,
+             hdr['string_ids_off'] + hdr['string_ids_size'] * 4))
+    str_offs = []
+    for ci in range(hdr['class_defs_size']):
+        tidx = struct.unpack_from('<I', buf, hdr['class_defs_off'] + ci * 32)[0]
+        sidx = struct.unpack_from('<I', buf, hdr['type_ids_off'] + tidx * 4)[0]
+        str_offs.append(struct.unpack_from('<I', buf, hdr['string_ids_off'] + sidx * 4)[0])
+    if not str_offs: return []
+    need(max(str_offs) + 5)
+    out = []
+    for off in str_offs:
+        co = _skip_uleb128(buf, off)
+        while (end := buf.find(0, co)) < 0: need(len(buf) + 256)
+        out.append(buf[co:end].decode('utf-8', errors='replace'))
+    return out
+
+def _index_key(archive: Path, names: list) -> str:
+    with zipfile.ZipFile(archive) as z:
+        sig = ''.join(f'{n}:{z.getinfo(n).CRC:08x};' for n in names)
+    return f'{zlib.crc32(sig.encode()):08x}-{len(names)}'
+
+def _save_index(key: str, index: dict):
+    _INDEX_MEM[key] = index
+    try:
+        _INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _INDEX_DIR / f'{key}.json.tmp'
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, _INDEX_DIR / f'{key}.json')
+    except OSError:
+        pass                                                # cache is best-effort
+
+def dex_class_index(archive: Path) -> dict:
+    """{dex_name: [class descriptors]} for every DEX in the archive (cached)."""
+    names = list_dexes(archive)
+    key   = _index_key(archive, names)
+    if key in _INDEX_MEM: return _INDEX_MEM[key]
+    try:
+        index = json.loads((_INDEX_DIR / f'{key}.json').read_text())
+        _INDEX_MEM[key] = index
+        return index
+    except (OSError, ValueError):
+        pass
+    index = {}
+    with zipfile.ZipFile(archive) as z:
+        for n in names:
+            with z.open(n) as f:
+                index[n] = _dex_class_types(f)
+    _save_index(key, index)
+    return index
+
+def locate_classes(archive: Path, targets) -> Optional[list]:
+    """
+    DEX names defining a class whose descriptor ends with any of `targets`
+    (e.g. '/InternalDeviceUtils;'), in list_dexes order.
+    None when the index cannot be built → caller falls back to every DEX.
+    """
+    try:
+        index = dex_class_index(archive)
+    except (zipfile.BadZipFile, EOFError, ValueError, struct.error, OSError) as exc:
+        warn(f"  Class locator unavailable ({exc}) — scanning every DEX"); return None
+    targets = tuple(targets)
+    return [n for n, classes in index.items() if any(c.endswith(targets) for c in classes)]
 
-def run_patches(archive: Path, patch_fn, label: str) -> int:
+def run_patches(archive: Path, patch_fn, label: str, targets=None) -> int:
     """
     Run patch_fn(dex_name, dex_bytearray) on every DEX.
+    targets: class descriptor suffixes the profile touches → only the DEX(es)
+             defining them are inflated and patched (see locate_classes).
     ALWAYS exits 0 — graceful skip when nothing found (user requirement).
     """
     archive = archive.resolve()
@@ -748,10 +1530,20 @@ def run_patches(archive: Path, patch_fn, label: str) -> int:
     bak = Path(str(archive) + ".bak")
     if not bak.exists(): shutil.copy2(archive, bak); ok("✓ Backup created")
 
-    is_apk = archive.suffix.lower() == '.apk'
     count  = 0
-
-    for dex_name in list_dexes(archive):
+    dexes  = list_dexes(archive)
+    patched_dexes = {}
+
+    owners = locate_classes(archive, targets) if targets else None
+    if owners is not None:
+        if not owners:
+            warn(f"⚠ {label}: {', '.join(targets)} not defined in any DEX — archive unchanged")
+            return 0
+        info(f"Class locator: {', '.join(owners)} of {len(dexes)} DEX(es)")
+        index = dex_class_index(archive)                    # in-memory hit
+        dexes = owners
+
+    for dex_name in dexes:
         with zipfile.ZipFile(archive) as z:
             raw = bytearray(z.read(dex_name))
         info(f"→ {dex_name} ({len(raw)//1024}K)")
@@ -759,13 +1551,20 @@ def run_patches(archive: Path, patch_fn, label: str) -> int:
             patched = patch_fn(dex_name, raw)
         except Exception as exc:
             err(f"  patch_fn crash: {exc}"); traceback.print_exc(); continue
-        if not patched: continue
-        if not _inject_dex(archive, dex_name, bytes(raw)):
-            err(f"  Failed to inject {dex_name}"); continue
-        count += 1
-
+        if patched: patched_dexes[dex_name] = bytes(raw)
+
+    if patched_dexes:
+        if _inject_dex(archive, patched_dexes):
+            count = len(patched_dexes)
+            if archive.suffix.lower() == '.apk': ok("  ✓ resources.arsc + STORED entries aligned")
+        else:
+            err(f"  Failed to inject {', '.join(patched_dexes)} — archive unchanged")
+
+    if count > 0 and owners:
+        # classes are unchanged → re-file the index under the new entry CRCs
+        _save_index(_index_key(archive, list_dexes(archive)), index)
     if count > 0:
-        if is_apk: _zipalign(archive)
+        _invalidate_oat(archive)
         ok(f"✅ {label}: {count} DEX(es) patched  ({archive.stat().st_size//1024}K)")
     else:
         # Graceful skip — archive unchanged (backup exists but nothing was written)
@@ -839,24 +1638,15 @@ def _recorder_ai_patch(dex_name: str, dex: bytearray) -> bool:
             data = bytes(dex)
             hdr  = _parse_header(data)
             if hdr:
-                for i in range(hdr['class_defs_size']):
-                    base = hdr['class_defs_off'] + i * 32
-                    if struct.unpack_from('<I', data, base + 24)[0] == 0:
-                        continue
-                    cls_idx = struct.unpack_from('<I', data, base)[0]
-                    try:
-                        sidx     = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-                        type_str = _get_str(data, hdr, sidx)
-                        if ('AiDeviceUtil' in type_str
-                                and type_str.startswith('L')
-                                and type_str.endswith(';')):
-                            if binary_patch_method(dex, type_str[1:-1], "isAiSupportedDevice",
-                                                   stub_regs=1, stub_insns=_STUB_TRUE):
-                                patched = True
-                                raw = bytes(dex)
-                                break
-                    except Exception:
-                        continue
+                for type_str in _iter_class_types(data, hdr):
+                    if ('AiDeviceUtil' in type_str
+                            and type_str.startswith('L')
+                            and type_str.endswith(';')):
+                        if binary_patch_method(dex, type_str[1:-1], "isAiSupportedDevice",
+                                               stub_regs=1, stub_insns=_STUB_TRUE):
+                            patched = True
+                            raw = bytes(dex)
+                            break
 
     # Pass 2 — IS_INTERNATIONAL_BUILD region gate
     if b'IS_INTERNATIONAL_BUILD' in raw:
@@ -956,7 +1746,7 @@ def _services_jar_patch(dex_name: str, dex: bytearray) -> bool:
 
     for insns_off, insns_len, type_str, mname in _iter_code_items(raw, hdr):
         i = 0
-        while i <= insns_len * 2 - 6:   # need 6 bytes ahead
+        while i <= insns_len - 6:       # need 6 bytes ahead (insns_len is in bytes)
             op = raw[insns_off + i]
             if op in INVOKE_OPS_ALL:
                 mid_ref = struct.unpack_from('<H', raw, insns_off + i + 2)[0]
@@ -975,7 +1765,7 @@ def _services_jar_patch(dex_name: str, dex: bytearray) -> bool:
         warn(f"  No invoke-virtual call site for {METHOD} found — DEX unchanged")
         return False
 
-    _fix_checksums(raw_w)
+    _fix_checksums(raw_w, _method_table(raw, hdr))
     dex[:] = raw_w
     ok(f"  ✓ {METHOD}: {count} call site(s) NOP'd")
     return True
@@ -1110,7 +1900,7 @@ def _miui_framework_patch(dex_name: str, dex: bytearray) -> bool:
       on CN ROMs running in global mode.
 
     NOTE: IS_GLOBAL_BUILD is NOT patched here (Settings crash risk).
-          Gboard IME swap is done via apktool in manager (string not in DEX pool).
+          Gboard IME swap adds the package string to the DEX pool when absent.
     """
     raw = bytes(dex)
     patched = False
@@ -1125,7 +1915,7 @@ def _miui_framework_patch(dex_name: str, dex: bytearray) -> bool:
             patched = True
             raw = bytes(dex)
 
-    # Pass 1b — Gboard swap in InputMethodServiceInjector (binary, no-op if string absent)
+    # Pass 1b — Gboard swap in InputMethodServiceInjector (binary, pool extended if needed)
     #   Replaces "com.baidu.input_mi" with "com.google.android.inputmethod.latin"
     #   in the InputMethodServiceInjector class.
     if _BAIDU_IME.encode() in raw:
@@ -1139,21 +1929,12 @@ def _miui_framework_patch(dex_name: str, dex: bytearray) -> bool:
     if b'ActivityTaskManagerInternal' in raw:
         hdr = _parse_header(raw)
         if hdr:
-            for i in range(hdr['class_defs_size']):
-                base = hdr['class_defs_off'] + i * 32
-                if struct.unpack_from('<I', raw, base + 24)[0] == 0: continue
-                cls_idx = struct.unpack_from('<I', raw, base)[0]
-                try:
-                    sidx     = struct.unpack_from('<I', raw, hdr['type_ids_off'] + cls_idx * 4)[0]
-                    type_str = _get_str(raw, hdr, sidx)
-                    if 'ActivityTaskManagerInternal' not in type_str: continue
-                    cls_path = type_str[1:-1]
-                    if binary_patch_method(dex, cls_path,
-                            'showSystemReadyErrorDialogsIfNeeded', 1, _STUB_VOID):
-                        patched = True
-                        raw = bytes(dex)
-                except Exception:
-                    continue
+            for type_str in _iter_class_types(raw, hdr):
+                if 'ActivityTaskManagerInternal' not in type_str: continue
+                cls_path = type_str[1:-1]
+                if binary_patch_method(dex, cls_path,
+                        'showSystemReadyErrorDialogsIfNeeded', 1, _STUB_VOID):
+                    patched = True
 
     return patched
 
@@ -1179,8 +1960,7 @@ def _patch_sget_exact_v0(dex: bytearray,
     raw   = bytearray(dex)
     count = 0
 
-    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr):
-        if only_class not in type_str: continue
+    for insns_off, insns_len, type_str, mname in _iter_code_items(data, hdr, only_class):
         i = 0
         while i < insns_len - 3:
             op = raw[insns_off + i]
@@ -1199,7 +1979,7 @@ def _patch_sget_exact_v0(dex: bytearray,
                 i += 2
 
     if count:
-        _fix_checksums(raw); dex[:] = raw
+        _fix_checksums(raw, _method_table(data, hdr)); dex[:] = raw
         ok(f"  ✓ {field_name} (v0 only): {count} sget → const/4 1 in {only_class}")
     return count
 
@@ -1241,23 +2021,15 @@ def _settings_region_patch(dex_name: str, dex: bytearray) -> bool:
         data = bytes(dex)
         hdr  = _parse_header(data)
         if hdr:
-            for i in range(hdr['class_defs_size']):
-                base = hdr['class_defs_off'] + i * 32
-                if struct.unpack_from('<I', data, base + 24)[0] == 0: continue
-                cls_idx = struct.unpack_from('<I', data, base)[0]
-                try:
-                    sidx     = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-                    type_str = _get_str(data, hdr, sidx)
-                    if type_str.endswith('/GeminiController;') and type_str.startswith('L'):
-                        cls_path = type_str[1:-1]
-                        if binary_patch_method(dex, cls_path,
-                                'getAvailabilityStatus', 1, _STUB_TRUE,
-                                trim=True):
-                            ok(f"  ✓ GeminiController::getAvailabilityStatus → return 1")
-                            n += 1
-                            break
-                except Exception:
-                    continue
+            for type_str in _iter_class_types(data, hdr):
+                if type_str.endswith('/GeminiController;') and type_str.startswith('L'):
+                    cls_path = type_str[1:-1]
+                    if binary_patch_method(dex, cls_path,
+                            'getAvailabilityStatus', 1, _STUB_TRUE,
+                            trim=True):
+                        ok(f"  ✓ GeminiController::getAvailabilityStatus → return 1")
+                        n += 1
+                        break
 
     return n > 0
 
@@ -1312,27 +2084,18 @@ def _settings_foldpager_patch(dex_name: str, dex: bytearray) -> bool:
         hdr  = _parse_header(data)
         found_displayresource = False
         if hdr:
-            for i in range(hdr['class_defs_size']):
-                base = hdr['class_defs_off'] + i * 32
-                if struct.unpack_from('<I', data, base + 24)[0] == 0:
-                    continue
-                cls_idx = struct.unpack_from('<I', data, base)[0]
-                try:
-                    sidx     = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-                    type_str = _get_str(data, hdr, sidx)
-                    if ('MiuiFoldScreenSettings' in type_str
-                            and not '$' in type_str        # skip inner/anonymous classes
-                            and type_str.startswith('L')):
-                        cls_path = type_str[1:-1]
-                        if binary_patch_method(dex, cls_path,
-                                "displayResourceTilesToScreen", 0, _STUB_VOID,
-                                trim=True):
-                            ok(f"  ✓ displayResourceTilesToScreen → void  ({type_str})")
-                            patched = True
-                            found_displayresource = True
-                            break
-                except Exception:
-                    continue
+            for type_str in _iter_class_types(data, hdr):
+                if ('MiuiFoldScreenSettings' in type_str
+                        and not '$' in type_str        # skip inner/anonymous classes
+                        and type_str.startswith('L')):
+                    cls_path = type_str[1:-1]
+                    if binary_patch_method(dex, cls_path,
+                            "displayResourceTilesToScreen", 0, _STUB_VOID,
+                            trim=True):
+                        ok(f"  ✓ displayResourceTilesToScreen → void  ({type_str})")
+                        patched = True
+                        found_displayresource = True
+                        break
         if not found_displayresource:
             # Method absent in this build — acceptable, not a crash source by itself.
             info("  displayResourceTilesToScreen: not present in this build — skipped")
@@ -1348,29 +2111,20 @@ def _settings_foldpager_patch(dex_name: str, dex: bytearray) -> bool:
         data = bytes(dex)
         hdr  = _parse_header(data)
         if hdr:
-            for i in range(hdr['class_defs_size']):
-                base = hdr['class_defs_off'] + i * 32
-                if struct.unpack_from('<I', data, base + 24)[0] == 0:
-                    continue
-                cls_idx = struct.unpack_from('<I', data, base)[0]
-                try:
-                    sidx     = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-                    type_str = _get_str(data, hdr, sidx)
-                    # Target: classes whose simple name contains "Fold" and "Controller"
-                    # but are NOT MiuiFoldScreenSettings itself (handled by Patch 2)
-                    simple   = type_str.split('/')[-1].rstrip(';')
-                    if ('Fold' in simple
-                            and 'Controller' in simple
-                            and 'MiuiFoldScreenSettings' not in simple
-                            and type_str.startswith('L')):
-                        cls_path = type_str[1:-1]
-                        if binary_patch_method(dex, cls_path,
-                                "getAvailabilityStatus", 1, _STUB_UNSUPPORTED,
-                                trim=True):
-                            ok(f"  ✓ {simple}::getAvailabilityStatus → UNAVAILABLE (crash-guard)")
-                            patched = True
-                except Exception:
-                    continue
+            for type_str in _iter_class_types(data, hdr):
+                # Target: classes whose simple name contains "Fold" and "Controller"
+                # but are NOT MiuiFoldScreenSettings itself (handled by Patch 2)
+                simple   = type_str.split('/')[-1].rstrip(';')
+                if ('Fold' in simple
+                        and 'Controller' in simple
+                        and 'MiuiFoldScreenSettings' not in simple
+                        and type_str.startswith('L')):
+                    cls_path = type_str[1:-1]
+                    if binary_patch_method(dex, cls_path,
+                            "getAvailabilityStatus", 1, _STUB_UNSUPPORTED,
+                            trim=True):
+                        ok(f"  ✓ {simple}::getAvailabilityStatus → UNAVAILABLE (crash-guard)")
+                        patched = True
 
     return patched
 
@@ -1400,23 +2154,14 @@ def _incallui_patch(dex_name: str, dex: bytearray) -> bool:
     if not hdr:
         warn("  Cannot parse DEX header"); return False
 
-    for i in range(hdr['class_defs_size']):
-        base = hdr['class_defs_off'] + i * 32
-        if struct.unpack_from('<I', data, base + 24)[0] == 0:
-            continue
-        cls_idx = struct.unpack_from('<I', data, base)[0]
-        try:
-            sidx     = struct.unpack_from('<I', data, hdr['type_ids_off'] + cls_idx * 4)[0]
-            type_str = _get_str(data, hdr, sidx)
-            # Match exact simple class name: ends with /RecorderUtils;
-            if type_str.endswith('/RecorderUtils;') and type_str.startswith('L'):
-                cls_path = type_str[1:-1]
-                info(f"  Found: {type_str} — trying isAiRecordEnable")
-                if binary_patch_method(dex, cls_path, "isAiRecordEnable",
-                                       stub_regs=1, stub_insns=_STUB_TRUE):
-                    return True
-        except Exception:
-            continue
+    for type_str in _iter_class_types(data, hdr):
+        # Match exact simple class name: ends with /RecorderUtils;
+        if type_str.endswith('/RecorderUtils;') and type_str.startswith('L'):
+            cls_path = type_str[1:-1]
+            info(f"  Found: {type_str} — trying isAiRecordEnable")
+            if binary_patch_method(dex, cls_path, "isAiRecordEnable",
+                                   stub_regs=1, stub_insns=_STUB_TRUE):
+                return True
 
     warn("  RecorderUtils::isAiRecordEnable not found in any class")
     return False
@@ -1444,6 +2189,41 @@ def _miuifreqphrase_patch(dex_name: str, dex: bytearray) -> bool:
     return n > 0
 
 
+# ── MiuiBooster.jar — device level override  ─────────────────────
+_BOOST_CLASS  = "com/miui/performance/DeviceLevelUtils"
+_BOOST_LEVELS = "v:1,c:3,g:3"
+
+def _miui_booster_patch(dex_name: str, dex: bytearray) -> bool:
+    """
+    DeviceLevelUtils::initDeviceLevel()V →
+        const-string v0, "v:1,c:3,g:3"
+        invoke-direct {p0, v0}, ->parseDeviceLevelList(Ljava/lang/String;)V
+        return-void
+    Longer than some stock bodies → relocated code_item when needed.
+    The level string is added to the pool if the DEX lacks it.
+    """
+    if b'DeviceLevelUtils' not in bytes(dex): return False
+    data = bytes(dex)
+    hdr  = _parse_header(data)
+    if not hdr or _method_table(data, hdr).find_class(f'L{_BOOST_CLASS};') is None:
+        return False
+    if _find_string_idx(data, hdr, _BOOST_LEVELS) is None:
+        if _extend_string_pool(dex, [_BOOST_LEVELS]) is None: return False
+        data = bytes(dex); hdr = _parse_header(data)
+    sidx = _find_string_idx(data, hdr, _BOOST_LEVELS)
+    midx = _find_method_idx(data, hdr, f'L{_BOOST_CLASS};',
+                            "parseDeviceLevelList", "(Ljava/lang/String;)V")
+    if midx is None:
+        warn("  parseDeviceLevelList(Ljava/lang/String;)V not found"); return False
+    if sidx > 0xFFFF:
+        const = struct.pack('<BBI', 0x1B, 0x00, sidx)                 # const-string/jumbo v0
+    else:
+        const = struct.pack('<BBH', 0x1A, 0x00, sidx)                 # const-string v0
+    stub = (const
+            + struct.pack('<BBHBB', 0x70, 0x20, midx, 0x01, 0x00)     # invoke-direct {v1(p0), v0}
+            + _STUB_VOID)
+    return binary_patch_method(dex, _BOOST_CLASS, "initDeviceLevel", 1, stub)
+
 # ════════════════════════════════════════════════════════════════════
 #  COMMAND TABLE  +  ENTRY POINT
 # ════════════════════════════════════════════════════════════════════
@@ -1459,6 +2239,17 @@ PROFILES = {
     "incallui-ai":       _incallui_patch,           # RecorderUtils::isAiRecordEnable
     "settings-foldpager": _settings_foldpager_patch,  # Fold-Pager: fold screen + tile display
     "services-jar":       _services_jar_patch,        # showSystemReadyErrorDialogsIfNeeded NOP
+    "miui-booster":       _miui_booster_patch,        # DeviceLevelUtils::initDeviceLevel v:1,c:3,g:3
+    "framework-sig":      _fw_sig_patch,              # ApkSignatureVerifier min scheme = 1
+}
+
+# Single-class profiles: only the DEX defining one of these is inflated.
+# Profiles that sweep a field across the whole DEX must NOT be listed.
+PROFILE_CLASSES = {
+    "settings-ai":   ("/InternalDeviceUtils;",),
+    "incallui-ai":   ("/RecorderUtils;",),
+    "miui-booster":  ("/DeviceLevelUtils;",),
+    "framework-sig": ("/ApkSignatureVerifier;",),
 }
 
 def main():
@@ -1470,7 +2261,7 @@ def main():
     if cmd == "verify": cmd_verify(); return
     if len(sys.argv) < 3:
         err(f"Usage: dex_patcher.py {cmd} <archive>"); sys.exit(1)
-    run_patches(Path(sys.argv[2]), PROFILES[cmd], cmd)
+    run_patches(Path(sys.argv[2]), PROFILES[cmd], cmd, PROFILE_CLASSES.get(cmd))
     sys.exit(0)   # ALWAYS exit 0 — graceful skip when nothing found
 
 if __name__ == "__main__":
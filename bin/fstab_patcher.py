@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+fstab_patcher.py  ─  NexDroid fstab patcher (AVB strip + ext4 fallback)
+═══════════════════════════════════════════════════════════════════════════════
+Shared by mod.sh (vendor dump) and oplus_odm_patcher.sh (vendor project):
+one process patches every fstab* file below the given directories.
+
+  OP1  Remove AVB flags (avb, avb=vbmeta*, avb_keys=…, verify) from the
+       fs_mgr_flags column. Only that column is rewritten; the rest of the
+       line keeps its original whitespace.
+  OP2  After each erofs "logical" entry, add an ext4 entry for the same
+       mount point (unless the file already has one), so a repacked ext4
+       partition still mounts.
+
+Lines that are comments, shorter than 5 columns, or longer than 5 columns
+(overlay / long firmware lines) are passed through byte for byte. Files
+without changes are not rewritten.
+
+Usage:
+  fstab_patcher.py <dir | fstab file> ... [-j N] [--dry-run] [--json]
+
+Exit status: 0 done, 1 a file could not be patched, 2 no fstab files found.
+"""
+
+import sys, os, re, json, argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional, Tuple
+
+# AVB flag patterns to remove from fs_mgr_flags
+AVB_PATTERNS = [
+    re.compile(r',?avb=vbmeta_system'),
+    re.compile(r',?avb=vbmeta\b'),
+    re.compile(r',?avb_keys=[^,]*'),
+    re.compile(r',?(?<![a-z_])verify(?![a-z_])'),
+    re.compile(r',?(?<![a-z_])avb(?![a-z_=])'),
+]
+_LEADING_COMMAS  = re.compile(r'^,+')
+_TRAILING_COMMAS = re.compile(r',+$')
+_REPEAT_COMMAS   = re.compile(r',{2,}')
+
+EXT4_MNT_FLAGS = "ro,barrier=1,discard"
+
+@dataclass
+class Change:
+    line: int            # 1-based line number in the original file
+    kind: str            # "avb" (flags stripped) or "ext4" (fallback added)
+    mount: str
+    old: str             # "" for added lines
+    new: str
+
+@dataclass
+class FstabResult:
+    path: str
+    changes: List[Change] = field(default_factory=list)
+    error: Optional[str] = None
+
+def strip_avb(fsmgr: str) -> str:
+    new = fsmgr
+    for pat in AVB_PATTERNS:
+        new = pat.sub('', new)
+    new = _LEADING_COMMAS.sub('', new)
+    new = _TRAILING_COMMAS.sub('', new)
+    new = _REPEAT_COMMAS.sub(',', new)
+    return new or 'defaults'
+
+def patch_lines(lines: List[str]) -> Tuple[List[str], List[Change]]:
+    # Pre-scan: (mount_point, fstype) pairs already in the file
+    existing_pairs = set()
+    for line in lines:
+        s = line.strip()
+        if s and not s.startswith('#'):
+            cols = s.split()
+            if len(cols) >= 3:
+                existing_pairs.add((cols[1], cols[2]))
+
+    output, changes = [], []
+    for no, line in enumerate(lines, 1):
+        stripped = line.strip()
+        tokens = stripped.split() if stripped and not stripped.startswith('#') else []
+        # Exactly 5 tokens: src, mnt, fstype, mntopts, fsmgr — anything else passes through
+        if len(tokens) != 5:
+            output.append(line)
+            continue
+
+        src, mnt, fstype, _, fsmgr = tokens
+        is_logical = 'logical' in fsmgr.split(',')
+
+        # OP1: remove AVB flags, replacing only the last column
+        new_fsmgr = strip_avb(fsmgr)
+        if new_fsmgr != fsmgr:
+            reconstructed = stripped[:stripped.rfind(fsmgr)] + new_fsmgr
+            trailing = line[len(line.rstrip()):] or '\n'
+            output.append(reconstructed + trailing)
+            changes.append(Change(no, "avb", mnt, stripped, reconstructed))
+        else:
+            output.append(line)
+
+        # OP2: ext4 fallback for erofs logical partitions
+        if fstype == 'erofs' and is_logical and (mnt, 'ext4') not in existing_pairs:
+            ext4_line = f"{src:<56}{mnt:<23}{'ext4':<8}{EXT4_MNT_FLAGS:<53}{new_fsmgr}"
+            output.append(ext4_line + '\n')
+            changes.append(Change(no, "ext4", mnt, "", ext4_line))
+    return output, changes
+
+def patch_file(path: str, dry_run: bool = False) -> FstabResult:
+    result = FstabResult(path)
+    try:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except UnicodeDecodeError:
+            with open(path, 'r', encoding='latin-1') as f:
+                lines = f.readlines()
+        output, result.changes = patch_lines(lines)
+        if result.changes and not dry_run:
+            with open(path, 'w', encoding='utf-8', newline='\n') as f:
+                f.writelines(output)
+    except OSError as e:
+        result.error = str(e)
+    return result
+
+def find_fstabs(targets: List[str]) -> List[str]:
+    """Regular files named fstab* (like `find -name "fstab*" -type f`)."""
+    found = []
+    for t in targets:
+        if os.path.isfile(t) and not os.path.islink(t):
+            found.append(t)
+            continue
+        for root, _, files in os.walk(t):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.startswith("fstab") and os.path.isfile(path) and not os.path.islink(path):
+                    found.append(path)
+    return sorted(found)
+
+def patch_tree(targets: List[str], workers: int = 1, dry_run: bool = False) -> List[FstabResult]:
+    paths = find_fstabs(targets)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            return list(pool.map(patch_file, paths, [dry_run] * len(paths)))
+    return [patch_file(p, dry_run) for p in paths]
+
+def print_summary(results: List[FstabResult], base: str = "") -> None:
+    for r in results:
+        name = os.path.relpath(r.path, base) if base else r.path
+        if r.error:
+            print(f"ERROR {name}: {r.error}")
+        elif not r.changes:
+            print(f"{name}: no changes")
+        else:
+            avb = sum(1 for c in r.changes if c.kind == "avb")
+            print(f"{name}: {avb} AVB strip(s), {len(r.changes) - avb} ext4 fallback(s)")
+            for c in r.changes:
+                if c.old:
+                    print(f"  L{c.line:<4} - {c.old}")
+                print(f"  L{c.line:<4} + {c.new}")
+    patched = sum(1 for r in results if r.changes)
+    errors = sum(1 for r in results if r.error)
+    total = sum(len(r.changes) for r in results)
+    print(f"{len(results)} fstab file(s): {patched} patched, {len(results) - patched - errors} unchanged, "
+          f"{errors} failed, {total} change(s)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Strip AVB flags and add ext4 fallbacks in fstab files")
+    ap.add_argument("targets", nargs="+", help="directories to search for fstab*, or fstab files")
+    ap.add_argument("-j", "--jobs", type=int, default=1, help="worker processes")
+    ap.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = ap.parse_args()
+
+    results = patch_tree(args.targets, args.jobs, args.dry_run)
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        print_summary(results, args.targets[0] if len(args.targets) == 1 and os.path.isdir(args.targets[0]) else "")
+    if not results:
+        sys.exit(2)
+    sys.exit(1 if any(r.error for r in results) else 0)
+
+if __name__ == "__main__":
+    main()
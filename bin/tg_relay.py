@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+tg_relay.py  ─  NexDroid build progress relay for Telegram
+═══════════════════════════════════════════════════════════════════════════════
+mod.sh writes status events to a FIFO; this process owns the progress
+message and talks to the Bot API, so the build never waits on Telegram.
+
+  • Only the latest state is kept — a burst of stages becomes one edit.
+  • Edits go out at most every --interval seconds (default 3).
+  • 429 answers are honoured (parameters.retry_after), then the newest
+    state is sent.
+  • Network errors and 5xx answers never reach the build: the state is
+    retried later. Other 4xx answers (e.g. Markdown the API cannot parse)
+    are permanent: the state is resent once as plain text, then dropped.
+  • After QUIT/EOF a failing state gets CLOSE_RETRIES more attempts, so
+    the relay always exits.
+
+Protocol (one line per event, UTF-8):
+  MSG <text>    new status; "\\n" in text is a line break
+  DELETE        drop pending edits, delete the progress message, exit
+  QUIT          send the latest pending state, exit
+  (EOF)         same as QUIT — the build script exited
+
+Environment: TELEGRAM_TOKEN, CHAT_ID, TELEGRAM_API_URL (default api.telegram.org)
+
+Usage:
+  tg_relay.py --fifo /tmp/tg_relay.XXXX [--title "`device | os`"] [--interval 3]
+"""
+
+import os, sys, json, time, argparse, threading
+import urllib.request, urllib.parse, urllib.error
+from datetime import datetime
+from typing import Optional
+
+API = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
+CLOSE_RETRIES = 3
+
+def _log(msg): print(f"[tg_relay] {msg}", file=sys.stderr, flush=True)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ApiError(Exception):
+    """Bot API answer other than 429. Only 5xx is worth retrying."""
+    def __init__(self, method: str, code: int, description: str):
+        super().__init__(f"{method}: HTTP {code} {description}")
+        self.code = code
+
+    @property
+    def transient(self) -> bool:
+        return self.code >= 500
+
+
+class ProgressRelay:
+    def __init__(self, token: str, chat_id: str, title: str = "", interval: float = 3.0):
+        self.token, self.chat_id, self.title = token, chat_id, title
+        self.interval = interval
+        self.message_id: Optional[int] = None
+        self.sent = self.coalesced = self.rate_limited = 0
+        self._cond = threading.Condition()
+        self._latest: Optional[str] = None     # newest state not yet on Telegram
+        self._closing = False
+        self._delete = False
+        self._close_failures = 0               # failed attempts since close()
+        self._next_send = 0.0                  # monotonic time the next call may go out
+
+    # ── producer side ─────────────────────────────────────────────
+    def post(self, status: str) -> None:
+        stamp = datetime.now().strftime("%H:%M:%S")
+        text = f"🚀 *NexDroid Build Status*\n{self.title}\n\n{status}\n_Last Update: {stamp}_"
+        with self._cond:
+            if self._latest is not None:
+                self.coalesced += 1
+            self._latest = text
+            self._cond.notify()
+
+    def close(self, delete: bool = False) -> None:
+        with self._cond:
+            self._closing = True
+            self._delete = self._delete or delete
+            self._cond.notify()
+
+    # ── sender side ───────────────────────────────────────────────
+    def run(self) -> None:
+        while True:
+            with self._cond:
+                while self._latest is None and not self._closing:
+                    self._cond.wait()
+                if self._delete:
+                    self._latest = None              # about to vanish anyway
+                if self._latest is None:
+                    break
+                wait = self._next_send - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)            # newer states replace this one meanwhile
+                    continue
+                text, self._latest = self._latest, None
+            self._send(text)
+        if self._delete and self.message_id is not None:
+            time.sleep(max(0.0, self._next_send - time.monotonic()))   # a 429 covers deletes too
+            self._call_quietly("deleteMessage", {"message_id": self.message_id})
+
+    def _send(self, text: str) -> None:
+        delay = self.interval
+        for parse_mode in ("Markdown", None):
+            try:
+                self._deliver(text, parse_mode)
+                self.sent += 1
+            except RateLimited as e:
+                self.rate_limited += 1
+                self._requeue(text)
+                delay = e.retry_after
+            except (ApiError, OSError) as e:         # OSError: URLError, timeouts, resets
+                if isinstance(e, ApiError) and not e.transient:
+                    _log(f"send failed: {e}" + ("; resending as plain text" if parse_mode else "; dropped"))
+                    continue
+                _log(f"send failed: {e}")
+                self._requeue(text)
+                delay = self.interval * 2
+            except Exception as e:                   # malformed answer: retrying will not help
+                _log(f"send failed: {e}; dropped")
+            break
+        self._next_send = time.monotonic() + delay
+
+    def _deliver(self, text: str, parse_mode: Optional[str]) -> None:
+        params = {"text": text, **({"parse_mode": parse_mode} if parse_mode else {})}
+        if self.message_id is None:
+            self.message_id = self._call("sendMessage", params)["message_id"]
+        else:
+            self._call("editMessageText", {"message_id": self.message_id, **params})
+
+    def _requeue(self, text: str) -> None:
+        with self._cond:
+            if self._closing:
+                self._close_failures += 1
+                if self._close_failures > CLOSE_RETRIES:
+                    _log(f"giving up after {CLOSE_RETRIES} retries on exit")
+                    self._latest = None
+                    return
+            if self._latest is None:                 # a newer state wins over a failed one
+                self._latest = text
+
+    def _call(self, method: str, params: dict) -> dict:
+        data = urllib.parse.urlencode({"chat_id": self.chat_id, **params}).encode()
+        req = urllib.request.Request(f"{API}/bot{self.token}/{method}", data=data)
+        try:
+            with urllib.request.urlopen(req, timeout=15) as r:
+                body = json.load(r)
+        except urllib.error.HTTPError as e:
+            try:
+                body = json.loads(e.read() or b"{}")
+            except ValueError:                       # proxy error pages
+                body = {}
+            if e.code == 429:
+                raise RateLimited(float(body.get("parameters", {}).get("retry_after", 5)))
+            if "message is not modified" in body.get("description", ""):
+                return {"message_id": self.message_id}
+            raise ApiError(method, e.code, body.get("description", ""))
+        return body.get("result", {})
+
+    def _call_quietly(self, method: str, params: dict) -> None:
+        try:
+            self._call(method, params)
+        except Exception as e:
+            _log(f"{method} failed: {e}")
+
+
+def read_events(fifo: str, relay: ProgressRelay) -> None:
+    with open(fifo, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("MSG "):
+                relay.post(line[4:].replace("\\n", "\n"))
+            elif line == "DELETE":
+                relay.close(delete=True)
+                return
+            elif line == "QUIT":
+                break
+    relay.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Coalescing, rate-limited Telegram progress relay")
+    ap.add_argument("--fifo", required=True)
+    ap.add_argument("--title", default="")
+    ap.add_argument("--interval", type=float, default=float(os.environ.get("TG_RELAY_INTERVAL", "3")))
+    args = ap.parse_args()
+
+    token, chat_id = os.environ.get("TELEGRAM_TOKEN"), os.environ.get("CHAT_ID")
+    if not token or not chat_id:
+        _log("TELEGRAM_TOKEN / CHAT_ID missing")
+        sys.exit(1)
+
+    relay = ProgressRelay(token, chat_id, args.title, args.interval)
+    reader = threading.Thread(target=read_events, args=(args.fifo, relay), daemon=True)
+    reader.start()
+    relay.run()
+    _log(f"{relay.sent} updates sent, {relay.coalesced} coalesced, {relay.rate_limited} rate-limited")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+vbmeta_patcher.py  ─  NexDroid AVB verification disabler
+═══════════════════════════════════════════════════════════════════════════════
+Disables dm-verity / AVB verification in every vbmeta*.img of a firmware set.
+
+  • Parses the full AvbVBMetaImageHeader (256 bytes, big-endian) and walks
+    the descriptors in the auxiliary data block: hash, hashtree, chain
+    partition, kernel cmdline and property.
+  • Sets AVB_VBMETA_IMAGE_FLAGS_HASHTREE_DISABLED | VERIFICATION_DISABLED
+    with one 4-byte positioned write of the flags word — the rest of the
+    image is never read or rewritten.
+  • Images carrying an AVB footer ("AVBf", e.g. boot.img) are followed to
+    their embedded vbmeta blob.
+
+Output uses [ACTION]/[INFO]/[SUCCESS]/[WARNING]/[ERROR] prefixes for mod.sh.
+
+Usage:
+  vbmeta_patcher.py <images_dir | image.img ...>
+    a directory patches every vbmeta*.img in it, in one process
+"""
+
+import sys, os, glob, struct
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+def _p(tag, msg): print(f"[{tag}] {msg}", flush=True)
+def action(m): _p("ACTION",  m)
+def info(m):   _p("INFO",    m)
+def ok(m):     _p("SUCCESS", m)
+def warn(m):   _p("WARNING", m)
+def err(m):    _p("ERROR",   m)
+
+# ── AVB on-disk layout (external/avb/libavb) ──────────────────────
+AVB_MAGIC        = b"AVB0"
+AVB_FOOTER_MAGIC = b"AVBf"
+FOOTER_SIZE      = 64
+HEADER_SIZE      = 256
+FLAGS_OFFSET     = 120      # u32 flags inside the header
+
+FLAG_HASHTREE_DISABLED     = 0x01
+FLAG_VERIFICATION_DISABLED = 0x02
+DISABLE_FLAGS = FLAG_HASHTREE_DISABLED | FLAG_VERIFICATION_DISABLED
+
+# AvbVBMetaImageHeader
+_HEADER = struct.Struct(">4sII QQ I QQ QQ QQ QQ QQ Q II 48s80s")
+_FOOTER = struct.Struct(">4sII QQQ 28s")
+_DESC   = struct.Struct(">QQ")          # tag, num_bytes_following
+
+ALGORITHMS = {0: "NONE", 1: "SHA256_RSA2048", 2: "SHA256_RSA4096", 3: "SHA256_RSA8192",
+              4: "SHA512_RSA2048", 5: "SHA512_RSA4096", 6: "SHA512_RSA8192"}
+
+@dataclass
+class Descriptor:
+    kind: str
+    partition: str = ""
+    detail: str = ""
+
+    def __str__(self):
+        return f"{self.kind:<15} {self.partition:<16} {self.detail}".rstrip()
+
+@dataclass
+class VBMetaHeader:
+    offset: int                   # header position in the file (non-zero for footer images)
+    version: str
+    auth_size: int
+    aux_size: int
+    algorithm: int
+    descriptors_offset: int
+    descriptors_size: int
+    rollback_index: int
+    flags: int
+    rollback_index_location: int
+    release: str
+    descriptors: List[Descriptor] = field(default_factory=list)
+
+    @property
+    def flags_pos(self) -> int:
+        return self.offset + FLAGS_OFFSET
+
+# ── Parsing ───────────────────────────────────────────────────────
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("ascii", "replace")
+
+def _size(n: int) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if n < 1024 or unit == "G":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+def _parse_descriptor(tag: int, body: bytes) -> Descriptor:
+    if tag == 0:                                            # property
+        klen, vlen = struct.unpack_from(">QQ", body)
+        key = body[16:16 + klen].decode("utf-8", "replace")
+        value = body[17 + klen:17 + klen + vlen].decode("utf-8", "replace")
+        return Descriptor("property", detail=f"{key}={value}")
+    if tag == 1:                                            # hashtree
+        (_, image_size, _, tree_size, block, _, fec_roots, _, _, algo,
+         name_len, _, _, _) = struct.unpack_from(">IQQQIIIQQ32sIIII", body)
+        name = body[164:164 + name_len].decode("utf-8", "replace")
+        fec = f", fec {fec_roots} roots" if fec_roots else ""
+        return Descriptor("hashtree", name, f"{_cstr(algo)}, {_size(image_size)}, "
+                                            f"tree {_size(tree_size)}, block {block}{fec}")
+    if tag == 2:                                            # hash
+        image_size, algo, name_len, _, _, _ = struct.unpack_from(">Q32sIIII", body)
+        name = body[116:116 + name_len].decode("utf-8", "replace")
+        return Descriptor("hash", name, f"{_cstr(algo)}, {_size(image_size)}")
+    if tag == 3:                                            # kernel cmdline
+        _, length = struct.unpack_from(">II", body)
+        return Descriptor("kernel_cmdline", detail=body[8:8 + length].decode("utf-8", "replace"))
+    if tag == 4:                                            # chain partition
+        location, name_len, key_len = struct.unpack_from(">III", body)
+        name = body[76:76 + name_len].decode("utf-8", "replace")
+        return Descriptor("chain", name, f"rollback location {location}, key {key_len} bytes")
+    return Descriptor(f"unknown({tag})", detail=f"{len(body)} bytes")
+
+def _parse_descriptors(blob: bytes) -> List[Descriptor]:
+    found, pos = [], 0
+    while pos + _DESC.size <= len(blob):
+        tag, length = _DESC.unpack_from(blob, pos)
+        body = blob[pos + _DESC.size:pos + _DESC.size + length]
+        if len(body) < length:
+            found.append(Descriptor("truncated", detail=f"tag {tag} at +{pos}"))
+            break
+        try:
+            found.append(_parse_descriptor(tag, body))
+        except struct.error:
+            found.append(Descriptor("malformed", detail=f"tag {tag} at +{pos}"))
+        pos += _DESC.size + length
+    return found
+
+def _find_header(fd: int, size: int) -> Optional[int]:
+    if os.pread(fd, 4, 0) == AVB_MAGIC:
+        return 0
+    if size >= FOOTER_SIZE:
+        footer = os.pread(fd, FOOTER_SIZE, size - FOOTER_SIZE)
+        if footer[:4] == AVB_FOOTER_MAGIC:
+            vbmeta_offset = _FOOTER.unpack(footer)[4]
+            if os.pread(fd, 4, vbmeta_offset) == AVB_MAGIC:
+                return vbmeta_offset
+    return None
+
+def read_header(fd: int, size: int) -> Optional[VBMetaHeader]:
+    """Header + descriptors, reading only those two regions of the file."""
+    offset = _find_header(fd, size)
+    if offset is None:
+        return None
+    raw = os.pread(fd, HEADER_SIZE, offset)
+    if len(raw) < HEADER_SIZE:
+        return None
+    (_, major, minor, auth_size, aux_size, algorithm, _, _, _, _, _, _, _, _,
+     desc_off, desc_size, rollback, flags, rollback_loc, release, _) = _HEADER.unpack(raw)
+    hdr = VBMetaHeader(offset, f"{major}.{minor}", auth_size, aux_size, algorithm, desc_off,
+                       desc_size, rollback, flags, rollback_loc, _cstr(release))
+    if desc_size:
+        start = offset + HEADER_SIZE + auth_size + desc_off
+        hdr.descriptors = _parse_descriptors(os.pread(fd, desc_size, start))
+    return hdr
+
+# ── Patching ──────────────────────────────────────────────────────
+def patch_image(path: str) -> bool:
+    name = os.path.basename(path)
+    action(f"Patching {name}")
+    fd = os.open(path, os.O_RDWR)
+    try:
+        hdr = read_header(fd, os.fstat(fd).st_size)
+        if hdr is None:
+            err(f"{name}: no AVB0 header (neither at offset 0 nor behind an AVBf footer)")
+            return False
+        where = "" if hdr.offset == 0 else f" at offset {hdr.offset} (footer)"
+        info(f"{name}: AVB {hdr.version}{where}, {ALGORITHMS.get(hdr.algorithm, hdr.algorithm)}, "
+             f"rollback {hdr.rollback_index}@{hdr.rollback_index_location}, release '{hdr.release}'")
+        info(f"{name}: {len(hdr.descriptors)} descriptor(s)")
+        for d in hdr.descriptors:
+            info(f"  {d}")
+
+        if hdr.flags & DISABLE_FLAGS == DISABLE_FLAGS:
+            ok(f"{name}: verification already disabled (flags 0x{hdr.flags:08X})")
+            return True
+        new_flags = hdr.flags | DISABLE_FLAGS
+        os.pwrite(fd, struct.pack(">I", new_flags), hdr.flags_pos)
+        os.fsync(fd)
+        if struct.unpack(">I", os.pread(fd, 4, hdr.flags_pos))[0] != new_flags:
+            err(f"{name}: flags did not stick")
+            return False
+        ok(f"{name}: flags 0x{hdr.flags:08X} → 0x{new_flags:08X} (hashtree + verification disabled)")
+        return True
+    finally:
+        os.close(fd)
+
+def collect(targets: List[str]) -> List[str]:
+    images = []
+    for t in targets:
+        if os.path.isdir(t):
+            images += sorted(glob.glob(os.path.join(t, "vbmeta*.img")))
+        else:
+            images.append(t)
+    return images
+
+def main():
+    if len(sys.argv) < 2:
+        err("Usage: vbmeta_patcher.py <images_dir | image.img ...>")
+        sys.exit(1)
+    images = collect(sys.argv[1:])
+    if not images:
+        warn("No vbmeta*.img found")
+        sys.exit(0)
+    failed = [img for img in images if not os.path.isfile(img) or not patch_image(img)]
+    for img in failed:
+        if not os.path.isfile(img):
+            err(f"File not found: {img}")
+    if failed:
+        err(f"{len(failed)}/{len(images)} image(s) failed")
+        sys.exit(1)
+    ok(f"{len(images)} vbmeta image(s) patched: {', '.join(os.path.basename(i) for i in images)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,124 @@
 import os
 import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
 
-# Critical Firmware Partitions (Flashed to both slots _ab)
-FIRMWARE_ORDER = [
-    "abl", "bluetooth", "countrycode", "devcfg", "dsp", "dtbo", "featenabler",
-    "hyp", "imagefv", "keymaster", "modem", "qupfw", "rpm", "tz", 
-    "uefisecapp", "vbmeta", "vbmeta_system", "vbmeta_vendor", "xbl", "xbl_config",
-    "boot", "init_boot", "vendor_boot"
+from image_hash import MANIFEST_NAME, build_manifest, load_manifest, write_manifest
+
+# MANIFEST_NAME is written next to the flashing scripts; pass an older build's
+# copy with --previous to get an incremental update that skips unchanged images.
+
+# Written by mod.sh's firmware logic engine, one image per line:
+#   <name> <category firmware|super> <flash_target> <size_bytes>
+# "super" entries are logical partitions that live inside super.img.
+PARTITION_MANIFEST = "partition_manifest.txt"
+
+# fastboot -S <size> caps each sparse chunk sent to the device. Images up to
+# the first limit go in one download; bigger ones are split. 256M stays within
+# the smallest max-download-size of the devices we build for.
+SPARSE_CHUNKS = [
+    (256 << 20, None),
+    (None, os.environ.get("GEN_SCRIPTS_SPARSE_CHUNK", "256M")),
 ]
 
-# Non-A/B Partitions (Flashed to active slot only)
+# Non-A/B partitions: flashed without a slot suffix, whatever the manifest says
+# (mod.sh only knows cust/super/userdata/persist and would give these _ab).
 SINGLE_SLOT_PARTS = ["cust", "recovery", "logo", "splash", "persist", "misc"]
 
-def get_header(device_code, is_clean, is_windows):
+def read_partition_manifest(path, images_dir):
+    """[(name, flash_target, size)] for every image that is actually in
+    images_dir, smallest first so the big transfers run last. super.img,
+    built after the manifest was written, is always flashed last."""
+    parts, listed = [], {"super"}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                listed.add(fields[0])
+            if len(fields) < 3 or fields[1] != "firmware" or fields[0] == "super":
+                continue
+            img = os.path.join(images_dir, f"{fields[0]}.img")
+            if os.path.isfile(img):
+                target = fields[0] if fields[0] in SINGLE_SLOT_PARTS else fields[2]
+                parts.append((fields[0], target, os.path.getsize(img)))
+    unlisted = sorted(name[:-4] for name in os.listdir(images_dir)
+                      if name.endswith(".img") and name[:-4] not in listed)
+    if unlisted:
+        print(f"Warning: not in {os.path.basename(path)}, will not be flashed: {', '.join(unlisted)}")
+    parts.sort(key=lambda p: p[2])
+    super_img = os.path.join(images_dir, "super.img")
+    if os.path.isfile(super_img):
+        parts.append(("super", "super", os.path.getsize(super_img)))
+    return parts
+
+def find_partition_manifest(images_dir):
+    for folder in (images_dir, os.path.dirname(os.path.abspath(images_dir))):
+        path = os.path.join(folder, PARTITION_MANIFEST)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def sparse_flag(size):
+    for limit, chunk in SPARSE_CHUNKS:
+        if limit is None or size <= limit:
+            return f" -S {chunk}" if chunk else ""
+    return ""
+
+def changed_images(manifest, previous):
+    """Images that are new or differ (size or SHA-256) from the previous build."""
+    old = previous["images"]
+    return [name for name, info in manifest["images"].items()
+            if name not in old or old[name]["size"] != info["size"]
+            or old[name]["sha256"] != info["sha256"]]
+
+def get_verify_block(manifest, parts, is_windows):
+    """Pre-flash SHA-256 check of every image the script is about to flash."""
+    images = manifest["images"]
+    parts = [p for p in parts if p in images]
+    if not parts:
+        return ""
+    if is_windows:
+        block = "\necho Verifying images...\n"
+        for part in parts:
+            block += f'call :verify "images\\{part}.img" {images[part]["sha256"]}\n'
+            block += f'if errorlevel 1 ( echo {part}.img is corrupted, re-download the package & pause & exit /B 1 )\n'
+        return block
+    block = """
+verify() {
+    if command -v sha256sum >/dev/null 2>&1; then h=$(sha256sum "$1" | cut -d' ' -f1)
+    else h=$(shasum -a 256 "$1" | cut -d' ' -f1); fi
+    [ "$h" == "$2" ] || { echo "$1 is corrupted, re-download the package"; return 1; }
+}
+echo "Verifying images..."
+"""
+    for part in parts:
+        block += f'verify "images/{part}.img" {images[part]["sha256"]} &\n'
+    block += 'for job in $(jobs -p); do wait $job || exit 1; done\n'
+    return block
+
+# Appended after the last command of the .bat scripts
+WINDOWS_VERIFY_SUB = """exit /B 0
+
+:verify
+set "h="
+for /f "delims=" %%H in ('certutil -hashfile "%~1" SHA256 ^| findstr /v ":"') do set "h=%%H"
+set "h=%h: =%"
+if /i "%h%" neq "%~2" exit /B 1
+exit /B 0
+"""
+
+def get_header(device_code, is_clean, is_windows, is_incremental=False):
     mode = "CLEAN INSTALL (WIPE DATA)" if is_clean else "UPDATE ROM (KEEP DATA)"
+    if is_incremental:
+        mode = "INCREMENTAL UPDATE (KEEP DATA)"
     
     if is_windows:
         warning = "Your Data Partition will be ERASED!" if is_clean else "Your Data will be preserved."
+        if is_incremental:
+            warning += " Only use this on a device running the previous NexDroid build!"
         return f"""@echo off
 cd /d "%~dp0"
 set "fastboot=bin\\windows\\fastboot.exe"
@@ -42,6 +144,8 @@ if errorlevel 1 ( echo Failed to set active slot & pause & exit /B 1 )
 """
     else:
         warning = "Your Data Partition will be ERASED!" if is_clean else "Your Data will be preserved."
+        if is_incremental:
+            warning += " Only use this on a device running the previous NexDroid build!"
         return f"""#!/bin/bash
 cd "$(dirname "$0")"
 fastboot="./bin/linux/fastboot"
@@ -68,44 +172,55 @@ echo "Setting active slot to A..."
 if [ $? -ne 0 ]; then echo "Failed to set slot"; exit 1; fi
 """
 
-def generate_scripts(device_code, images_dir):
+def generate_scripts(device_code, images_dir, previous_manifest=None, partition_manifest=None, out_dir="."):
     # Ensure we are looking at the right files
     if not os.path.exists(images_dir):
         print(f"Error: Images directory '{images_dir}' not found.")
-        return
+        return False
+
+    partition_manifest = partition_manifest or find_partition_manifest(images_dir)
+    if not partition_manifest:
+        print(f"Error: {PARTITION_MANIFEST} not found next to '{images_dir}' (pass --partitions).")
+        return False
+    all_parts = read_partition_manifest(partition_manifest, images_dir)
+    print(f"Generating scripts for {device_code} with {len(all_parts)} images...")
+
+    images_dir = os.path.abspath(images_dir)
+    manifest = build_manifest(os.path.dirname(images_dir), device_code, (os.path.basename(images_dir),))
+    write_manifest(manifest, os.path.join(out_dir, MANIFEST_NAME))
 
-    files = os.listdir(images_dir)
-    print(f"Generating scripts for {device_code} with {len(files)} images...")
+    variants = [("first_install_with_data_format", True, all_parts),
+                ("update_rom", False, all_parts)]
+    if previous_manifest:
+        previous = load_manifest(previous_manifest)
+        if previous.get("device") != device_code:
+            print(f"Error: previous manifest is for '{previous.get('device')}', not '{device_code}'.")
+            return False
+        changed = changed_images(manifest, previous)
+        skipped = len(manifest["images"]) - len(changed)
+        print(f"Incremental update: {len(changed)} changed, {skipped} unchanged images skipped")
+        variants.append(("incremental_update", False, [p for p in all_parts if p[0] in changed]))
 
-    for is_clean in [True, False]:
+    for variant, is_clean, parts in variants:
+        is_incremental = variant == "incremental_update"
+        flashed = [name for name, _, _ in parts]
         # ==========================================
         # WINDOWS SCRIPT GENERATION
         # ==========================================
-        name_win = f"windows_fastboot_{'first_install_with_data_format' if is_clean else 'update_rom'}.bat"
-        content_win = get_header(device_code, is_clean, True)
-        
-        # 1. Flash Firmware & Boot
-        for part in FIRMWARE_ORDER:
-            if f"{part}.img" in files:
-                # Flash to both slots (_ab) for safety on these partitions
-                content_win += f'echo Flashing {part}...\n'
-                content_win += f'"%fastboot%" flash {part}_ab "images\\{part}.img"\n'
-                content_win += f'if errorlevel 1 ( echo Error flashing {part} & pause & exit /B 1 )\n'
+        name_win = f"windows_fastboot_{variant}.bat"
+        content_win = get_header(device_code, is_clean, True, is_incremental)
+        content_win += get_verify_block(manifest, flashed, True)
 
-        # 2. Flash Single Slot Partitions (Recovery, etc)
-        for part in SINGLE_SLOT_PARTS:
-            if f"{part}.img" in files:
+        # 1. Flash images, smallest first (super.img last)
+        for part, target, size in parts:
+            if part == "super":
+                content_win += "\necho Flashing Super (This may take 5-10 minutes)...\n"
+            else:
                 content_win += f'echo Flashing {part}...\n'
-                content_win += f'"%fastboot%" flash {part} "images\\{part}.img"\n'
-                content_win += f'if errorlevel 1 ( echo Error flashing {part} & pause & exit /B 1 )\n'
-
-        # 3. Flash Super
-        if "super.img" in files:
-            content_win += "\necho Flashing Super (This may take 5-10 minutes)...\n"
-            content_win += '"%fastboot%" flash super "images\\super.img"\n'
-            content_win += 'if errorlevel 1 ( echo Error flashing super & pause & exit /B 1 )\n'
-        
-        # 4. Finalize
+            content_win += f'"%fastboot%"{sparse_flag(size)} flash {target} "images\\{part}.img"\n'
+            content_win += f'if errorlevel 1 ( echo Error flashing {part} & pause & exit /B 1 )\n'
+
+        # 2. Finalize
         content_win += "\n%fastboot% erase metadata\n"
         if is_clean: 
             content_win += 'echo Wiping Userdata...\n'
@@ -115,37 +230,28 @@ def generate_scripts(device_code, images_dir):
         content_win += "echo Flashing Complete! Rebooting...\n"
         content_win += "%fastboot% reboot\n"
         content_win += "pause\n"
+        content_win += WINDOWS_VERIFY_SUB
         
-        with open(name_win, "w") as f: f.write(content_win)
+        with open(os.path.join(out_dir, name_win), "w") as f: f.write(content_win)
 
 
         # ==========================================
         # LINUX / MAC SCRIPT GENERATION
         # ==========================================
-        name_lin = f"linux_fastboot_{'first_install_with_data_format' if is_clean else 'update_rom'}.sh"
-        content_lin = get_header(device_code, is_clean, False)
-        
-        # 1. Flash Firmware & Boot
-        for part in FIRMWARE_ORDER:
-            if f"{part}.img" in files:
-                content_lin += f'echo "Flashing {part}..."\n'
-                content_lin += f'"$fastboot" flash {part}_ab "images/{part}.img"\n'
-                content_lin += f'if [ $? -ne 0 ]; then echo "Error flashing {part}"; exit 1; fi\n'
+        name_lin = f"linux_fastboot_{variant}.sh"
+        content_lin = get_header(device_code, is_clean, False, is_incremental)
+        content_lin += get_verify_block(manifest, flashed, False)
 
-        # 2. Flash Single Slot Partitions
-        for part in SINGLE_SLOT_PARTS:
-            if f"{part}.img" in files:
+        # 1. Flash images, smallest first (super.img last)
+        for part, target, size in parts:
+            if part == "super":
+                content_lin += '\necho "Flashing Super (This may take 5-10 minutes)..."\n'
+            else:
                 content_lin += f'echo "Flashing {part}..."\n'
-                content_lin += f'"$fastboot" flash {part} "images/{part}.img"\n'
-                content_lin += f'if [ $? -ne 0 ]; then echo "Error flashing {part}"; exit 1; fi\n'
-
-        # 3. Flash Super
-        if "super.img" in files:
-            content_lin += '\necho "Flashing Super (This may take 5-10 minutes)..."\n'
-            content_lin += '"$fastboot" flash super "images/super.img"\n'
-            content_lin += 'if [ $? -ne 0 ]; then echo "Error flashing super"; exit 1; fi\n'
+            content_lin += f'"$fastboot"{sparse_flag(size)} flash {target} "images/{part}.img"\n'
+            content_lin += f'if [ $? -ne 0 ]; then echo "Error flashing {part}"; exit 1; fi\n'
 
-        # 4. Finalize
+        # 2. Finalize
         content_lin += '\n"$fastboot" erase metadata\n'
         if is_clean: 
             content_lin += 'echo "Wiping Userdata..."\n'
@@ -155,10 +261,96 @@ def generate_scripts(device_code, images_dir):
         content_lin += 'echo "Flashing Complete! Rebooting..."\n'
         content_lin += '"$fastboot" reboot\n'
         
-        with open(name_lin, "w") as f: f.write(content_lin)
+        with open(os.path.join(out_dir, name_lin), "w") as f: f.write(content_lin)
+    return True
+
+# ==========================================
+# BENCHMARK (local fastboot stub)
+# ==========================================
+# Stands in for bin/linux/fastboot: reads the image like fastboot would, then
+# sleeps for the modelled USB transfer (size / speed + a fixed cost per sparse
+# chunk) and logs "<start> <end> <chunks> <args>" for every call.
+FASTBOOT_STUB = """#!/usr/bin/env python3
+import os, sys, time
+args = sys.argv[1:]
+chunk = int(os.environ.get("FASTBOOT_STUB_MAX_DOWNLOAD", str(256 << 20)))
+if args[:1] == ["-S"]:
+    v = args[1]
+    chunk = int(v[:-1]) << {"K": 10, "M": 20, "G": 30}[v[-1].upper()] if v[-1].isalpha() else int(v)
+    args = args[2:]
+start, chunks = time.time(), 0
+if args[:1] == ["flash"]:
+    size = os.path.getsize(args[2])
+    chunks = max(1, -(-size // chunk))
+    with open(args[2], "rb") as f:
+        while f.read(1 << 20):
+            pass
+    time.sleep(size / (float(os.environ.get("FASTBOOT_STUB_SPEED", "40")) * (1 << 20))
+               + chunks * float(os.environ.get("FASTBOOT_STUB_CHUNK_COST", "0.05")))
+with open(os.environ["FASTBOOT_STUB_LOG"], "a") as log:
+    log.write(f"{start} {time.time()} {chunks} {' '.join(args)}\\n")
+"""
+
+def bench(device_code, images_dir, partition_manifest=None, speed=40.0, chunk_cost=0.05,
+          variant="update_rom"):
+    """Run a generated Linux script against the fastboot stub and time each step."""
+    partition_manifest = partition_manifest or find_partition_manifest(images_dir)
+    work = tempfile.mkdtemp(prefix="gen_scripts_bench_")
+    try:
+        os.symlink(os.path.abspath(images_dir), os.path.join(work, "images"))
+        for plat in ("linux", "macos"):
+            stub = os.path.join(work, "bin", plat, "fastboot")
+            os.makedirs(os.path.dirname(stub))
+            with open(stub, "w") as f: f.write(FASTBOOT_STUB)
+            os.chmod(stub, 0o755)
+        if not generate_scripts(device_code, os.path.join(work, "images"), None, partition_manifest, work):
+            return False
+
+        log = os.path.join(work, "fastboot.log")
+        env = dict(os.environ, FASTBOOT_STUB_LOG=log, FASTBOOT_STUB_SPEED=str(speed),
+                   FASTBOOT_STUB_CHUNK_COST=str(chunk_cost))
+        t0 = time.time()
+        run = subprocess.run(["bash", os.path.join(work, f"linux_fastboot_{variant}.sh")], input="\n",
+                             env=env, text=True, capture_output=True)
+        wall = time.time() - t0
+        if run.returncode != 0:
+            print(run.stdout + run.stderr)
+            print(f"Error: {variant} script failed (exit {run.returncode}).")
+            return False
+
+        sizes = {name: size for name, _, size in read_partition_manifest(partition_manifest, images_dir)}
+        print(f"\nBenchmark: linux_fastboot_{variant}.sh, stub at {speed:g} MB/s + {chunk_cost:g} s/chunk\n")
+        print(f"{'step':<32}{'size':>10}{'-S':>7}{'chunks':>8}{'seconds':>10}")
+        steps = 0.0
+        with open(log) as f:
+            for line in f:
+                start, end, chunks, args = line.rstrip("\n").split(" ", 3)
+                cmd = args.split()
+                size = sizes.get(os.path.basename(cmd[2])[:-4]) if cmd[0] == "flash" else None
+                label = " ".join(cmd[:2])
+                shown = f"{size / 2**20:.1f}M" if size is not None else "-"
+                flag = sparse_flag(size).split()[-1] if size and sparse_flag(size) else "-"
+                print(f"{label:<32}{shown:>10}{flag:>7}{chunks:>8}{float(end) - float(start):>10.2f}")
+                steps += float(end) - float(start)
+        print(f"{'fastboot total':<57}{steps:>10.2f}")
+        print(f"{'script wall time (incl. verification)':<57}{wall:>10.2f}")
+        return True
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python3 gen_scripts.py <device_code> <images_dir>")
-        sys.exit(1)
-    generate_scripts(sys.argv[1], sys.argv[2])
+    parser = argparse.ArgumentParser(description="Generate NexDroid fastboot flashing scripts")
+    parser.add_argument("device_code")
+    parser.add_argument("images_dir")
+    parser.add_argument("--partitions", help=f"{PARTITION_MANIFEST} from mod.sh (default: next to images_dir)")
+    parser.add_argument("--previous", help=f"older build's {MANIFEST_NAME}, adds *_incremental_update scripts")
+    parser.add_argument("--bench", action="store_true", help="time each flash step against a fastboot stub")
+    parser.add_argument("--bench-speed", type=float, default=40.0, help="stub USB throughput (MB/s)")
+    parser.add_argument("--bench-chunk-cost", type=float, default=0.05, help="stub cost per sparse chunk (s)")
+    args = parser.parse_args()
+
+    if args.bench:
+        ok = bench(args.device_code, args.images_dir, args.partitions, args.bench_speed, args.bench_chunk_cost)
+    else:
+        ok = generate_scripts(args.device_code, args.images_dir, args.previous, args.partitions)
+    sys.exit(0 if ok else 1)
@@ -1,7 +1,21 @@
 import os
-import requests
+import re
+import time
+import uuid
+import asyncio
 import logging
+import secrets
+import threading
+import importlib.util
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import httpx
+import ota_resolver
+import ota_service
 from telegram import Update
+from telegram.error import TelegramError
+from telegram.helpers import escape_markdown
 from telegram.ext import Application, CommandHandler, ContextTypes
 from dotenv import load_dotenv
 
@@ -11,9 +25,41 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
+# Bot API endpoint override (local Bot API server, test stubs)
+TELEGRAM_API = os.getenv("TELEGRAM_API_URL")
+
+# Webhook mode (optional): set BOT_WEBHOOK_URL to the public base URL that
+# forwards to BOT_WEBHOOK_LISTEN:BOT_WEBHOOK_PORT. Unset → long polling.
+WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("BOT_WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("BOT_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+
 REPO_OWNER = "nexdroidwx"
 REPO_NAME = "HyperOS-Modder"
 
+# Outbound HTTP (one pooled client shared by every handler)
+GITHUB_API = os.getenv("GITHUB_API_URL", "https://api.github.com")
+HTTP_TIMEOUT = httpx.Timeout(float(os.getenv("BOT_HTTP_TIMEOUT", "15")), connect=5.0)
+HTTP_RETRIES = int(os.getenv("BOT_HTTP_RETRIES", "3"))
+
+# Build queue
+MAX_CONCURRENT_BUILDS = int(os.getenv("BOT_MAX_BUILDS", "2"))
+POLL_MIN = float(os.getenv("BOT_POLL_MIN", "15"))     # s between run status polls, grows ×1.5
+POLL_MAX = float(os.getenv("BOT_POLL_MAX", "300"))    # while nothing changes, up to this
+RUN_LOOKUP_TIMEOUT = 600                              # s to wait for a dispatched run to appear
+
+# OTA lookups (/ota)
+OTA_WORKERS = int(os.getenv("BOT_OTA_WORKERS", "4"))             # resolver calls at once
+OTA_MAX_PENDING = int(os.getenv("BOT_OTA_MAX_PENDING", "20"))    # distinct lookups in flight
+OTA_USER_LIMIT = int(os.getenv("BOT_OTA_USER_LIMIT", "5"))       # uncached lookups per user ...
+OTA_USER_WINDOW = float(os.getenv("BOT_OTA_USER_WINDOW", "60"))  # ... per this many seconds
+OTA_PREFETCH_TOP = int(os.getenv("BOT_OTA_PREFETCH_TOP", "10"))
+OTA_PREFETCH_INTERVAL = float(os.getenv("BOT_OTA_PREFETCH_INTERVAL", "600"))
+OTA_POPULAR_MAX = int(os.getenv("BOT_OTA_POPULAR_MAX", "256"))   # tracked pairs for prefetch
+OTA_PREFIX_RE = re.compile(r"^[A-Z0-9][A-Z0-9_.]{1,47}$")       # e.g. CPH2581, RMX3700_11.C
+
 # Authorization
 AUTHORIZED_USERS = [1211414285, 987654321]
 
@@ -22,11 +68,370 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+# httpx logs every request URL at INFO — including the bot token in Telegram's
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # --- HELPERS ---
 def is_authorized(user_id):
     return user_id in AUTHORIZED_USERS
 
+_http = None
+_http_lock = threading.Lock()
+
+def get_http():
+    """Shared AsyncClient, created on first use."""
+    global _http
+    with _http_lock:
+        if _http is None or _http.is_closed:
+            _http = httpx.AsyncClient(
+                base_url=GITHUB_API,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=8),
+                transport=httpx.AsyncHTTPTransport(retries=1),   # connect errors only
+                headers={
+                    "Authorization": f"token {GITHUB_TOKEN}",
+                    "Accept": "application/vnd.github.v3+json",
+                },
+            )
+        return _http
+
+def start_background(app, coro):
+    """Task owned by the application until stop_background() at shutdown.
+    (Application.create_task() from post_init is never awaited by PTB.)"""
+    task = asyncio.create_task(coro)
+    tasks = app.bot_data.setdefault("background_tasks", set())
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+async def stop_background(app):
+    tasks = app.bot_data.pop("background_tasks", set())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def open_http(app=None):
+    # Building the client loads CA certificates (blocking, ~100 ms). Do it in a
+    # worker thread: it never stalls a handler, and startup doesn't wait for it.
+    warmup = asyncio.to_thread(get_http)
+    if app is not None:
+        start_background(app, warmup)
+    else:
+        await warmup
+
+async def close_http(app=None):
+    if app is not None:
+        await stop_background(app)
+    if _http is not None:
+        await _http.aclose()
+
+# Errors raised before the request reached GitHub: safe to retry for any method
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+async def github_request(method, path, **kwargs):
+    """GitHub API call on the shared client, retried with exponential backoff;
+    the last error is raised. Idempotent methods retry on timeouts, transport
+    errors and 5xx answers. Others (a workflow dispatch POST) only retry when
+    the request was never sent: GitHub may have accepted a dispatch that
+    answered 502 or timed out, and a second one would start a second build."""
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    retry_errors = httpx.TransportError if idempotent else NOT_SENT_ERRORS
+    for attempt in range(HTTP_RETRIES):
+        try:
+            response = await get_http().request(method, path, **kwargs)
+            if response.status_code < 500 or not idempotent or attempt == HTTP_RETRIES - 1:
+                return response
+        except retry_errors:
+            if attempt == HTTP_RETRIES - 1:
+                raise
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+# --- BUILD QUEUE ---
+class BuildJob:
+    def __init__(self, rom_url):
+        self.rom_url = rom_url
+        self.build_id = uuid.uuid4().hex[:12]   # shows up in the run name
+        self.messages = []                      # every status message following this build
+        self.run_url = None
+        self.etags = {}                         # path -> (etag, data), for conditional polling
+
+class BuildQueue:
+    """Identical ROM URLs share one build; at most max_running builds are
+    dispatched at a time. Each run is followed with ETag-conditional polls
+    (304s don't count against the API rate limit) and exponential backoff,
+    and every attached status message is edited when it finishes."""
+
+    def __init__(self, max_running=MAX_CONCURRENT_BUILDS):
+        self.jobs = {}                          # rom_url -> BuildJob (queued or running)
+        self._slots = asyncio.Semaphore(max_running)
+        self._tasks = set()
+
+    async def submit(self, rom_url, status_msg):
+        """Attach status_msg to the build of rom_url, starting one if needed.
+        Returns False when an identical build was already queued or running."""
+        job = self.jobs.get(rom_url)
+        if job is not None:
+            job.messages.append(status_msg)
+            await self._edit(status_msg, self._text(job, "Already Queued", "attached to the existing build"))
+            return False
+        job = self.jobs[rom_url] = BuildJob(rom_url)
+        job.messages.append(status_msg)
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def join(self):
+        """Wait for every queued and running build to finish."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _run(self, job):
+        try:
+            if self._slots.locked():
+                await self._update(job, "Build Queued", "waiting for a free build slot")
+            async with self._slots:
+                await self._build(job)
+        except Exception as e:
+            logging.exception("build %s failed", job.build_id)
+            await self._update(job, "Connection Failure", str(e))
+        finally:
+            self.jobs.pop(job.rom_url, None)
+
+    async def _build(self, job):
+        # A minute of slack for clock skew between us and GitHub
+        dispatched_at = datetime.fromtimestamp(int(time.time()) - 60, timezone.utc)
+        payload = {
+            "event_type": "build_rom",
+            "client_payload": {"rom_url": job.rom_url, "build_id": job.build_id}
+        }
+        try:
+            response = await github_request(
+                "POST", f"/repos/{REPO_OWNER}/{REPO_NAME}/dispatches", json=payload
+            )
+            unsure = response.status_code >= 500
+        except NOT_SENT_ERRORS:
+            raise
+        except httpx.TransportError:
+            response, unsure = None, True
+        # An unconfirmed dispatch may still have been accepted: look for its
+        # run (named after build_id) below instead of reporting a failure
+        if not unsure and response.status_code != 204:
+            # Clean Error Reporting
+            error_map = {
+                404: "Repository not found or insufficient token scope.",
+                401: "Invalid or expired GitHub token.",
+            }
+            reason = error_map.get(response.status_code, "Unknown API Error")
+            await self._update(job, "Request Failed", "failed",
+                               f"Code: `{response.status_code}`\n"
+                               f"Reason: {reason}\n"
+                               f"Response: `{response.text}`")
+            return
+
+        await self._update(job, "Build Dispatched", "waiting for the workflow run")
+        run = await self._find_run(job, dispatched_at)
+        if run is None:
+            await self._update(job, "Build Dispatched", "run not found — check GitHub Actions")
+            return
+        job.run_url = run.get("html_url")
+        await self._update(job, "Build Running", run.get("status", "in_progress"))
+
+        run = await self._follow(job, run)
+        ok = run.get("conclusion") == "success"
+        await self._update(job, "Build Finished" if ok else "Build Failed", run.get("conclusion") or "unknown")
+
+    async def _find_run(self, job, since):
+        """The repository_dispatch run named after job.build_id, or None."""
+        path = f"/repos/{REPO_OWNER}/{REPO_NAME}/actions/runs"
+        params = {"event": "repository_dispatch", "per_page": 20,
+                  "created": f">={since.isoformat().replace('+00:00', 'Z')}"}
+        deadline = asyncio.get_running_loop().time() + RUN_LOOKUP_TIMEOUT
+        delay = POLL_MIN / 3
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(delay)
+            data, _ = await self._get(job, path, params)
+            for run in (data or {}).get("workflow_runs", []):
+                if job.build_id in (run.get("display_title") or run.get("name") or ""):
+                    return run
+            delay = min(delay * 2, POLL_MAX / 5)
+        return None
+
+    async def _follow(self, job, run):
+        """Poll the run until it completes; back off while its status is unchanged."""
+        path = f"/repos/{REPO_OWNER}/{REPO_NAME}/actions/runs/{run['id']}"
+        delay = POLL_MIN
+        while run.get("status") != "completed":
+            await asyncio.sleep(delay)
+            data, changed = await self._get(job, path)
+            if data is None:
+                delay = min(delay * 1.5, POLL_MAX)
+                continue
+            if data.get("status") != run.get("status"):
+                await self._update(job, "Build Running", data.get("status"))
+                delay = POLL_MIN
+            else:
+                delay = min(delay * 1.5, POLL_MAX)
+            run = data
+        return run
+
+    async def _get(self, job, path, params=None):
+        """Conditional GET: (data, changed). A 304 returns the cached data.
+        Rate-limited answers wait out Retry-After (capped) and return (cached, False)."""
+        cached = job.etags.get(path)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        response = await github_request("GET", path, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1], False
+        if response.status_code in (403, 429):
+            wait = response.headers.get("Retry-After")
+            reset = response.headers.get("X-RateLimit-Reset")
+            if wait is None and reset:
+                wait = max(0.0, float(reset) - datetime.now(timezone.utc).timestamp())
+            await asyncio.sleep(min(float(wait or POLL_MIN), POLL_MAX))
+            return (cached[1] if cached else None), False
+        if response.status_code != 200:
+            return (cached[1] if cached else None), False
+        data = response.json()
+        if etag := response.headers.get("ETag"):
+            job.etags[path] = (etag, data)
+        return data, True
+
+    def _text(self, job, title, status, details=""):
+        text = (
+            f"**{title}**\n"
+            "------------------\n"
+            f"Target: `{job.rom_url}`\n"
+            f"repo: `{REPO_NAME}`\n"
+            f"status: `{status}`\n"
+        )
+        if job.run_url:
+            text += f"run: {job.run_url}\n"
+        if details:
+            text += f"\n{details}"
+        return text
+
+    async def _update(self, job, title, status, details=""):
+        text = self._text(job, title, status, details)
+        for msg in list(job.messages):
+            await self._edit(msg, text)
+
+    @staticmethod
+    async def _edit(msg, text):
+        try:
+            await msg.edit_text(text, parse_mode="Markdown")
+        except TelegramError as e:
+            # "message is not modified", deleted messages, flood limits: not fatal
+            logging.warning("status edit failed: %s", e)
+
+build_queue = BuildQueue()
+
+# --- OTA LOOKUPS ---
+class OTABusy(Exception):
+    pass
+
+class OTALookups:
+    """OTA lookups off the event loop, through the shared resolver service
+    (in-process when it is not running): a small dedicated pool, identical
+    lookups in flight shared, a per-user sliding-window limit for uncached
+    lookups, and background prefetch of the most requested pairs."""
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(OTA_WORKERS, thread_name_prefix="bot-ota")
+        self._inflight = {}                     # (prefix, region) -> Future
+        self._recent = {}                       # user id -> deque of lookup times
+        self.popularity = Counter()             # (prefix, region) -> successful lookups, decayed
+
+    def allow(self, user_id):
+        if user_id in AUTHORIZED_USERS:
+            return True
+        now = time.monotonic()
+        recent = self._recent.setdefault(user_id, deque())
+        while recent and now - recent[0] > OTA_USER_WINDOW:
+            recent.popleft()
+        if len(recent) >= OTA_USER_LIMIT:
+            return False
+        recent.append(now)
+        return True
+
+    def count(self, prefix, region):
+        """Record a lookup that found a release. Counts halve every prefetch
+        round and whenever more than OTA_POPULAR_MAX pairs are tracked."""
+        self.popularity[(prefix, region)] += 1
+        if len(self.popularity) > OTA_POPULAR_MAX:
+            self._decay()
+            if len(self.popularity) > OTA_POPULAR_MAX:
+                self.popularity = Counter(dict(self.popularity.most_common(OTA_POPULAR_MAX)))
+
+    def _decay(self):
+        self.popularity = Counter({k: n // 2 for k, n in self.popularity.items() if n > 1})
+
+    def retry_in(self, user_id):
+        recent = self._recent.get(user_id)
+        return max(1, int(OTA_USER_WINDOW - (time.monotonic() - recent[0]))) if recent else 1
+
+    async def resolve(self, prefix, region):
+        key = (prefix, region)
+        fut = self._inflight.get(key)
+        if fut is None:
+            if len(self._inflight) >= OTA_MAX_PENDING:
+                raise OTABusy()
+            loop = asyncio.get_running_loop()
+            fut = self._inflight[key] = loop.run_in_executor(
+                self._pool, ota_service.resolve, prefix, region
+            )
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one impatient waiter must not cancel the lookup for the others
+        return await asyncio.shield(fut)
+
+    async def prefetch_loop(self):
+        """Keep the most requested pairs cached, one lookup at a time."""
+        while True:
+            await asyncio.sleep(OTA_PREFETCH_INTERVAL)
+            for (prefix, region), _ in self.popularity.most_common(OTA_PREFETCH_TOP):
+                if await asyncio.to_thread(ota_resolver.cached_result, prefix, region) is None:
+                    try:
+                        await self.resolve(prefix, region)
+                    except Exception as e:
+                        logging.warning("prefetch %s/%s failed: %s", prefix, region, e)
+            self._decay()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def ota_text(prefix, region, result):
+    label = ota_resolver.REGION_LABELS.get(region, region)
+    if not result.success:
+        return (
+            "**OTA Lookup**\n"
+            "------------------\n"
+            f"Device: `{prefix}`\n"
+            f"Region: {label}\n"
+            f"Result: {escape_markdown(str(result.error), version=1)}"
+        )
+    text = (
+        "**OTA Found**\n"
+        "------------------\n"
+        f"Device: `{prefix}`\n"
+        f"Region: {label}\n"
+        f"Version: `{result.version}`\n"
+        f"OTA: `{result.ota_version}`\n"
+        f"Size: `{ota_resolver.format_size(result.size)}`\n"
+        f"MD5: `{result.md5}`\n"
+        f"Patch: `{result.security_patch}`\n"
+    )
+    if result.published_time:
+        text += f"Published: `{result.published_time}`\n"
+    if result.download_url:
+        text += f"\n[Download]({result.download_url})"
+        if result.expires:
+            text += f" (expires `{result.expires:%Y-%m-%d %H:%M}`)"
+        text += "\n"
+    if result.changelog:
+        text += f"[Changelog]({result.changelog})\n"
+    return text
+
 # --- COMMANDS ---
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -36,8 +441,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "**NexDroid Manager**\n"
         "------------------\n"
         "System ready.\n\n"
-        "Command:\n"
-        "`/mod <url>` : Initialize build process",
+        "Commands:\n"
+        "`/mod <url>` : Initialize build process\n"
+        "`/ota <prefix> <region>` : Look up firmware",
         parse_mode="Markdown"
     )
 
@@ -59,60 +465,113 @@ async def mod_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_msg = await update.message.reply_text(
         "**Processing Request**\n"
         f"Target: `{rom_url}`\n"
-        "Status: Authenticating...",
+        "Status: Queued",
         parse_mode="Markdown"
     )
 
-    # 3. GitHub API Request
-    api_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/dispatches"
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    payload = {
-        "event_type": "build_rom",
-        "client_payload": {"rom_url": rom_url}
-    }
+    # 3. Queue (identical URLs share one build)
+    await build_queue.submit(rom_url, status_msg)
 
-    try:
-        response = requests.post(api_url, json=payload, headers=headers)
-        
-        if response.status_code == 204:
-            await status_msg.edit_text(
-                "**Build Queued**\n"
-                "------------------\n"
-                "The build pipeline has been triggered successfully.\n\n"
-                "repo: `HyperOS-Modder`\n"
-                "status: `running`\n"
-                "estimated time: `15m`\n\n"
-                "You will be notified upon completion.",
-                parse_mode="Markdown"
-            )
-        else:
-            # Clean Error Reporting
-            error_map = {
-                404: "Repository not found or insufficient token scope.",
-                401: "Invalid or expired GitHub token.",
-            }
-            reason = error_map.get(response.status_code, "Unknown API Error")
-            
-            await status_msg.edit_text(
-                "**Request Failed**\n"
-                "------------------\n"
-                f"Code: `{response.status_code}`\n"
-                f"Reason: {reason}\n"
-                f"Response: `{response.text}`",
-                parse_mode="Markdown"
-            )
-            
-    except Exception as e:
-        await status_msg.edit_text(
-            "**Connection Failure**\n"
-            f"`{str(e)}`", 
+async def ota_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # 1. Input Validation
+    if (len(context.args) != 2 or context.args[1].lower() not in ota_resolver.REGION_LABELS
+            or not OTA_PREFIX_RE.match(context.args[0].upper())):
+        await update.message.reply_text(
+            "**Error: Invalid Syntax**\n"
+            "Usage: `/ota <prefix> <region>`\n"
+            f"Regions: `{' '.join(ota_resolver.REGION_LABELS)}`",
+            parse_mode="Markdown"
+        )
+        return
+
+    ota_lookups = context.bot_data["ota_lookups"]
+    prefix, region = context.args[0].upper(), context.args[1].lower()
+
+    # 2. Cached answers go out immediately (no network, no rate limit). The
+    # SQLite read runs in a thread: resolver threads hold the cache lock while writing
+    cached = await asyncio.to_thread(ota_resolver.cached_result, prefix, region)
+    if cached is not None:
+        await update.message.reply_text(ota_text(prefix, region, cached), parse_mode="Markdown")
+        return
+
+    user_id = update.effective_user.id
+    if not ota_lookups.allow(user_id):
+        await update.message.reply_text(
+            f"**Rate Limited**\nTry again in `{ota_lookups.retry_in(user_id)}s`.",
             parse_mode="Markdown"
         )
+        return
+
+    # 3. Resolve in the background pool
+    status_msg = await update.message.reply_text(
+        "**Processing Request**\n"
+        f"Device: `{prefix}`\n"
+        f"Region: {ota_resolver.REGION_LABELS[region]}\n"
+        "Status: Querying OTA servers...",
+        parse_mode="Markdown"
+    )
+    try:
+        result = await ota_lookups.resolve(prefix, region)
+        if result.success:
+            ota_lookups.count(prefix, region)   # only real releases steer prefetch
+        text = ota_text(prefix, region, result)
+    except OTABusy:
+        text = "**Busy**\nToo many lookups in progress, try again in a minute."
+    except Exception as e:
+        detail = str(e).replace("`", "'")     # would close the code span
+        text = "**Lookup Failure**\n" f"`{detail}`"
+    await status_msg.edit_text(text, parse_mode="Markdown")
 
 # --- ENTRY POINT ---
+async def on_startup(app):
+    await open_http(app)
+    # One lookup pool per application: a failed webhook start shuts its own
+    # pool down, and the polling fallback app must not inherit a dead one.
+    ota_lookups = app.bot_data["ota_lookups"] = OTALookups()
+    start_background(app, ota_lookups.prefetch_loop())
+
+async def on_shutdown(app):
+    await close_http(app)
+    ota_lookups = app.bot_data.pop("ota_lookups", None)
+    if ota_lookups is not None:
+        ota_lookups.shutdown()
+
+def build_app():
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)   # handlers await I/O; let many run at once
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if TELEGRAM_API:
+        builder = builder.base_url(f"{TELEGRAM_API}/bot").base_file_url(f"{TELEGRAM_API}/file/bot")
+    app = builder.build()
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("mod", mod_command))
+    app.add_handler(CommandHandler("ota", ota_command))
+    return app
+
+def run_webhook_or_polling():
+    """Serve updates on a local webhook; fall back to polling if that can't start
+    (webhooks extra not installed, port taken, setWebhook refused)."""
+    if importlib.util.find_spec("tornado") is None:
+        logging.warning('Webhook mode needs "python-telegram-bot[webhooks]"; using polling')
+        build_app().run_polling()
+        return
+    try:
+        build_app().run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            close_loop=False,       # keep the loop for the polling fallback
+        )
+    except Exception as e:
+        logging.warning("Webhook mode failed (%s); falling back to polling", e)
+        build_app().run_polling()   # deletes the webhook on startup
+
 if __name__ == '__main__':
     print(f">> NexDroid Manager Active: {REPO_OWNER}/{REPO_NAME}")
     
@@ -120,8 +579,7 @@ if __name__ == '__main__':
         print(">> FATAL: Configuration missing in .env file.")
         exit(1)
 
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("mod", mod_command))
-
-    app.run_polling()
+    if WEBHOOK_URL:
+        run_webhook_or_polling()
+    else:
+        build_app().run_polling()
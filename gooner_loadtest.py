@@ -0,0 +1,184 @@
+"""
+Load test for gooner.py's outbound HTTP: fires many /mod commands at once
+against a local stub of the GitHub API (dispatches + workflow runs) and
+watches event-loop lag.
+
+A blocking call anywhere in a handler shows up as lag close to the stub's
+latency; with the shared async client the loop keeps ticking and total wall
+time stays near one request's latency instead of N of them. The stub also
+serves workflow runs with ETags, so the report shows how many status polls
+were answered by a free 304.
+
+Usage:
+  python gooner_loadtest.py [-n 50] [--latency 300] [--fail-rate 0.1] [--arrival-rate 200]
+                            [--distinct 0.5] [--max-builds 4] [--build-time 2]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# ─── Stub GitHub API ──────────────────────────────────────────────
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.3
+    fail_rate = 0.0
+    build_time = 2.0
+    runs = {}                   # run id -> (build_id, dispatched at)
+    counts = {"dispatch": 0, "get_200": 0, "get_304": 0}
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _run_json(self, run_id):
+        build_id, started = self.runs[run_id]
+        done = time.time() - started >= self.build_time
+        return {"id": run_id, "display_title": f"NexDroid build {build_id}",
+                "status": "completed" if done else "in_progress",
+                "conclusion": "success" if done else None,
+                "html_url": f"https://github.invalid/runs/{run_id}"}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            return self._reply(502)
+        self.counts["dispatch"] += 1
+        self.runs[len(self.runs) + 1] = (body["client_payload"]["build_id"], time.time())
+        self._reply(204)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            return self._reply(200, json.dumps(self.counts).encode())
+        if path.endswith("/actions/runs"):
+            data = {"workflow_runs": [self._run_json(i) for i in list(self.runs)]}
+        elif "/actions/runs/" in path:
+            data = self._run_json(int(path.rsplit("/", 1)[1]))
+        else:
+            return self._reply(404)
+        body = json.dumps(data).encode()
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.counts["get_304"] += 1
+            return self._reply(304, headers={"ETag": etag})
+        self.counts["get_200"] += 1
+        self._reply(200, body, {"ETag": etag, "Content-Type": "application/json"})
+
+def _serve_stub(latency, fail_rate, build_time, port_queue) -> None:
+    _StubHandler.latency, _StubHandler.fail_rate = latency, fail_rate
+    _StubHandler.build_time = build_time
+    ThreadingHTTPServer.request_queue_size = 256      # default backlog (5) drops bursts
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def start_stub(latency: float, fail_rate: float, build_time: float):
+    """Stub in its own process, so its threads don't compete for our GIL.
+    Returns (process, port)."""
+    port_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_serve_stub, args=(latency, fail_rate, build_time, port_queue),
+                                   daemon=True)
+    proc.start()
+    return proc, port_queue.get(timeout=10)
+
+# ─── Fake Telegram objects ────────────────────────────────────────
+class _FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def reply_text(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+def _fake_update(user_id: int, url: str):
+    msg = _FakeMessage()
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=msg)
+    context = SimpleNamespace(args=[url])
+    return update, context, msg
+
+# ─── Driver ───────────────────────────────────────────────────────
+async def _loop_lag(stop: asyncio.Event, tick: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(tick)
+        worst = max(worst, time.perf_counter() - t0 - tick)
+    return worst
+
+async def _paced(coro, delay: float):
+    await asyncio.sleep(delay)
+    return await coro
+
+async def run(n: int, arrival_rate: float = 0.0, distinct: float = 1.0) -> dict:
+    import gooner
+
+    user = gooner.AUTHORIZED_USERS[0]
+    urls = max(1, round(n * distinct))
+    calls = [_fake_update(user, f"https://example.com/rom_{i % urls}.zip") for i in range(n)]
+    await gooner.open_http()                           # what post_init does in the bot
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_loop_lag(stop))
+    t0 = time.perf_counter()
+    # Updates arrive spread out (arrival_rate/s); 0 = all in the same loop tick
+    spacing = 1 / arrival_rate if arrival_rate > 0 else 0.0
+    await asyncio.gather(*(_paced(gooner.mod_command(u, c), i * spacing)
+                           for i, (u, c, _) in enumerate(calls)))
+    accepted = time.perf_counter() - t0
+    await gooner.build_queue.join()
+    wall = time.perf_counter() - t0
+    stop.set()
+    lag = await lag_task
+    stats = (await gooner.get_http().get("/stats")).json()
+    await gooner.close_http()
+    finished = sum(1 for _, _, m in calls if m.edits and m.edits[-1].startswith("**Build Finished"))
+    return {"commands": n, "distinct_urls": urls, "finished": finished, "accepted_s": accepted,
+            "wall_s": wall, "max_loop_lag_ms": lag * 1000, **stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent /mod load test against a stub GitHub API")
+    parser.add_argument("-n", type=int, default=50, help="concurrent /mod commands")
+    parser.add_argument("--latency", type=float, default=300.0, help="stub API latency (ms)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probability of a 502 (retried)")
+    parser.add_argument("--arrival-rate", type=float, default=200.0,
+                        help="commands/s (0 = all at once; lag then includes every handler's setup CPU)")
+    parser.add_argument("--distinct", type=float, default=1.0, help="fraction of distinct ROM URLs")
+    parser.add_argument("--max-builds", type=int, default=0, help="concurrent builds (default: -n)")
+    parser.add_argument("--build-time", type=float, default=2.0, help="stub workflow run duration (s)")
+    args = parser.parse_args()
+
+    stub, port = start_stub(args.latency / 1000, args.fail_rate, args.build_time)
+    os.environ["GITHUB_API_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("GITHUB_TOKEN", "stub")
+    os.environ["BOT_MAX_BUILDS"] = str(args.max_builds or args.n)
+    os.environ.setdefault("BOT_POLL_MIN", "0.3")
+    os.environ.setdefault("BOT_POLL_MAX", "2")
+
+    r = asyncio.run(run(args.n, args.arrival_rate, args.distinct))
+    stub.terminate()
+    print(f"{r['commands']} /mod ({r['distinct_urls']} distinct) accepted in {r['accepted_s']:.2f} s; "
+          f"{r['dispatch']} dispatched, all done in {r['wall_s']:.2f} s")
+    print(f"status messages finished: {r['finished']}/{r['commands']}")
+    print(f"run polls: {r['get_200']} × 200, {r['get_304']} × 304 (not rate-limited)")
+    print(f"max event-loop lag: {r['max_loop_lag_ms']:.1f} ms")
+    ok = r["max_loop_lag_ms"] < args.latency / 2 and r["dispatch"] == r["distinct_urls"]
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,198 @@
+"""
+Command-to-reply latency of gooner.py in polling vs webhook mode.
+
+Runs the bot as a child process against a local stub of the Telegram Bot
+API (TELEGRAM_API_URL). Synthetic /start updates are handed out through
+getUpdates (polling) or POSTed to the bot's webhook with the secret token
+(webhook); latency is measured until the stub receives the bot's
+sendMessage. Also reports startup time (spawn → first getUpdates, or webhook listening)
+and checks that a webhook POST with a wrong secret is rejected.
+
+Usage:
+  python gooner_webhook_bench.py [-n 50] [--modes polling webhook]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import signal
+import argparse
+import statistics
+import subprocess
+import threading
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+TOKEN = "123456:stub"
+
+# ─── Stub Bot API ─────────────────────────────────────────────────
+class _BotAPI:
+    def __init__(self):
+        self.updates = queue.Queue()       # handed out by getUpdates
+        self.replies = queue.Queue()       # (text, time) of every sendMessage
+        self.ready = threading.Event()     # first getUpdates / setWebhook seen
+        self.ready_at = 0.0
+        self.webhook = None                # (url, secret)
+        self.message_id = 0
+
+    def call(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "stub", "username": "stub_bot"}
+        if method in ("setWebhook", "deleteWebhook"):
+            if method == "setWebhook":
+                self.webhook = (params.get("url"), params.get("secret_token"))
+            self._mark_ready(method == "setWebhook")
+            return True
+        if method == "getUpdates":
+            self._mark_ready(True)
+            try:
+                first = self.updates.get(timeout=min(float(params.get("timeout", 0) or 0), 2.0))
+            except queue.Empty:
+                return []
+            return [first]
+        if method in ("sendMessage", "editMessageText"):
+            if method == "sendMessage":
+                self.replies.put((params.get("text", ""), time.perf_counter()))
+            self.message_id += 1
+            return {"message_id": self.message_id, "date": int(time.time()),
+                    "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                    "text": params.get("text", "")}
+        return True
+
+    def _mark_ready(self, really: bool):
+        if really and not self.ready.is_set():
+            self.ready_at = time.perf_counter()
+            self.ready.set()
+
+def _stub_handler(api: _BotAPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if "json" in self.headers.get("Content-Type", ""):
+                params = json.loads(raw or b"{}")
+            else:
+                params = {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+            method = self.path.rsplit("/", 1)[-1]
+            body = json.dumps({"ok": True, "result": api.call(method, params)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST
+    return Handler
+
+# ─── Driver ───────────────────────────────────────────────────────
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_listening(url: str, timeout: float = 15.0) -> None:
+    host, port = url.split("://", 1)[1].split("/", 1)[0].rsplit(":", 1)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection((host, int(port)), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError(f"webhook {url} never started listening")
+
+def _update(update_id: int, user_id: int) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+        "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}}
+
+def _post_webhook(url: str, secret: str, update: dict) -> int:
+    req = urllib.request.Request(url, data=json.dumps(update).encode(), method="POST",
+                                 headers={"Content-Type": "application/json",
+                                          "X-Telegram-Bot-Api-Secret-Token": secret})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def bench_mode(mode: str, n: int, user_id: int) -> dict:
+    api = _BotAPI()
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _stub_handler(api))
+    stub.daemon_threads = True
+    stub.handle_error = lambda *a: None            # long polls cut off at shutdown
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    env = dict(os.environ, TELEGRAM_TOKEN=TOKEN, GITHUB_TOKEN=os.environ.get("GITHUB_TOKEN", "stub"),
+               TELEGRAM_API_URL=f"http://127.0.0.1:{stub.server_address[1]}")
+    env.pop("BOT_WEBHOOK_URL", None)
+    if mode == "webhook":
+        port = _free_port()
+        env.update(BOT_WEBHOOK_URL=f"http://127.0.0.1:{port}", BOT_WEBHOOK_PORT=str(port))
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gooner.py")
+    spawned = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, script], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not api.ready.wait(30):
+            raise RuntimeError(f"{mode}: bot did not start")
+        served_by = "webhook" if api.webhook else "polling"
+        if api.webhook:
+            _wait_listening(api.webhook[0])
+            api.ready_at = time.perf_counter()
+        startup = api.ready_at - spawned
+
+        rejected = None
+        if api.webhook:
+            url, secret = api.webhook
+            rejected = _post_webhook(url, "wrong-" + (secret or ""), _update(0, user_id)) == 403
+
+        latencies = []
+        for i in range(1, n + 1):
+            t0 = time.perf_counter()
+            if api.webhook:
+                _post_webhook(api.webhook[0], api.webhook[1], _update(i, user_id))
+            else:
+                api.updates.put(_update(i, user_id))
+            _, replied = api.replies.get(timeout=30)
+            latencies.append(replied - t0)
+    finally:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(10)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        stub.shutdown()
+
+    latencies.sort()
+    return {"mode": mode, "served_by": served_by, "startup_s": startup, "bad_secret_rejected": rejected,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+            "max_ms": latencies[-1] * 1000}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="gooner.py command-to-reply latency, polling vs webhook")
+    parser.add_argument("-n", type=int, default=50, help="/start commands per mode")
+    parser.add_argument("--modes", nargs="+", choices=("polling", "webhook"), default=["polling", "webhook"])
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from gooner import AUTHORIZED_USERS
+
+    for mode in args.modes:
+        r = bench_mode(mode, args.n, AUTHORIZED_USERS[0])
+        extra = "" if r["bad_secret_rejected"] is None else \
+            f"  bad secret {'rejected' if r['bad_secret_rejected'] else 'ACCEPTED'}"
+        print(f"{r['mode']:8s} (served by {r['served_by']}): startup {r['startup_s']:.2f} s  "
+              f"p50 {r['p50_ms']:.1f} ms  p95 {r['p95_ms']:.1f} ms  max {r['max_ms']:.1f} ms{extra}")
@@ -0,0 +1,143 @@
+"""
+Image manifest for NexDroid packages: size + SHA-256 of every images/*.img
+(and super/*.img in mod-only packages), hashed concurrently.
+
+Each file is memory-mapped and fed to hashlib in large slices; hashlib
+drops the GIL while it digests, so a thread pool hashes several multi-GB
+images at the disk's speed instead of one after another.
+
+The JSON keeps one image per line so the recovery installer (plain sh,
+no Python) can grep its own entry:
+
+  {"device": "...", "images": {
+    "boot": {"file": "images/boot.img", "size": 100663296, "sha256": "..."},
+    ...
+  }}
+
+Usage:
+  python image_hash.py <package_dir> [-o image_manifest.json] [--device CODE] [-j N]
+  python image_hash.py <package_dir> --verify [image_manifest.json]
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
+
+MANIFEST_NAME = "image_manifest.json"
+IMAGE_DIRS    = ("images", "super")
+HASH_WORKERS  = int(os.environ.get("IMAGE_HASH_WORKERS", "0")) or min(8, os.cpu_count() or 4)
+_SLICE        = 16 << 20            # bytes handed to hashlib per call
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Hashing
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def hash_file(path: str) -> str:
+    """SHA-256 of one file through a read-only mapping."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return h.hexdigest()            # empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as view:
+                for off in range(0, size, _SLICE):
+                    h.update(view[off:off + _SLICE])
+    return h.hexdigest()
+
+def hash_files(paths: Iterable[str], workers: Optional[int] = None) -> Dict[str, str]:
+    """path → SHA-256 for every path, hashed in parallel. Largest files are
+    started first so one big super.img does not run alone at the end."""
+    paths = sorted(set(paths), key=os.path.getsize, reverse=True)
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers or HASH_WORKERS, len(paths))) as pool:
+        return dict(zip(paths, pool.map(hash_file, paths)))
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Manifest
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def find_images(root: str, subdirs: Sequence[str] = IMAGE_DIRS) -> Dict[str, str]:
+    """image name → path relative to root ("images/boot.img")."""
+    found = {}
+    for sub in subdirs:
+        folder = os.path.join(root, sub)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".img") and os.path.isfile(os.path.join(folder, name)):
+                found.setdefault(name[:-4], f"{sub}/{name}")
+    return found
+
+def build_manifest(root: str, device: str = "", subdirs: Sequence[str] = IMAGE_DIRS,
+                   workers: Optional[int] = None) -> dict:
+    files = find_images(root, subdirs)
+    full = {name: os.path.join(root, rel) for name, rel in files.items()}
+    digests = hash_files(full.values(), workers)
+    images = {name: {"file": files[name], "size": os.path.getsize(path), "sha256": digests[path]}
+              for name, path in full.items()}
+    return {"device": device, "images": images}
+
+def write_manifest(manifest: dict, path: str) -> None:
+    entries = [f"    {json.dumps(name)}: {json.dumps(info)}" for name, info in manifest["images"].items()]
+    with open(path, "w") as f:
+        f.write(f'{{"device": {json.dumps(manifest.get("device", ""))}, "images": {{\n')
+        f.write(",\n".join(entries))
+        f.write("\n}}\n")
+
+def load_manifest(path: str) -> dict:
+    with open(path) as f:
+        manifest = json.load(f)
+    if "images" not in manifest:
+        raise ValueError(f"{path} is not an image manifest")
+    return manifest
+
+def verify(manifest: dict, root: str, workers: Optional[int] = None) -> List[str]:
+    """Names of images that are missing or do not match the manifest.
+    Sizes are compared first, so truncated files cost no hashing."""
+    bad, to_hash = [], {}
+    for name, info in manifest["images"].items():
+        path = os.path.join(root, info.get("file", f"images/{name}.img"))
+        if not os.path.isfile(path) or os.path.getsize(path) != info["size"]:
+            bad.append(name)
+        else:
+            to_hash[path] = name
+    for path, digest in hash_files(to_hash, workers).items():
+        if digest != manifest["images"][to_hash[path]]["sha256"]:
+            bad.append(to_hash[path])
+    return sorted(bad)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel SHA-256 manifest of package images")
+    parser.add_argument("package_dir")
+    parser.add_argument("-o", "--output", help=f"manifest path (default: <package_dir>/{MANIFEST_NAME})")
+    parser.add_argument("--device", default="")
+    parser.add_argument("-j", "--workers", type=int, default=0, help=f"hash threads (default {HASH_WORKERS})")
+    parser.add_argument("--verify", nargs="?", const="", metavar="MANIFEST",
+                        help="check images against a manifest instead of writing one")
+    args = parser.parse_args()
+    manifest_path = args.output or os.path.join(args.package_dir, MANIFEST_NAME)
+
+    t0 = time.perf_counter()
+    if args.verify is not None:
+        manifest = load_manifest(args.verify or manifest_path)
+        bad = verify(manifest, args.package_dir, args.workers)
+        for name in bad:
+            print(f"MISMATCH {name}")
+        print(f"{len(manifest['images']) - len(bad)}/{len(manifest['images'])} images OK "
+              f"in {time.perf_counter() - t0:.1f}s")
+        sys.exit(1 if bad else 0)
+
+    manifest = build_manifest(args.package_dir, args.device, workers=args.workers)
+    write_manifest(manifest, manifest_path)
+    total = sum(i["size"] for i in manifest["images"].values())
+    print(f"{len(manifest['images'])} images, {total / 2**30:.2f} GiB hashed "
+          f"in {time.perf_counter() - t0:.1f}s → {manifest_path}")
@@ -0,0 +1,157 @@
+"""
+End-to-end benchmark of ota_resolver against the local mock (ota_mock.py).
+
+Starts the mock in a child process (so its CPU is not billed to the client),
+points the resolver at it and drives resolve_ota / resolve_many at a given
+concurrency. Reports p50/p95/p99 lookup latency, probes per lookup and
+client CPU per query sent.
+
+Usage:
+  python ota_bench.py [-n 200] [-c 8] [--batch] [--regions eu in sg]
+                      [--cache cold|learned|warm] [--latency 80] [--jitter 20]
+                      [--rate-limited 0.02] [--server-error 0.01] [--rate 0]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+import ota_mock
+import ota_resolver
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def _start_mock(key_path: str, args) -> Tuple[subprocess.Popen, str]:
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ota_mock.py"),
+           "--key", key_path, "--latency", str(args.latency), "--jitter", str(args.jitter),
+           "--rate-limited", str(args.rate_limited), "--server-error", str(args.server_error),
+           "--spread"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().split()
+    if len(line) != 2 or line[0] != "PORT":
+        proc.kill()
+        raise RuntimeError("mock OTA server failed to start")
+    return proc, f"127.0.0.1:{line[1]}"
+
+def _server_queries(host: str) -> int:
+    return requests.get(f"http://{host}/stats", timeout=5).json().get("queries", 0)
+
+def _run_pass(pairs: List[Tuple[str, str]], args) -> Tuple[List[float], List[int], int]:
+    """(latencies in s, probes per lookup, successes) for one pass over pairs."""
+    latencies: List[float] = []
+    probes: List[int] = []
+    found = 0
+    if args.batch:
+        # resolve_many yields in completion order; latency = time since the batch started
+        t0 = time.perf_counter()
+        prefixes = list(dict.fromkeys(p for p, _ in pairs))
+        regions = list(dict.fromkeys(r for _, r in pairs))
+        for _, _, res in ota_resolver.resolve_many(prefixes, regions, max_workers=args.concurrency,
+                                                    rate=args.rate):
+            latencies.append(time.perf_counter() - t0)
+            probes.append(res.probes)
+            found += res.success
+        return latencies, probes, found
+
+    def one(pair):
+        t0 = time.perf_counter()
+        res = ota_resolver.resolve_ota(*pair)
+        return time.perf_counter() - t0, res
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for dt, res in pool.map(one, pairs):
+            latencies.append(dt)
+            probes.append(res.probes)
+            found += res.success
+    return latencies, probes, found
+
+def run(args) -> Dict[str, float]:
+    tmp = tempfile.mkdtemp(prefix="ota_bench_")
+    saved_cache = ota_resolver._ota_cache
+    proc = None
+    try:
+        key_path = os.path.join(tmp, "mock_key.pem")
+        public_pem = ota_mock.generate_key(key_path)
+        proc, host = _start_mock(key_path, args)
+        ota_mock.point_resolver_at(host, public_pem)
+        ota_resolver.set_host_rate(args.rate)
+        ota_resolver._ota_cache = ota_resolver.OTACache(os.path.join(tmp, "cache.sqlite"))
+
+        prefixes = [f"MOCK{i:04d}" for i in range(max(1, args.n // len(args.regions)))]
+        pairs = [(p, r) for p in prefixes for r in args.regions][:args.n]
+
+        if args.cache != "cold":
+            _run_pass(pairs, args)                       # warm-up: fills cache + learned table
+            if args.cache == "learned":
+                ota_resolver._ota_cache.clear(learned=False)
+
+        q0 = _server_queries(host)
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        latencies, probes, found = _run_pass(pairs, args)
+        cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+        queries = _server_queries(host) - q0
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        ota_resolver.close_sessions()
+        ota_resolver._ota_cache = saved_cache
+        shutil.rmtree(tmp, ignore_errors=True)     # holds the mock's private key
+
+    return {
+        "lookups": len(latencies),
+        "found": found,
+        "wall_s": wall,
+        "lookups_per_s": len(latencies) / wall if wall else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "probes_per_lookup": statistics.mean(probes) if probes else 0.0,
+        "server_queries": queries,
+        "cpu_ms_per_query": cpu / queries * 1000 if queries else 0.0,
+        "cpu_ms_per_lookup": cpu / len(latencies) * 1000 if latencies else 0.0,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ota_resolver against the local mock server")
+    parser.add_argument("-n", type=int, default=200, help="lookups (prefix × region pairs)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--batch", action="store_true", help="drive resolve_many instead of resolve_ota")
+    parser.add_argument("--regions", nargs="+", default=["eu", "in", "sg"])
+    parser.add_argument("--cache", choices=("cold", "learned", "warm"), default="cold",
+                        help="cold: empty cache; learned: suffix history only; warm: results cached")
+    parser.add_argument("--latency", type=float, default=50.0, help="mock server latency (ms)")
+    parser.add_argument("--jitter", type=float, default=10.0)
+    parser.add_argument("--rate-limited", type=float, default=0.0, help="probability of 308")
+    parser.add_argument("--server-error", type=float, default=0.0, help="probability of 500")
+    parser.add_argument("--rate", type=float, default=0.0, help="client req/s per host (<= 0: unlimited)")
+    parser.add_argument("--json", action="store_true", help="print the raw numbers as JSON")
+    args = parser.parse_args()
+
+    r = run(args)
+    if args.json:
+        print(json.dumps(r, indent=2))
+        sys.exit(0)
+    mode = "resolve_many" if args.batch else "resolve_ota"
+    print(f"{mode} × {r['lookups']} ({r['found']} found), concurrency {args.concurrency}, cache {args.cache}")
+    print(f"  latency   p50 {r['p50_ms']:8.1f} ms   p95 {r['p95_ms']:8.1f} ms   p99 {r['p99_ms']:8.1f} ms")
+    print(f"  probes    {r['probes_per_lookup']:.2f}/lookup   ({r['server_queries']} queries sent)")
+    print(f"  cpu       {r['cpu_ms_per_query']:.3f} ms/query   {r['cpu_ms_per_lookup']:.3f} ms/lookup")
+    print(f"  throughput {r['lookups_per_s']:.1f} lookups/s over {r['wall_s']:.2f} s")
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the OPlus OTA servers — for benchmarks and regression
+runs of ota_resolver without touching the real endpoints.
+
+Implements the /update/v3 protocol the resolver speaks:
+  • protectedKey header → RSA-OAEP(SHA-1) decrypt with the mock's own key
+  • request params → AES-CTR decrypt and validate
+  • 200 answers are AES-CTR encrypted with the client's key
+  • configurable 308 / 500 injection, 2004 for misses, latency + jitter
+  • manualUrl points at /downloadCheck, which 302s to a signed link
+
+Usage:
+  python ota_mock.py --key mock_key.pem [--port 0] [--latency 80] [--jitter 20]
+                     [--rate-limited 0.05] [--server-error 0.01] [--hit _11.F:taste] [--spread]
+  Prints "PORT <n>" once listening. GET /stats returns request counters.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+import ota_resolver
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Configuration
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0            # added to every answer
+    jitter_ms: float = 0.0             # ± uniform
+    rate_limited: float = 0.0          # probability of a 308
+    server_error: float = 0.0          # probability of a 500
+    hit_suffix: str = "_11.F"          # where every device's firmware "lives"
+    hit_mode: str = "taste"            # taste | manual
+    hit_variant: str = ""              # "" or "IN"
+    spread: bool = False               # hash each prefix onto its own suffix/mode instead
+    # per-prefix overrides: {"CPH2581": ("_11.H", "manual", "")}
+    devices: Dict[str, Tuple[str, str, str]] = field(default_factory=dict)
+
+def generate_key(path: str) -> str:
+    """Write a fresh RSA-2048 private key (PEM) to path; return its public PEM."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return public_pem(path)
+
+def public_pem(path: str) -> str:
+    with open(path, "rb") as f:
+        key = serialization.load_pem_private_key(f.read(), password=None)
+    return key.public_key().public_bytes(serialization.Encoding.PEM,
+                                         serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+def point_resolver_at(host: str, public_key_pem: str) -> None:
+    """Route every ota_resolver region to the mock (same process only)."""
+    ota_resolver.OTA_SCHEME = "http"
+    for k in ota_resolver.PUBLIC_KEYS:
+        ota_resolver.PUBLIC_KEYS[k] = public_key_pem
+    for cfg in ota_resolver.REGION_CONFIG.values():
+        if "host" in cfg:
+            cfg["host"] = host
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Server
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"          # keep-alive, like the real CDN
+    server: "MockOTAServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj: dict):
+        self._send(200, json.dumps(obj).encode(), {"Content-Type": "application/json"})
+
+    def do_GET(self):
+        if self.path.startswith("/downloadCheck"):
+            self.server.count("redirect")
+            self.server.delay()
+            expires = int(time.time()) + 1800
+            loc = f"http://{self.headers.get('Host')}/ota/{hashlib.md5(self.path.encode()).hexdigest()}.zip?Expires={expires}"
+            self._send(302, headers={"Location": loc})
+        elif self.path == "/stats":
+            self._json(self.server.stats())
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        if self.path != "/update/v3":
+            return self._send(404)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.delay()
+        try:
+            aes_key = self.server.unwrap_key(self.headers["protectedKey"])
+            params = json.loads(json.loads(body)["params"])
+            json.loads(ota_resolver._aes_ctr_decrypt(base64.b64decode(params["cipher"]), aes_key,
+                                                     base64.b64decode(params["iv"])))
+        except Exception:
+            self.server.count(400)
+            return self._send(400)
+        code = self.server.pick_code(self.headers.get("otaVersion", ""), self.headers.get("model", ""),
+                                     self.headers.get("mode", ""))
+        self.server.count(code)
+        if code != 200:
+            return self._json({"responseCode": code})
+        self._json({"responseCode": 200,
+                    "body": json.dumps(self.server.encrypted_answer(aes_key, self.headers))})
+
+class MockOTAServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, key_path: str, config: Optional[MockConfig] = None, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        with open(key_path, "rb") as f:
+            self._key = serialization.load_pem_private_key(f.read(), password=None)
+        self.config = config or MockConfig()
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "MockOTAServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ── protocol ────────────────────────────────────────────────
+    def unwrap_key(self, header: str) -> bytes:
+        scene = json.loads(header)["SCENE_1"]
+        key_b64 = self._key.decrypt(
+            base64.b64decode(scene["protectedKey"]),
+            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA1()), algorithm=hashes.SHA1(), label=None))
+        return base64.b64decode(key_b64)
+
+    def pick_code(self, ota_version: str, model: str, mode: str) -> int:
+        cfg = self.config
+        roll = random.random()
+        if roll < cfg.rate_limited:
+            return 308
+        if roll < cfg.rate_limited + cfg.server_error:
+            return 500
+        prefix = ota_version.split("_")[0]
+        suffix, hit_mode, variant = cfg.devices.get(prefix) or self._default_hit(prefix)
+        hit = (f"{suffix}." in ota_version and mode == hit_mode
+               and model.endswith(variant) and (variant or not model.endswith("IN")))
+        return 200 if hit else 2004
+
+    def _default_hit(self, prefix: str) -> Tuple[str, str, str]:
+        cfg = self.config
+        if not cfg.spread:
+            return cfg.hit_suffix, cfg.hit_mode, cfg.hit_variant
+        h = int(hashlib.md5(prefix.encode()).hexdigest(), 16)
+        return (ota_resolver._SUFFIXES[h % len(ota_resolver._SUFFIXES)],
+                ("taste", "manual")[(h >> 8) % 4 == 0], "")
+
+    def encrypted_answer(self, aes_key: bytes, headers) -> dict:
+        ota_version = headers.get("otaVersion", "")
+        version = ota_version.split(".01_")[0]
+        data = {
+            "realVersionName": f"{version}.100(MOCK)",
+            "realOtaVersion": f"{version}.01_0100_202601010000",
+            "securityPatch": "2026-01-01",
+            "publishedTime": int(time.time() * 1000),
+            "description": {"panelUrl": f"http://{headers.get('Host')}/changelog/{version}"},
+            "components": [{"componentPackets": {
+                "manualUrl": f"http://{headers.get('Host')}/downloadCheck?v={version}",
+                "size": "6442450944",
+                "md5": hashlib.md5(version.encode()).hexdigest(),
+            }}],
+        }
+        iv = os.urandom(16)
+        cipher = ota_resolver._aes_ctr_encrypt(json.dumps(data).encode(), aes_key, iv)
+        return {"cipher": base64.b64encode(cipher).decode(), "iv": base64.b64encode(iv).decode()}
+
+    # ── bookkeeping ─────────────────────────────────────────────
+    def delay(self) -> None:
+        cfg = self.config
+        ms = cfg.latency_ms + random.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def count(self, key) -> None:
+        with self._lock:
+            self._counts[str(key)] = self._counts.get(str(key), 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["queries"] = sum(v for k, v in counts.items() if k.isdigit())
+        return counts
+
+
+def _parse_hit(text: str) -> Tuple[str, str, str]:
+    """'_11.F:taste' or '_11.H:taste:IN' → (suffix, mode, variant)."""
+    parts = text.split(":") + ["", ""]
+    return parts[0], parts[1] or "taste", parts[2]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OPlus /update/v3 OTA server")
+    parser.add_argument("--key", required=True, help="RSA private key PEM (created if missing)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms added to every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± ms")
+    parser.add_argument("--rate-limited", type=float, default=0.0, help="probability of 308")
+    parser.add_argument("--server-error", type=float, default=0.0, help="probability of 500")
+    parser.add_argument("--hit", default="_11.F:taste", help="suffix:mode[:variant] that answers 200")
+    parser.add_argument("--spread", action="store_true", help="hash each prefix onto its own suffix/mode")
+    parser.add_argument("--device", action="append", default=[], metavar="PREFIX=suffix:mode[:variant]")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.key):
+        generate_key(args.key)
+    suffix, mode, variant = _parse_hit(args.hit)
+    config = MockConfig(args.latency, args.jitter, args.rate_limited, args.server_error,
+                        suffix, mode, variant, args.spread,
+                        {d.split("=")[0].upper(): _parse_hit(d.split("=", 1)[1]) for d in args.device})
+    server = MockOTAServer(args.key, config, args.port)
+    print(f"PORT {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
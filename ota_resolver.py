@@ -12,11 +12,18 @@ import random
 import string
 import re
 import binascii
-from typing import Dict, List, Tuple, Optional, Any
-from dataclasses import dataclass, field
+import sqlite3
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Optional, Any, Iterable, Iterator
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
@@ -85,6 +92,9 @@ REGION_CONFIG = {
     "vn":       {"language": "vi-VN", "carrier_id": "00111100"},
 }
 
+# "http" only for local stand-ins (see ota_mock.py)
+OTA_SCHEME = os.environ.get("OTA_SCHEME", "https")
+
 REGION_LABELS = {
     "cn": "🇨🇳 China", "gl": "🌍 Global", "in": "🇮🇳 India", "eu": "🇪🇺 Europe",
     "id": "🇮🇩 Indonesia", "sg": "🇸🇬 SEA", "tw": "🇹🇼 Taiwan", "ru": "🇷🇺 Russia",
@@ -108,6 +118,277 @@ class OTAResult:
     changelog: Optional[str] = None
     expires: Optional[datetime] = None
     response_code: int = 0
+    redirect_source: Optional[str] = None   # downloadCheck URL download_url was resolved from
+    probes: int = 0                         # queries sent by this lookup (0 = cache hit)
+    probes_saved: int = 0                   # vs. the fixed suffix order, thanks to learned order
+    stored: float = 0.0                     # when OTACache stored the metadata (0 = not cached)
+    url_expires: Optional[float] = None     # when OTACache refreshes download_url
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  HTTP Sessions (one keep-alive pool per host)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+HTTP_POOL_SIZE       = int(os.environ.get("OTA_HTTP_POOL_SIZE", "8"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("OTA_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT    = float(os.environ.get("OTA_HTTP_READ_TIMEOUT", "30"))
+HTTP_RETRIES         = int(os.environ.get("OTA_HTTP_RETRIES", "2"))
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def configure_http(pool_size: Optional[int] = None, connect_timeout: Optional[float] = None,
+                   read_timeout: Optional[float] = None, retries: Optional[int] = None) -> None:
+    """Change pool/timeout/retry settings. Existing sessions are closed and rebuilt lazily."""
+    global HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_RETRIES
+    if pool_size is not None:       HTTP_POOL_SIZE = pool_size
+    if connect_timeout is not None: HTTP_CONNECT_TIMEOUT = connect_timeout
+    if read_timeout is not None:    HTTP_READ_TIMEOUT = read_timeout
+    if retries is not None:         HTTP_RETRIES = retries
+    close_sessions()
+
+def close_sessions() -> None:
+    with _sessions_lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+
+def _session_for(host: str) -> requests.Session:
+    """Keep-alive session for host, created on first use."""
+    with _sessions_lock:
+        s = _sessions.get(host)
+        if s is None:
+            # Connection errors and gateway hiccups are retried inside the pool;
+            # application-level retries stay in _query_single / _get_redirect_url.
+            retry = Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, status=HTTP_RETRIES,
+                          status_forcelist=(502, 503, 504), allowed_methods=None,
+                          backoff_factor=0.3, raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            s = requests.Session()
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[host] = s
+        return s
+
+def _timeout(read: Optional[float] = None) -> Tuple[float, float]:
+    return (HTTP_CONNECT_TIMEOUT, read if read is not None else HTTP_READ_TIMEOUT)
+
+def http_stats() -> Dict[str, dict]:
+    """Per-host connection reuse: {host: {requests, connections, reuse_rate}}."""
+    stats = {}
+    with _sessions_lock:
+        for host, s in _sessions.items():
+            reqs = conns = 0
+            for adapter in set(s.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is not None:
+                        reqs  += pool.num_requests
+                        conns += pool.num_connections
+            stats[host] = {"requests": reqs, "connections": conns,
+                           "reuse_rate": (1 - conns / reqs) if reqs else 0.0}
+    return stats
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Host Rate Limiting (token bucket + 308 backoff)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# rate <= 0 → unlimited, but a 308 ("Rate limited") still pauses the host.
+HOST_RATE  = float(os.environ.get("OTA_HOST_RATE", "0"))   # requests/s per host
+HOST_BURST = int(os.environ.get("OTA_HOST_BURST", "2"))
+_BACKOFF_MIN, _BACKOFF_MAX = 2.0, 60.0
+
+class _TokenBucket:
+    """Per-host limiter. A 308 halves the rate and pauses the host with
+    exponential backoff; each success wins back a tenth of the base rate."""
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff = 0.0
+        self.rate_limited_count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel: Optional[threading.Event] = None) -> bool:
+        """Block until a request may be sent. False if cancelled meanwhile."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return True
+                    self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                    self.stamp = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate
+            if cancel is None:
+                time.sleep(wait)
+            elif cancel.wait(wait):
+                return False
+
+    def on_rate_limited(self) -> None:
+        with self._lock:
+            self.rate_limited_count += 1
+            self.backoff = min(max(self.backoff * 2, _BACKOFF_MIN), _BACKOFF_MAX)
+            self.blocked_until = time.monotonic() + self.backoff
+            if self.rate > 0:
+                self.rate = max(self.base_rate / 8, self.rate / 2)
+                self.tokens = 0.0
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.backoff = 0.0
+            if self.rate > 0:
+                self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+
+_limiters: Dict[str, _TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+def set_host_rate(rate: float, burst: int = HOST_BURST) -> None:
+    """Set the per-host request rate (req/s, <= 0 = unlimited) for every host."""
+    global HOST_RATE, HOST_BURST
+    with _limiters_lock:
+        HOST_RATE, HOST_BURST = rate, burst
+        _limiters.clear()
+
+def _limiter_for(host: str) -> _TokenBucket:
+    with _limiters_lock:
+        lim = _limiters.get(host)
+        if lim is None:
+            lim = _limiters[host] = _TokenBucket(HOST_RATE, HOST_BURST)
+        return lim
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Metrics
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)   # seconds
+
+class _Histogram:
+    """Fixed-bucket latency histogram (seconds), Prometheus-compatible."""
+
+    def __init__(self):
+        self.counts = [0] * (len(_LATENCY_BUCKETS) + 1)    # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        i = next((i for i, b in enumerate(_LATENCY_BUCKETS) if seconds <= b), len(_LATENCY_BUCKETS))
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf past the last bucket)."""
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return _LATENCY_BUCKETS[i] if i < len(_LATENCY_BUCKETS) else float("inf")
+        return 0.0
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+    def prometheus(self, name: str, labels: str) -> List[str]:
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, n in zip(list(_LATENCY_BUCKETS) + ["+Inf"], self.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines += [f"{name}_sum{suffix} {self.sum:.6f}", f"{name}_count{suffix} {self.count}"]
+        return lines
+
+class ResolverStats:
+    """Where resolution time goes: query latency per region/mode, full lookups
+    per region, the downloadCheck redirect hop, retries, timeouts, response
+    codes and cache outcomes. Thread-safe; read with snapshot() or prometheus()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.query_latency: Dict[Tuple[str, str], _Histogram] = {}
+            self.lookup_latency: Dict[str, _Histogram] = {}
+            self.redirect_latency = _Histogram()
+            self.responses: Dict[Tuple[str, str], int] = {}
+            self.retries: Dict[str, int] = {}
+            self.timeouts: Dict[str, int] = {}
+            self.cache = {"hit": 0, "miss": 0, "expired_url": 0}
+
+    def observe_query(self, region: str, mode: str, seconds: float, code: Any) -> None:
+        with self._lock:
+            self.query_latency.setdefault((region, mode), _Histogram()).observe(seconds)
+            key = (region, str(code))
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def observe_lookup(self, region: str, seconds: float) -> None:
+        with self._lock:
+            self.lookup_latency.setdefault(region, _Histogram()).observe(seconds)
+
+    def observe_redirect(self, seconds: float) -> None:
+        with self._lock:
+            self.redirect_latency.observe(seconds)
+
+    def count_retry(self, region: str) -> None:
+        with self._lock:
+            self.retries[region] = self.retries.get(region, 0) + 1
+
+    def count_timeout(self, region: str) -> None:
+        with self._lock:
+            self.timeouts[region] = self.timeouts.get(region, 0) + 1
+
+    def count_cache(self, outcome: str) -> None:
+        with self._lock:
+            self.cache[outcome] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = sum(self.cache.values())
+            return {
+                "queries": {f"{r}/{m}": h.snapshot() for (r, m), h in sorted(self.query_latency.items())},
+                "lookups": {r: h.snapshot() for r, h in sorted(self.lookup_latency.items())},
+                "redirect": self.redirect_latency.snapshot(),
+                "responses": {f"{r}/{c}": n for (r, c), n in sorted(self.responses.items())},
+                "retries": dict(self.retries),
+                "timeouts": dict(self.timeouts),
+                "cache": {**self.cache,
+                          **{f"{k}_ratio": (v / total if total else 0.0) for k, v in self.cache.items()}},
+            }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            lines = ["# HELP ota_query_seconds One /update/v3 request (POST only).",
+                     "# TYPE ota_query_seconds histogram"]
+            for (r, m), h in sorted(self.query_latency.items()):
+                lines += h.prometheus("ota_query_seconds", f'region="{r}",mode="{m}"')
+            lines += ["# HELP ota_lookup_seconds resolve_ota end to end, cache hits excluded.",
+                      "# TYPE ota_lookup_seconds histogram"]
+            for r, h in sorted(self.lookup_latency.items()):
+                lines += h.prometheus("ota_lookup_seconds", f'region="{r}"')
+            lines += ["# HELP ota_redirect_seconds downloadCheck redirect resolution.",
+                      "# TYPE ota_redirect_seconds histogram"]
+            lines += self.redirect_latency.prometheus("ota_redirect_seconds", "")
+            lines.append("# TYPE ota_responses_total counter")
+            lines += [f'ota_responses_total{{region="{r}",code="{c}"}} {n}'
+                      for (r, c), n in sorted(self.responses.items())]
+            lines.append("# TYPE ota_retries_total counter")
+            lines += [f'ota_retries_total{{region="{r}"}} {n}' for r, n in sorted(self.retries.items())]
+            lines.append("# TYPE ota_timeouts_total counter")
+            lines += [f'ota_timeouts_total{{region="{r}"}} {n}' for r, n in sorted(self.timeouts.items())]
+            lines.append("# TYPE ota_cache_lookups_total counter")
+            lines += [f'ota_cache_lookups_total{{result="{k}"}} {n}' for k, n in self.cache.items()]
+        return "\n".join(lines) + "\n"
+
+resolver_stats = ResolverStats()
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  Crypto Helpers
@@ -118,8 +399,13 @@ def _generate_random_string(length: int = 64) -> str:
 def _generate_random_bytes(length: int) -> bytes:
     return os.urandom(length)
 
+@lru_cache(maxsize=None)
+def _load_public_key(public_key_pem: str):
+    """Parsed RSA key — PEM parsing is the most expensive step of a query."""
+    return serialization.load_pem_public_key(public_key_pem.encode(), backend=default_backend())
+
 def _generate_protected_key(aes_key: bytes, public_key_pem: str) -> str:
-    public_key = serialization.load_pem_public_key(public_key_pem.encode(), backend=default_backend())
+    public_key = _load_public_key(public_key_pem)
     key_b64 = base64.b64encode(aes_key)
     ciphertext = public_key.encrypt(
         key_b64,
@@ -137,6 +423,42 @@ def _aes_ctr_decrypt(ciphertext: bytes, key: bytes, iv: bytes) -> bytes:
     dec = cipher.decryptor()
     return dec.update(ciphertext) + dec.finalize()
 
+# Per-endpoint crypto context: the server only needs the AES key to decrypt
+# this request and encrypt its reply, and accepts a protected key until its
+# "version" timestamp. Reusing one key for a bounded time/count saves an
+# RSA-OAEP operation per query. The IV stays fresh for every request.
+CRYPTO_CTX_TTL      = float(os.environ.get("OTA_CRYPTO_CTX_TTL", "600"))
+CRYPTO_CTX_MAX_USES = int(os.environ.get("OTA_CRYPTO_CTX_MAX_USES", "100"))
+
+@dataclass
+class _CryptoContext:
+    aes_key: bytes
+    protected_key: str
+    key_version: str
+    created: float
+    uses: int = 0
+
+_crypto_ctx: Dict[Tuple[str, str], _CryptoContext] = {}
+_crypto_lock = threading.Lock()
+
+def _new_crypto_context(public_key_pem: str) -> _CryptoContext:
+    aes_key = _generate_random_bytes(32)
+    return _CryptoContext(aes_key, _generate_protected_key(aes_key, public_key_pem),
+                          str(time.time_ns() + 10**9 * 60 * 60 * 24), time.time())
+
+def _crypto_context(public_key_pem: str, key_version: str) -> _CryptoContext:
+    """Shared context for (key, negotiationVersion); renewed after
+    CRYPTO_CTX_TTL seconds or CRYPTO_CTX_MAX_USES queries. MAX_USES <= 1 disables reuse."""
+    if CRYPTO_CTX_MAX_USES <= 1:
+        return _new_crypto_context(public_key_pem)
+    key = (public_key_pem, key_version)
+    with _crypto_lock:
+        ctx = _crypto_ctx.get(key)
+        if ctx is None or ctx.uses >= CRYPTO_CTX_MAX_USES or time.time() - ctx.created >= CRYPTO_CTX_TTL:
+            ctx = _crypto_ctx[key] = _new_crypto_context(public_key_pem)
+        ctx.uses += 1
+        return ctx
+
 def _replace_gauss_url(url: str) -> str:
     if not url or url == "N/A":
         return url
@@ -163,7 +485,10 @@ def _get_redirect_url(url: str, max_retries: int = 3) -> str:
     }
     for attempt in range(max_retries):
         try:
-            r = requests.get(url, headers=headers, allow_redirects=False, timeout=10)
+            t0 = time.monotonic()
+            r = _session_for(urlsplit(url).hostname or "").get(
+                url, headers=headers, allow_redirects=False, timeout=_timeout(10))
+            resolver_stats.observe_redirect(time.monotonic() - t0)
             if r.status_code == 302:
                 return r.headers.get('Location', url)
             return url
@@ -205,7 +530,7 @@ def _process_ota_version(ota_prefix: str, region: str) -> Tuple[str, str]:
     return ota_version, model
 
 def _build_headers(ota_version: str, model: str, mode: str, region_config: dict,
-                   device_id: str, protected_key: str) -> dict:
+                   device_id: str, protected_key: str, key_version: Optional[str] = None) -> dict:
     lang = region_config["language"]
     return {
         "language": lang, "newLanguage": lang,
@@ -218,50 +543,86 @@ def _build_headers(ota_version: str, model: str, mode: str, region_config: dict,
         "protectedKey": json.dumps({
             "SCENE_1": {
                 "protectedKey": protected_key,
-                "version": str(time.time_ns() + 10**9 * 60 * 60 * 24),
+                "version": key_version or str(time.time_ns() + 10**9 * 60 * 60 * 24),
                 "negotiationVersion": region_config["public_key_version"]
             }
         })
     }
 
-def _query_single(ota_version: str, model: str, region: str, mode: str = "taste") -> OTAResult:
-    """Execute a single OTA query against the server."""
-    try:
-        public_key, region_config = _get_public_key_for_region(region)
-    except KeyError:
-        return OTAResult(False, error=f"Unsupported region: {region}")
+def _prepare_query(ota_version: str, model: str, region: str, mode: str) -> Tuple[str, dict, dict, bytes]:
+    """(url, headers, json payload, aes_key) for one /update/v3 request.
+    Raises KeyError for an unsupported region."""
+    public_key, region_config = _get_public_key_for_region(region)
 
-    aes_key = _generate_random_bytes(32)
+    ctx = _crypto_context(public_key, region_config["public_key_version"])
     iv = _generate_random_bytes(16)
     device_id = _generate_random_string(64)
     guid = "0" * 64
 
     headers = _build_headers(ota_version, model, mode, region_config, device_id,
-                              _generate_protected_key(aes_key, public_key))
+                             ctx.protected_key, ctx.key_version)
 
     body = {
         "mode": "0", "time": int(time.time() * 1000),
         "isRooted": "0", "isLocked": True, "type": "0",
         "deviceId": guid.lower(), "opex": {"check": True}
     }
-    cipher_text = _aes_ctr_encrypt(json.dumps(body).encode(), aes_key, iv)
-    url = f"https://{region_config['host']}/update/v3"
+    cipher_text = _aes_ctr_encrypt(json.dumps(body).encode(), ctx.aes_key, iv)
+    url = f"{OTA_SCHEME}://{region_config['host']}/update/v3"
+    payload = {
+        "params": json.dumps({
+            "cipher": base64.b64encode(cipher_text).decode(),
+            "iv": base64.b64encode(iv).decode()
+        })
+    }
+    return url, headers, payload, ctx.aes_key
 
+def _query_single(ota_version: str, model: str, region: str, mode: str = "taste",
+                  cancel: Optional[threading.Event] = None,
+                  sent: Optional["_SendCounter"] = None) -> OTAResult:
+    """Execute a single OTA query against the server.
+    A set `cancel` event aborts before the request and between retries.
+    `sent` counts every request as it goes out (retries included)."""
+    if cancel is not None and cancel.is_set():
+        return OTAResult(False, error="Cancelled")
+    try:
+        url, headers, payload, aes_key = _prepare_query(ota_version, model, region, mode)
+    except KeyError:
+        return OTAResult(False, error=f"Unsupported region: {region}")
+
+    host = urlsplit(url).hostname
+    limiter = _limiter_for(host)
+    result = OTAResult(False, error="Max retries exceeded")
     for attempt in range(3):
+        if not limiter.acquire(cancel):
+            return OTAResult(False, error="Cancelled")
+        if attempt:
+            resolver_stats.count_retry(region)
+        t0 = time.monotonic()
+        if sent is not None:
+            sent.add()
         try:
-            resp = requests.post(url, headers=headers, timeout=30, json={
-                "params": json.dumps({
-                    "cipher": base64.b64encode(cipher_text).decode(),
-                    "iv": base64.b64encode(iv).decode()
-                })
-            })
-            return _parse_response(resp, aes_key)
+            resp = _session_for(host).post(url, headers=headers, timeout=_timeout(), json=payload)
+            elapsed = time.monotonic() - t0
+            result = _parse_response(resp, aes_key)
+            resolver_stats.observe_query(region, mode, elapsed, result.response_code)
         except Exception as e:
+            resolver_stats.observe_query(region, mode, time.monotonic() - t0, "error")
+            if isinstance(e, requests.Timeout):
+                resolver_stats.count_timeout(region)
             if attempt == 2:
                 return OTAResult(False, error=f"Connection failed: {e}")
-            time.sleep(5 * (attempt + 1))
+            if cancel is None:
+                time.sleep(5 * (attempt + 1))
+            elif cancel.wait(5 * (attempt + 1)):
+                return OTAResult(False, error="Cancelled")
+            continue
+        if result.response_code != 308:
+            limiter.on_success()
+            return result
+        limiter.on_rate_limited()          # back off this host, then retry
 
-    return OTAResult(False, error="Max retries exceeded")
+    return result
 
 def _parse_response(response: requests.Response, aes_key: bytes) -> OTAResult:
     """Parse encrypted OTA server response."""
@@ -303,6 +664,7 @@ def _parse_response(response: requests.Response, aes_key: bytes) -> OTAResult:
         size = None
         md5 = None
         expires = None
+        redirect_source = None
         comp_list = data.get("components", [])
         if isinstance(comp_list, list) and comp_list:
             comp = comp_list[0]
@@ -312,6 +674,7 @@ def _parse_response(response: requests.Response, aes_key: bytes) -> OTAResult:
                     manual_url = _replace_gauss_url(pkts.get("manualUrl", ""))
                     if manual_url and manual_url != "N/A":
                         if "downloadCheck" in manual_url:
+                            redirect_source = manual_url
                             download_url = _replace_gauss_url(_get_redirect_url(manual_url))
                             expires = _extract_expiration(download_url)
                         else:
@@ -333,66 +696,351 @@ def _parse_response(response: requests.Response, aes_key: bytes) -> OTAResult:
             download_url=download_url, size=size, md5=md5,
             security_patch=data.get("securityPatch", "N/A"),
             published_time=published_time, changelog=changelog,
-            expires=expires, response_code=200
+            expires=expires, response_code=200, redirect_source=redirect_source
         )
     except Exception as e:
         return OTAResult(False, error=f"Parse error: {e}", response_code=status)
 
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Persistent Cache (SQLite)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Metadata (version, size, md5, changelog) is stable for hours; signed
+# download links expire in 10–30 min; "no update" answers are cached
+# briefly so repeated misses do not hammer the servers.
+_CACHE_TTL     = 6 * 3600   # metadata, 6 hours
+_NEGATIVE_TTL  = 30 * 60    # 2004 / 204 / 2200
+_URL_TTL       = 10 * 60    # signed link without a parsable expiry
+_URL_MARGIN    = 60         # refresh this long before the link expires
+_NEGATIVE_CODES = (2004, 204, 2200)
+
+# Learned suffix order: each hit adds 1 to a score that halves every
+# _LEARN_HALF_LIFE; entries below _LEARN_MIN_SCORE are ignored (aged out).
+_LEARN_HALF_LIFE = 14 * 86400
+_LEARN_MIN_SCORE = 0.25
+
+def _decayed(score: float, age: float) -> float:
+    return score * 0.5 ** (max(age, 0.0) / _LEARN_HALF_LIFE)
+
+_CACHE_DB = os.environ.get("OTA_CACHE_DB",
+                           os.path.join(os.path.expanduser("~"), ".cache", "ota_resolver.sqlite"))
+
+def _result_to_json(result: OTAResult) -> str:
+    d = asdict(result)
+    d["expires"] = result.expires.timestamp() if result.expires else None
+    return json.dumps(d)
+
+def _result_from_json(text: str) -> OTAResult:
+    d = json.loads(text)
+    d["expires"] = datetime.fromtimestamp(d["expires"]) if d.get("expires") else None
+    return OTAResult(**{k: v for k, v in d.items() if k in OTAResult.__dataclass_fields__})
+
+class OTACache:
+    """(prefix, region) → OTAResult, persisted in SQLite, safe across threads.
+    The database is opened on first use, so importing this module touches no
+    files. Falls back to an in-memory database when the path is not writable."""
+
+    def __init__(self, path: str = _CACHE_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        with self._open_lock:
+            if self._conn is None:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    db = sqlite3.connect(self.path, check_same_thread=False)
+                except (OSError, sqlite3.Error):
+                    db = sqlite3.connect(":memory:", check_same_thread=False)
+                with db:
+                    db.execute("""CREATE TABLE IF NOT EXISTS ota_cache (
+                        prefix TEXT NOT NULL, region TEXT NOT NULL, result TEXT NOT NULL,
+                        stored REAL NOT NULL, url_expires REAL,
+                        PRIMARY KEY (prefix, region))""")
+                    db.execute("""CREATE TABLE IF NOT EXISTS suffix_hits (
+                        prefix TEXT NOT NULL, region TEXT NOT NULL, suffix TEXT NOT NULL,
+                        mode TEXT NOT NULL, variant TEXT NOT NULL, score REAL NOT NULL, updated REAL NOT NULL,
+                        PRIMARY KEY (prefix, region, suffix, mode, variant))""")
+                self._conn = db
+        return self._conn
+
+    def get(self, prefix: str, region: str) -> Tuple[Optional[OTAResult], bool]:
+        """(result, url_expired). result is None on a miss or expired entry."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, stored, url_expires FROM ota_cache WHERE prefix=? AND region=?",
+                (prefix, region)).fetchone()
+        if row is None:
+            return None, False
+        result = _result_from_json(row[0])
+        result.stored, result.url_expires = row[1], row[2]
+        ttl = _CACHE_TTL if result.success else _NEGATIVE_TTL
+        if time.time() - row[1] >= ttl:
+            return None, False
+        return result, row[2] is not None and time.time() >= row[2]
+
+    @staticmethod
+    def _url_expires(result: OTAResult) -> Optional[float]:
+        if not (result.success and result.redirect_source):
+            return None
+        return (result.expires.timestamp() if result.expires else time.time() + _URL_TTL) - _URL_MARGIN
+
+    def put(self, prefix: str, region: str, result: OTAResult) -> None:
+        """Store a success or a negative answer; transient failures are not cached.
+        Sets result.stored and result.url_expires to what was stored."""
+        if not result.success and result.response_code not in _NEGATIVE_CODES:
+            return
+        result.stored, result.url_expires = time.time(), self._url_expires(result)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO ota_cache VALUES (?, ?, ?, ?, ?)",
+                             (prefix, region, _result_to_json(result), result.stored,
+                              result.url_expires))
+
+    def update_url(self, prefix: str, region: str, result: OTAResult) -> None:
+        """Store a refreshed download link without extending the metadata TTL."""
+        result.url_expires = self._url_expires(result)
+        with self._lock, self._db:
+            self._db.execute("UPDATE ota_cache SET result=?, url_expires=? WHERE prefix=? AND region=?",
+                             (_result_to_json(result), result.url_expires, prefix, region))
+
+    def learn(self, prefix: str, region: str, suffix: str, mode: str, variant: str) -> None:
+        """Record the (suffix, mode, model variant) that resolved prefix/region."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT score, updated FROM suffix_hits WHERE prefix=? AND region=? AND suffix=? "
+                "AND mode=? AND variant=?", (prefix, region, suffix, mode, variant)).fetchone()
+            score = (_decayed(row[0], now - row[1]) if row else 0.0) + 1.0
+            self._db.execute("INSERT OR REPLACE INTO suffix_hits VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (prefix, region, suffix, mode, variant, score, now))
+
+    def learned(self, prefix: str, region: str) -> List[Tuple[str, str, str]]:
+        """Known-good (suffix, mode, variant), best decayed score first."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT suffix, mode, variant, score, updated FROM suffix_hits "
+                "WHERE prefix=? AND region=?", (prefix, region)).fetchall()
+        scored = [(_decayed(sc, now - up), (s, m, v)) for s, m, v, sc, up in rows]
+        return [c for sc, c in sorted(scored, reverse=True) if sc >= _LEARN_MIN_SCORE]
+
+    def clear(self, learned: bool = True) -> None:
+        """Drop cached results, and the learned suffix scores unless learned=False."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM ota_cache")
+            if learned:
+                self._db.execute("DELETE FROM suffix_hits")
+
+_ota_cache = OTACache()
+
+def _refresh_download_url(result: OTAResult) -> OTAResult:
+    """Re-resolve only the signed redirect of a cached result."""
+    url = _replace_gauss_url(_get_redirect_url(result.redirect_source))
+    result.download_url = url
+    result.expires = _extract_expiration(url)
+    return result
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  Public API
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-# In-memory cache: {(prefix, region): {"result": OTAResult, "ts": timestamp}}
-_ota_cache: Dict[Tuple[str, str], dict] = {}
-_CACHE_TTL = 6 * 3600  # 6 hours
+# Probe order = priority order: the first success in this order wins.
+_SUFFIXES = ["_11.A", "_11.C", "_11.F", "_11.H", "_11.J"]
+_MAX_PARALLEL_PROBES = 5
+
+def _chain(region: str) -> List[Tuple[str, str]]:
+    """(mode, model variant) fallback chain tried for every suffix."""
+    chain = [("taste", "")]
+    if region == "in":
+        chain.append(("taste", "IN"))
+    chain.append(("manual", ""))
+    return chain
+
+def _baseline_probes(suffix: str, mode: str, variant: str, region: str) -> int:
+    """Queries the fixed sequential order needs to reach this hit."""
+    chain = _chain(region)
+    i = _SUFFIXES.index(suffix) if suffix in _SUFFIXES else len(_SUFFIXES)
+    step = chain.index((mode, variant)) if (mode, variant) in chain else len(chain) - 1
+    return i * len(chain) + step + 1
+
+class _SendCounter:
+    """Queries sent by one lookup, counted when they go out — probes still in
+    flight when the lookup is decided count too."""
+
+    def __init__(self):
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def add(self) -> None:
+        with self._lock:
+            self._n += 1
+
+    @property
+    def value(self) -> int:
+        with self._lock:
+            return self._n
+
+def _probe_suffix(base: str, suffix: str, region: str, cancel: threading.Event,
+                  steps: Optional[List[Tuple[str, str]]] = None, sent: Optional[_SendCounter] = None,
+                  known: Optional[Tuple[str, str, OTAResult]] = None) -> Tuple[OTAResult, str, str]:
+    """Query one suffix: taste mode, then the IN model and manual mode fallbacks
+    (or only `steps`). `known` is a (mode, variant, result) already answered
+    for this suffix; that step is not asked again. Returns (result, mode, variant)."""
+    candidate = base + suffix
+    ota_version, model = _process_ota_version(candidate, region)
+    result, mode, variant = OTAResult(False, error="No firmware found"), "taste", ""
+
+    for i, (mode, variant) in enumerate(steps or _chain(region)):
+        # Fallbacks (IN model, manual mode) only follow a "no update" answer
+        if i and not (steps or result.response_code == 2004):
+            break
+        if known is not None and known[:2] == (mode, variant):
+            result = known[2]
+        else:
+            result = _query_single(ota_version, model + variant, region, mode=mode,
+                                   cancel=cancel, sent=sent)
+        if result.success:
+            break
+
+    return result, mode, variant
 
-def resolve_ota(ota_prefix: str, region: str) -> OTAResult:
+def resolve_ota(ota_prefix: str, region: str, max_workers: int = _MAX_PARALLEL_PROBES) -> OTAResult:
     """
     Resolve OTA for a device prefix + region.
     Uses taste mode + anti=1 bypass for ColorOS 16.
-    Auto-tries suffixes _11.A, _11.C, _11.F, _11.H, _11.J.
-    Returns the first successful result.
+    If a (suffix, mode, model) combination resolved this pair before, it is
+    tried alone first. Otherwise (or if it misses) suffixes are probed
+    concurrently (at most max_workers at a time), learned suffixes first,
+    then _11.A, _11.C, _11.F, _11.H, _11.J; the first success in that order
+    wins and probes still pending are cancelled.
     """
     cache_key = (ota_prefix.upper(), region.lower())
-    cached = _ota_cache.get(cache_key)
-    if cached and (time.time() - cached["ts"]) < _CACHE_TTL:
-        # Return cached metadata but re-resolve download URL (links expire in 10-30 min)
-        result = cached["result"]
-        if result.success and result.download_url and "downloadCheck" in (result.download_url or ""):
-            # URL may have expired — but we still return it, workflow must start fast
-            pass
-        return result
+    cached, url_expired = _ota_cache.get(*cache_key)
+    if cached is not None:
+        resolver_stats.count_cache("expired_url" if url_expired else "hit")
+        if url_expired:
+            # Metadata still fresh, signed link is not: follow the redirect again only
+            _ota_cache.update_url(*cache_key, _refresh_download_url(cached))
+        cached.probes = cached.probes_saved = 0
+        return cached
+    resolver_stats.count_cache("miss")
 
-    # Auto-complete: try all suffixes
-    suffixes = ["_11.A", "_11.C", "_11.F", "_11.H", "_11.J"]
+    started = time.monotonic()
     base = ota_prefix.upper()
-    best_result = None
-
-    for suffix in suffixes:
-        candidate = base + suffix
-        ota_version, model = _process_ota_version(candidate, region)
-
-        # Try taste mode first (anti-query bypass)
-        result = _query_single(ota_version, model, region, mode="taste")
+    learned = _ota_cache.learned(*cache_key)
+    cancel = threading.Event()
+    sent = _SendCounter()
+    known: Dict[str, Tuple[str, str, OTAResult]] = {}
+    definitive = True       # every answer so far was a definitive "nothing here"
 
-        # Fallback: try IN suffix for India
-        if not result.success and result.response_code == 2004 and region == "in":
-            result = _query_single(ota_version, f"{model}IN", region, mode="taste")
-
-        # Fallback: manual mode
-        if not result.success and result.response_code == 2004:
-            result = _query_single(ota_version, model, region, mode="manual")
+    def won(result: OTAResult, suffix: str, mode: str, variant: str) -> OTAResult:
+        probes = sent.value
+        result.probes = probes
+        result.probes_saved = max(0, _baseline_probes(suffix, mode, variant, region) - probes)
+        _ota_cache.learn(*cache_key, suffix, mode, variant)
+        _ota_cache.put(*cache_key, result)
+        resolver_stats.observe_lookup(cache_key[1], time.monotonic() - started)
+        return result
 
+    # Fast path: the combination that worked last time, one query
+    if learned:
+        suffix, mode, variant = learned[0]
+        result, _, _ = _probe_suffix(base, suffix, region, cancel, [(mode, variant)], sent)
         if result.success:
-            _ota_cache[cache_key] = {"result": result, "ts": time.time()}
-            return result
+            return won(result, suffix, mode, variant)
+        known[suffix] = (mode, variant, result)     # not asked again below
+        definitive = result.response_code in _NEGATIVE_CODES
 
-        if best_result is None:
-            best_result = result
+    # Auto-complete: probe all suffixes in parallel, learned ones first
+    order = list(dict.fromkeys([s for s, _, _ in learned] + _SUFFIXES))
+    best_result = None
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(order))),
+                              thread_name_prefix="ota-probe")
+    try:
+        futures = [pool.submit(_probe_suffix, base, s, region, cancel, None, sent, known.get(s))
+                   for s in order]
+        for suffix, fut in zip(order, futures):   # priority order, not completion order
+            result, mode, variant = fut.result()
+            if result.success:
+                cancel.set()
+                return won(result, suffix, mode, variant)
+            if best_result is None:
+                best_result = result
+            definitive = definitive and result.response_code in _NEGATIVE_CODES
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
 
-    # None succeeded — cache the failure too (shorter TTL)
+    # None succeeded — cache the failure too (shorter TTL), but only if every
+    # suffix said "no update": one transient error may be hiding the release
     fail_result = best_result or OTAResult(False, error="No firmware found")
+    fail_result.probes = sent.value
+    if definitive:
+        _ota_cache.put(*cache_key, fail_result)
+    resolver_stats.observe_lookup(cache_key[1], time.monotonic() - started)
     return fail_result
 
+def cached_result(ota_prefix: str, region: str) -> Optional[OTAResult]:
+    """Fresh cached answer without any network I/O, or None on a miss, an
+    expired entry, or a signed link that needs refreshing (resolve_ota does that)."""
+    cached, url_expired = _ota_cache.get(ota_prefix.upper(), region.lower())
+    if cached is None or url_expired:
+        return None
+    resolver_stats.count_cache("hit")
+    cached.probes = cached.probes_saved = 0
+    return cached
+
+
+def resolve_many(prefixes: Iterable[str], regions: Optional[Iterable[str]] = None,
+                 max_workers: int = 4, rate: Optional[float] = None,
+                 burst: int = HOST_BURST) -> Iterator[Tuple[str, str, OTAResult]]:
+    """
+    Resolve a prefix × region matrix, yielding (prefix, region, result) as
+    each pair completes. Identical pairs are resolved once. `rate` (req/s per
+    host) installs a token bucket per OTA host; 308 answers back that host
+    off adaptively whatever the rate.
+    """
+    if rate is not None:
+        set_host_rate(rate, burst)
+    regions = list(regions) if regions is not None else list(REGION_LABELS)
+    jobs = list(dict.fromkeys((p.strip().upper(), r.strip().lower())
+                              for p in prefixes if p.strip() for r in regions))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ota-many") as pool:
+        futures = {pool.submit(resolve_ota, p, r): (p, r) for p, r in jobs}
+        for fut in as_completed(futures):
+            p, r = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as e:
+                result = OTAResult(False, error=f"Resolver crashed: {e}")
+            yield p, r, result
+
+# Stable fields only — signed links and their expiry change on every run.
+_REPORT_FIELDS = ("success", "version", "ota_version", "size", "md5", "security_patch",
+                  "published_time", "changelog", "error", "response_code")
+
+def build_report(results: Iterable[Tuple[str, str, OTAResult]]) -> dict:
+    """Diff-friendly JSON report: entries sorted by prefix then region."""
+    entries = sorted(({"prefix": p, "region": r, **{k: getattr(res, k) for k in _REPORT_FIELDS}}
+                      for p, r, res in results), key=lambda e: (e["prefix"], e["region"]))
+    return {
+        "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "found": sum(e["success"] for e in entries),
+        "total": len(entries),
+        "results": entries,
+    }
+
+def _load_prefixes(path: str) -> List[str]:
+    """OTA prefixes from a JSON list, or a devices.json-style dict whose
+    entries carry an "ota_prefix" (entries without one are skipped)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return [str(p) for p in data]
+    return [v["ota_prefix"] for v in data.values() if isinstance(v, dict) and v.get("ota_prefix")]
 
 def format_size(size_str: str) -> str:
     """Convert size string (bytes) to human-readable GB/MB."""
@@ -406,3 +1054,74 @@ def format_size(size_str: str) -> str:
             return f"{size_bytes / 1024:.0f} KB"
     except (ValueError, TypeError):
         return size_str or "Unknown"
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Micro-benchmark
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def bench_crypto(n: int = 200, region: str = "eu") -> Dict[str, float]:
+    """Per-query CPU cost (µs) of building a request: cold (PEM parse +
+    RSA-OAEP every time, the old behaviour) vs cached key + shared context."""
+    global CRYPTO_CTX_MAX_USES
+    ota_version, model = _process_ota_version("CPH2581_11.A", region)
+    saved = CRYPTO_CTX_MAX_USES
+    out = {}
+    try:
+        for label, uses in (("cold", 1), ("cached", saved)):
+            CRYPTO_CTX_MAX_USES = uses
+            _crypto_ctx.clear()
+            t0 = time.process_time()
+            for _ in range(n):
+                if uses == 1:
+                    _load_public_key.cache_clear()
+                _prepare_query(ota_version, model, region, "taste")
+            out[label] = (time.process_time() - t0) / n * 1e6
+    finally:
+        CRYPTO_CTX_MAX_USES = saved
+    out["speedup"] = out["cold"] / out["cached"] if out["cached"] else 0.0
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OPlus OTA resolver")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench-crypto", help="per-query crypto CPU cost, cold vs cached")
+    b.add_argument("-n", type=int, default=200)
+    b.add_argument("--region", default="eu")
+    m = sub.add_parser("resolve-many", help="resolve a device × region matrix, JSON report")
+    m.add_argument("prefixes", nargs="*", help="OTA prefixes, e.g. CPH2581")
+    m.add_argument("--devices", help="JSON list of prefixes or devices.json with ota_prefix entries")
+    m.add_argument("-r", "--regions", nargs="+", default=list(REGION_LABELS))
+    m.add_argument("-j", "--jobs", type=int, default=4, help="pairs resolved concurrently")
+    m.add_argument("--rate", type=float, default=1.0, help="requests/s per OTA host (<= 0: unlimited)")
+    m.add_argument("--burst", type=int, default=HOST_BURST)
+    m.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    m.add_argument("--metrics", help="write resolver metrics (Prometheus text format) here")
+    args = parser.parse_args()
+
+    if args.cmd == "bench-crypto":
+        r = bench_crypto(args.n, args.region)
+        print(f"cold   : {r['cold']:8.1f} µs/query")
+        print(f"cached : {r['cached']:8.1f} µs/query  ({r['speedup']:.1f}x)")
+
+    elif args.cmd == "resolve-many":
+        import sys
+        prefixes = list(args.prefixes) + (_load_prefixes(args.devices) if args.devices else [])
+        if not prefixes:
+            parser.error("no prefixes given")
+        done = []
+        for p, r, res in resolve_many(prefixes, args.regions, args.jobs, args.rate, args.burst):
+            done.append((p, r, res))
+            status = res.version if res.success else f"✗ {res.error}"
+            print(f"[{len(done)}] {p} {r}: {status}", file=sys.stderr, flush=True)
+        report = json.dumps(build_report(done), indent=2, ensure_ascii=False, sort_keys=True)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(report + "\n")
+        else:
+            print(report)
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(resolver_stats.prometheus())
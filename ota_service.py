@@ -0,0 +1,213 @@
+"""
+Long-running local HTTP/JSON front end for ota_resolver, so the Telegram bot
+and the build workflow share one warm cache instead of each paying for
+cold lookups.
+
+  GET /resolve?prefix=CPH2581&region=eu   → OTAResult as JSON
+  GET /metrics                             → Prometheus text format (service + resolver)
+  GET /health                              → {"ok": true}
+
+An in-memory LRU sits on top of the persistent SQLite cache, and concurrent
+requests for the same (prefix, region) are coalesced: one resolve_ota call
+answers every waiter.
+
+Clients use resolve(), which talks to the service and falls back to
+in-process resolution when it is not running:
+
+  from ota_service import resolve
+  result = resolve("CPH2581", "eu")
+
+Usage:
+  python ota_service.py [--host 127.0.0.1] [--port 8765] [--lru 512]
+"""
+
+import os
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+
+import ota_resolver
+from ota_resolver import OTAResult
+
+SERVICE_URL = os.environ.get("OTA_SERVICE_URL", "http://127.0.0.1:8765")
+LRU_SIZE    = int(os.environ.get("OTA_SERVICE_LRU", "512"))
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  In-memory LRU + request coalescing
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class _ResultLRU:
+    """(prefix, region) → OTAResult. Only results the persistent cache kept
+    are held, with its deadlines: the metadata TTL counts from the original
+    store time (result.stored) and an entry drops out at result.url_expires,
+    so a stale link is re-resolved (cheaply) by resolve_ota."""
+
+    def __init__(self, size: int = LRU_SIZE):
+        self.size = size
+        self._data: "OrderedDict[Tuple[str, str], OTAResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[OTAResult]:
+        with self._lock:
+            result = self._data.get(key)
+            if result is None:
+                return None
+            now = time.time()
+            ttl = ota_resolver._CACHE_TTL if result.success else ota_resolver._NEGATIVE_TTL
+            link_dead = result.url_expires is not None and now >= result.url_expires
+            if now - result.stored >= ttl or link_dead:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return result
+
+    def put(self, key: Tuple[str, str], result: OTAResult) -> None:
+        if not result.stored:               # OTACache did not keep it (transient failure)
+            return
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class ResolverService:
+    """resolve_ota behind an LRU, with identical in-flight requests coalesced."""
+
+    def __init__(self, lru_size: int = LRU_SIZE):
+        self.lru = _ResultLRU(lru_size)
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "lru_hits": 0, "coalesced": 0, "resolved": 0, "errors": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def resolve(self, prefix: str, region: str) -> OTAResult:
+        key = (prefix.strip().upper(), region.strip().lower())
+        self._count("requests")
+        cached = self.lru.get(key)
+        if cached is not None:
+            self._count("lru_hits")
+            return cached
+
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            return fut.result()
+
+        try:
+            result = ota_resolver.resolve_ota(*key)
+            self._count("resolved")
+        except Exception as e:
+            self._count("errors")
+            result = OTAResult(False, error=f"Resolver crashed: {e}")
+        self.lru.put(key, result)
+        with self._lock:
+            del self._inflight[key]
+        fut.set_result(result)
+        return result
+
+    def metrics(self) -> str:
+        with self._lock:
+            counters = dict(self.counters)
+            inflight = len(self._inflight)
+        lines = []
+        for name, value in counters.items():
+            lines += [f"# TYPE ota_service_{name}_total counter", f"ota_service_{name}_total {value}"]
+        lines += ["# TYPE ota_service_lru_entries gauge", f"ota_service_lru_entries {len(self.lru)}",
+                  "# TYPE ota_service_inflight gauge", f"ota_service_inflight {inflight}"]
+        return "\n".join(lines) + "\n" + ota_resolver.resolver_stats.prometheus()
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  HTTP front end
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "ServiceServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/resolve":
+            query = parse_qs(url.query)
+            prefix, region = query.get("prefix", [""])[0], query.get("region", [""])[0]
+            if not prefix or not region:
+                return self._send(400, b'{"error": "prefix and region are required"}')
+            result = self.server.service.resolve(prefix, region)
+            self._send(200, ota_resolver._result_to_json(result).encode())
+        elif url.path == "/metrics":
+            self._send(200, self.server.service.metrics().encode(), "text/plain; version=0.0.4")
+        elif url.path == "/health":
+            self._send(200, b'{"ok": true}')
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765,
+                 service: Optional[ResolverService] = None):
+        super().__init__((host, port), _Handler)
+        self.service = service or ResolverService()
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Client
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+_DOWN_RETRY = 30.0          # s before a dead service is tried again
+_down_until = 0.0
+_client = requests.Session()
+
+def resolve(prefix: str, region: str, timeout: float = 120.0,
+            service_url: Optional[str] = None) -> OTAResult:
+    """resolve_ota via the local service; in-process when it is unreachable."""
+    global _down_until
+    if time.time() >= _down_until:
+        try:
+            r = _client.get(f"{service_url or SERVICE_URL}/resolve",
+                            params={"prefix": prefix, "region": region}, timeout=(1.0, timeout))
+            if r.status_code == 200:
+                return ota_resolver._result_from_json(r.text)
+        except requests.ConnectionError:
+            _down_until = time.time() + _DOWN_RETRY
+        except requests.RequestException:
+            pass
+    return ota_resolver.resolve_ota(prefix, region)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OTA resolver service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(urlsplit(SERVICE_URL).port or 8765))
+    parser.add_argument("--lru", type=int, default=LRU_SIZE, help="in-memory entries")
+    args = parser.parse_args()
+
+    server = ServiceServer(args.host, args.port, ResolverService(args.lru))
+    print(f"OTA resolver service on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass